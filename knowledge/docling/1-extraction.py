@@ -1,16 +1,16 @@
-from docling.document_converter import DocumentConverter
+from utils.conversion_cache import convert_cached
+from utils.ingestion import build_converter
 from utils.sitemap import get_sitemap_urls
 
-converter = DocumentConverter()
+converter = build_converter()  # Same options, and cache entries, as ingestion
 
 # --------------------------------------------------------------
 # Basic PDF extraction from local file
 # --------------------------------------------------------------
 
-# Use the local KFH Real Estate Report PDF
-result = converter.convert("KFH_Real_Estate_Report_2025_Q1.pdf")
-
-document = result.document
+# Use the local KFH Real Estate Report PDF; the conversion is cached so later
+# pipeline stages load it instead of re-running the layout models
+document = convert_cached(converter, "KFH_Real_Estate_Report_2025_Q1.pdf")
 markdown_output = document.export_to_markdown()
 json_output = document.export_to_dict()
 
@@ -40,3 +40,19 @@ print("=" * 50)
 #     if result.document:
 #         document = result.document
 #         docs.append(document)
+
+# --------------------------------------------------------------
+# Convert a directory or manifest of reports in parallel
+# --------------------------------------------------------------
+
+# Conversion is CPU-bound, so multi-document runs go through a process pool
+# where each worker keeps one warm DocumentConverter:
+#
+#   python -m utils.ingestion reports/ --workers 4
+#
+# from utils.ingestion import convert_documents, discover_documents
+#
+# if __name__ == "__main__":
+#     for outcome in convert_documents(discover_documents("reports/")):
+#         if outcome.ok:
+#             docs.append(outcome.document)
@@ -1,46 +1,44 @@
 from docling.chunking import HybridChunker
-from docling.document_converter import DocumentConverter
 from dotenv import load_dotenv
-from openai import AzureOpenAI
 import os
 
+from utils.clients import get_client
+from utils.conversion_cache import convert_cached
+from utils.ingestion import build_converter
+
 load_dotenv()
 
-# Initialize Azure OpenAI client
-client = AzureOpenAI(
-    api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-    api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2024-12-01-preview"),
-    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT")
-)
+# Shared pooled client (see utils.clients)
+client = get_client("2024-12-01-preview")
 
 MAX_TOKENS = 8191  # text-embedding-3-large's maximum context length
 
 
 # --------------------------------------------------------------
-# Extract the data from local PDF
+# Extract the data from local PDF (reusing the cached conversion)
 # --------------------------------------------------------------
 
-converter = DocumentConverter()
-result = converter.convert("KFH_Real_Estate_Report_2025_Q1.pdf")
+converter = build_converter()  # Same options, and cache entries, as ingestion
+document = convert_cached(converter, "KFH_Real_Estate_Report_2025_Q1.pdf")
 
 # Check document structure safely
 print(f"Document extracted successfully")
-print(f"Document object type: {type(result.document)}")
+print(f"Document object type: {type(document)}")
 
 # Try to get document info safely
-if hasattr(result.document, 'pages'):
-    print(f"Number of pages: {len(result.document.pages)}")
+if hasattr(document, 'pages'):
+    print(f"Number of pages: {len(document.pages)}")
 else:
     print("Document doesn't have pages attribute")
 
 # Try to export to see what's available
 try:
-    markdown_content = result.document.export_to_markdown()
+    markdown_content = document.export_to_markdown()
     print(f"Document content length: {len(markdown_content)} characters")
     print(f"Content preview: {markdown_content[:200]}...")
 except Exception as e:
     print(f"Could not export to markdown: {e}")
-    print(f"Available attributes: {[attr for attr in dir(result.document) if not attr.startswith('_')]}")
+    print(f"Available attributes: {[attr for attr in dir(document) if not attr.startswith('_')]}")
 
 # --------------------------------------------------------------
 # Apply hybrid chunking with default tokenizer
@@ -53,7 +51,7 @@ try:
         merge_peers=True,
     )
     
-    chunk_iter = chunker.chunk(dl_doc=result.document)
+    chunk_iter = chunker.chunk(dl_doc=document)
     chunks = list(chunk_iter)
     
     print(f"Created {len(chunks)} chunks from the real estate report")
@@ -79,7 +77,7 @@ except Exception as e:
     
     # Fallback: try simple text splitting
     try:
-        markdown_content = result.document.export_to_markdown()
+        markdown_content = document.export_to_markdown()
         # Simple chunking by paragraphs
         paragraphs = markdown_content.split('\n\n')
         print(f"Simple chunking created {len(paragraphs)} paragraph chunks")
@@ -1,66 +1,50 @@
-from typing import List
+import argparse
+from pathlib import Path
+from typing import List, Optional
 
 import lancedb
 from docling.chunking import HybridChunker
-from docling.document_converter import DocumentConverter
 from dotenv import load_dotenv
 from lancedb.embeddings import get_registry
 from lancedb.pydantic import LanceModel, Vector
-from openai import AzureOpenAI
 import os
 
-load_dotenv()
-
-# Initialize Azure OpenAI client
-client = AzureOpenAI(
-    api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-    api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2024-12-01-preview"),
-    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT")
+from utils.clients import client_for, get_client
+from utils.embedding_batcher import EmbeddingBatchError, EmbeddingBatcher
+from utils.embeddings import CachedEmbedder
+from utils.incremental import (
+    UpsertReport,
+    chunk_id,
+    delete_ids,
+    existing_chunk_ids,
+    find_stale_ids,
+    supports_incremental,
+    upsert_rows,
 )
+from utils.indexing import ensure_fts_index, ensure_scalar_indexes, ensure_vector_index
+from utils.ingestion import convert_documents, discover_documents
+from utils.pipeline import rows_to_arrow, run_streaming_pipeline
+from utils.query_filters import detect_sectors
+from utils.report_metadata import document_id, parse_report_period
+from utils.vector_config import embedding_dimensions, matches_vector_config, vector_value_type
 
-MAX_TOKENS = 8191  # text-embedding-3-large's maximum context length
-
-
-# --------------------------------------------------------------
-# Extract the data from local PDF
-# --------------------------------------------------------------
-
-converter = DocumentConverter()
-result = converter.convert("KFH_Real_Estate_Report_2025_Q1.pdf")
-
-print(f"Processing KFH Real Estate Report 2025 Q1")
-print(f"Document extracted successfully")
-
-# --------------------------------------------------------------
-# Apply hybrid chunking with default tokenizer
-# --------------------------------------------------------------
-
-chunker = HybridChunker(
-    max_tokens=MAX_TOKENS,
-    merge_peers=True,
-)
+load_dotenv()
 
-chunk_iter = chunker.chunk(dl_doc=result.document)
-chunks = list(chunk_iter)
+# Shared pooled client (see utils.clients) with bulk embedding timeouts
+client = client_for("embeddings", get_client("2024-12-01-preview"))
 
-print(f"Created {len(chunks)} chunks from the real estate report")
+# Embeddings go through the shared on-disk/in-memory cache; misses are packed
+# into token-budgeted requests and sent concurrently
+embedder = CachedEmbedder(client, batcher=EmbeddingBatcher(client))
 
-# --------------------------------------------------------------
-# Create a LanceDB database and table
-# --------------------------------------------------------------
+MAX_TOKENS = 8191  # text-embedding-3-large's maximum context length
 
-# Create a LanceDB database
-db = lancedb.connect("data/lancedb")
 
 # Create a custom embedding function using Azure OpenAI
 def azure_openai_embedding(texts):
-    """Custom embedding function using Azure OpenAI"""
+    """Custom embedding function using Azure OpenAI (cached)"""
     try:
-        response = client.embeddings.create(
-            model=os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME"),
-            input=texts
-        )
-        return [data.embedding for data in response.data]
+        return embedder.embed(texts)
     except Exception as e:
         print(f"Azure OpenAI embedding error: {e}")
         raise
@@ -73,92 +57,247 @@ class ChunkMetadata(LanceModel):
     """
 
     filename: str | None
-    page_numbers: str | None  # Changed from List[int] to str for flexibility
+    page_numbers: List[int] | None
     title: str | None
 
 # Define the main Schema
 class Chunks(LanceModel):
+    id: str  # Stable content hash used for incremental upserts
+    # Filterable columns, each with a scalar index (see utils.indexing)
+    doc_id: str
+    report_period: str | None  # e.g. 2025-Q1, parsed from the file name
+    section: str | None  # Closest heading above the chunk
+    sectors: List[str] | None  # Market segments mentioned (see utils.query_filters)
     text: str
-    vector: Vector(3072)  # text-embedding-3-large has 3072 dimensions
+    # text-embedding-3-large has 3072 dimensions; EMBEDDING_DIMENSIONS and
+    # EMBEDDING_STORAGE_DTYPE shrink the column (e.g. 512 x float16 is 12x smaller)
+    vector: Vector(embedding_dimensions(), value_type=vector_value_type())
     metadata: ChunkMetadata
 
-# Force delete existing table and recreate with new schema
-try:
-    db.drop_table("docling")
-    print("Dropped existing table")
-except:
-    pass
-
-table = db.create_table("docling", schema=Chunks, mode="overwrite")
-print("Created new table with updated schema")
 
-# --------------------------------------------------------------
-# Prepare the chunks for the table
-# --------------------------------------------------------------
-
-# Create table with processed chunks
-processed_chunks = []
-for chunk in chunks:
-    # Extract page numbers more safely
+def chunk_page_numbers(chunk) -> List[int]:
+    """Sorted, de-duplicated page numbers covered by a chunk."""
     page_numbers = []
     try:
         for item in chunk.meta.doc_items:
             for prov in item.prov:
                 if hasattr(prov, 'page_no') and prov.page_no is not None:
                     page_numbers.append(prov.page_no)
-        # Remove duplicates and sort
-        page_numbers = sorted(set(page_numbers)) if page_numbers else []
     except Exception as e:
         print(f"Warning: Could not extract page numbers for chunk: {e}")
-        page_numbers = []
-    
-    processed_chunks.append({
-        "text": chunk.text,
-        "metadata": {
-            "filename": "KFH_Real_Estate_Report_2025_Q1.pdf",
-            "page_numbers": ", ".join(map(str, page_numbers)) if page_numbers else None,
-            "title": "KFH Real Estate Report 2025 Q1",
-        },
-    })
-
-# --------------------------------------------------------------
-# Generate embeddings and add to the table
-# --------------------------------------------------------------
-
-print(f"Generating embeddings for {len(processed_chunks)} chunks using Azure OpenAI...")
-
-# Process chunks in batches to avoid rate limits
-batch_size = 10
-all_embeddings = []
-
-for i in range(0, len(processed_chunks), batch_size):
-    batch = processed_chunks[i:i + batch_size]
-    batch_texts = [chunk["text"] for chunk in batch]
-    
-    print(f"Processing batch {i//batch_size + 1}/{(len(processed_chunks) + batch_size - 1)//batch_size}")
-    
-    try:
-        batch_embeddings = azure_openai_embedding(batch_texts)
-        all_embeddings.extend(batch_embeddings)
-        print(f"  ✅ Generated {len(batch_embeddings)} embeddings")
-    except Exception as e:
-        print(f"  ❌ Failed to generate embeddings for batch: {e}")
-        # Add zero vectors as fallback
-        all_embeddings.extend([[0.0] * 3072] * len(batch))
-
-# Add embeddings to the chunks
-for i, chunk in enumerate(processed_chunks):
-    chunk["vector"] = all_embeddings[i]
-
-print(f"Adding {len(processed_chunks)} chunks to LanceDB...")
-table.add(processed_chunks)
-
-# --------------------------------------------------------------
-# Load the table and show results
-# --------------------------------------------------------------
-
-df = table.to_pandas()
-print(f"Database created successfully!")
-print(f"Total rows: {table.count_rows()}")
-print(f"Sample data:")
-print(df.head(3)[['text', 'metadata']])
+        return []
+    return sorted(set(page_numbers))
+
+
+def chunk_section(chunk) -> Optional[str]:
+    """The closest heading above a chunk, if docling found one."""
+    headings = getattr(chunk.meta, "headings", None)
+    return headings[-1] if headings else None
+
+
+def iter_chunk_rows(outcomes, chunker, report, existing, seen_ids, failed_filenames):
+    """Lazily turns conversion outcomes into table rows that need embedding.
+
+    Chunks already stored under the same content id are counted as skipped and
+    never reach the embedder.
+    """
+    for outcome in outcomes:
+        filename = Path(outcome.source).name
+        if not outcome.ok:
+            failed_filenames.add(filename)
+            print(f"❌ Failed to convert {outcome.source}: {outcome.error}")
+            continue
+
+        title = Path(outcome.source).stem.replace("_", " ")
+        doc_id = document_id(outcome.source)
+        period = parse_report_period(filename)
+        origin = "cached" if outcome.cached else f"{outcome.seconds:.1f}s"
+        print(f"✅ {filename} converted ({origin}), streaming chunks...")
+
+        for chunk in chunker.chunk(dl_doc=outcome.document):
+            page_numbers = chunk_page_numbers(chunk)
+            section = chunk_section(chunk)
+            metadata = {
+                "filename": filename,
+                "page_numbers": page_numbers or None,
+                "title": title,
+            }
+            row_id = chunk_id(filename, chunk.text, {**metadata, "section": section})
+            seen_ids.add(row_id)
+            if row_id in existing:
+                report.skipped += 1
+                continue
+            yield {
+                "id": row_id,
+                "doc_id": doc_id,
+                "report_period": period,
+                "section": section,
+                "sectors": detect_sectors(chunk.text) or None,
+                "text": chunk.text,
+                "metadata": metadata,
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embed documents into LanceDB.")
+    parser.add_argument(
+        "sources",
+        nargs="*",
+        default=["KFH_Real_Estate_Report_2025_Q1.pdf"],
+        help="Documents, directories or manifest files to ingest",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Number of converter processes"
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Drop and recreate the table instead of upserting changed chunks",
+    )
+    parser.add_argument(
+        "--keep-missing",
+        action="store_true",
+        help="Keep chunks of documents that are not part of this run",
+    )
+    parser.add_argument(
+        "--reindex",
+        action="store_true",
+        help="Rebuild the vector and full-text indexes even if they are current",
+    )
+    parser.add_argument(
+        "--batch-rows",
+        type=int,
+        default=256,
+        help="Chunks embedded and written per streaming batch",
+    )
+    args = parser.parse_args()
+
+    documents = [doc for source in args.sources for doc in discover_documents(source)]
+    print(f"Processing {len(documents)} documents")
+
+    # --------------------------------------------------------------
+    # Create a LanceDB database and table
+    # --------------------------------------------------------------
+
+    # Create a LanceDB database
+    db = lancedb.connect("data/lancedb")
+
+    schema = Chunks.to_arrow_schema()
+
+    # Upsert into the live table when possible so the chat app never sees it empty
+    table = None
+    if not args.rebuild and "docling" in db.table_names():
+        table = db.open_table("docling")
+        if not supports_incremental(table):
+            print("Existing table has no chunk ids; rebuilding it once")
+            table = None
+        elif not matches_vector_config(table):
+            # Vectors of a different size or precision cannot be mixed in one column
+            print("Existing table uses a different embedding size or storage type; rebuilding it")
+            table = None
+        elif not table.schema.equals(schema):
+            print("Existing table predates the current schema; rebuilding it once")
+            table = None
+
+    if table is None:
+        table = db.create_table("docling", schema=Chunks, mode="overwrite")
+        print("Created new table with updated schema")
+    else:
+        print("Updating existing table incrementally")
+
+    # --------------------------------------------------------------
+    # Stream: convert -> chunk -> embed -> write
+    # --------------------------------------------------------------
+
+    # Documents are converted in parallel and chunked lazily with the hybrid
+    # chunker; embedded chunks land in LanceDB in bounded Arrow batches, so rows
+    # become queryable while later documents are still being processed
+    chunker = HybridChunker(
+        max_tokens=MAX_TOKENS,
+        merge_peers=True,
+    )
+
+    report = UpsertReport()
+    existing = existing_chunk_ids(table)
+    seen_ids = set()
+    failed_filenames = set()
+
+    rows = iter_chunk_rows(
+        convert_documents(documents, max_workers=args.workers),
+        chunker,
+        report,
+        existing,
+        seen_ids,
+        failed_filenames,
+    )
+
+    def embed_batch(batch):
+        try:
+            vectors = azure_openai_embedding([row["text"] for row in batch])
+            failures = {}
+        except EmbeddingBatchError as e:
+            vectors, failures = e.vectors, e.failed
+
+        embedded = []
+        for i, (row, vector) in enumerate(zip(batch, vectors)):
+            if i in failures:
+                # Leave the chunk out so the next run retries it; its stored
+                # predecessors are protected from deletion below
+                print(f"  ❌ Failed to embed chunk from {row['metadata']['filename']}: {failures[i]}")
+                report.failed += 1
+                failed_filenames.add(row["metadata"]["filename"])
+                continue
+            row["vector"] = vector
+            embedded.append(row)
+        return embedded
+
+    def write_batch(batch):
+        upsert_rows(table, rows_to_arrow(batch, schema))
+        report.upserted += len(batch)
+        print(f"  ✅ Wrote {len(batch)} chunks ({report.upserted} so far)")
+
+    run_streaming_pipeline(rows, embed_batch, write_batch, batch_rows=args.batch_rows)
+
+    # Remove stale chunks only after their replacements are in place
+    stale_ids = find_stale_ids(
+        existing,
+        seen_ids,
+        current_filenames={Path(doc).name for doc in documents},
+        protected_filenames=failed_filenames,
+        prune_missing=not args.keep_missing,
+    )
+    delete_ids(table, stale_ids)
+    report.removed = len(stale_ids)
+
+    # Many small streaming commits leave many small fragments; compact them
+    if report.upserted or report.removed:
+        table.optimize()
+
+    print(f"Ingestion summary: {report}")
+
+    # Keep search sublinear: build the ANN index once the corpus is large enough
+    # and retrain it when the table has outgrown its partitions
+    print(f"Index: {ensure_vector_index(table, force=args.reindex)}")
+
+    # BM25 index for hybrid retrieval and the embedding-free fallback
+    print(f"Index: {ensure_fts_index(table, force=args.reindex)}")
+
+    # Scalar indexes let filters on document, period, section and page be
+    # resolved before the vector scan
+    for index_report in ensure_scalar_indexes(table, force=args.reindex):
+        print(f"Index: {index_report}")
+
+    # --------------------------------------------------------------
+    # Show results
+    # --------------------------------------------------------------
+
+    print(f"Database updated successfully!")
+    print(f"Total rows: {table.count_rows()}")
+    print(f"Sample data:")
+    sample = table.search().select(["text", "metadata"]).limit(3).to_pandas()
+    print(sample)
+
+
+# Guarded so the spawned converter processes can re-import this module safely
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,24 @@
 import lancedb
-from openai import AzureOpenAI
 from dotenv import load_dotenv
 import os
+from typing import List, Optional
+
+from utils.async_pipeline import ChatPipeline, get_background_loop
+from utils.clients import client_for
+from utils.context_packing import pack_context
+from utils.conversation_memory import ConversationMemory, openai_summarizer
+from utils.embeddings import CachedEmbedder
+from utils.query_filters import QueryFilters, document_ids, parse_query_filters
+from utils.retrieval import SearchHit
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Azure OpenAI client
-client = AzureOpenAI(
-    api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-    api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-15-preview"),
-    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT")
-)
+# Embeddings go through the shared on-disk/in-memory cache
+embedder = CachedEmbedder(client_for("query_embedding"))
 
-def azure_openai_embedding(texts):
-    """Custom embedding function using Azure OpenAI"""
-    if isinstance(texts, str):
-        texts = [texts]
-    
-    try:
-        response = client.embeddings.create(
-            model=os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME"),
-            input=texts
-        )
-        return [data.embedding for data in response.data]
-    except Exception as e:
-        print(f"Azure OpenAI embedding error: {e}")
-        raise
+# Embedding, search and completion requests run on a background event loop
+background = get_background_loop()
 
 # Initialize LanceDB connection
 def init_db():
@@ -34,37 +26,18 @@ def init_db():
     db = lancedb.connect("data/lancedb")
     return db.open_table("docling")
 
-def get_context(query: str, table, num_results: int = 5) -> str:
+def get_context(
+    pipeline: ChatPipeline,
+    query: str,
+    num_results: int = 5,
+    where: Optional[str] = None,
+    filters: Optional[QueryFilters] = None,
+) -> List[SearchHit]:
     """Search the database for relevant context."""
-    # Convert query to vector using Azure OpenAI
-    query_vector = azure_openai_embedding(query)[0]
-    
-    # Search using vector similarity
-    results = table.search(query=query_vector, query_type="vector").limit(num_results).to_pandas()
-    contexts = []
-
-    for _, row in results.iterrows():
-        # Extract metadata
-        filename = row["metadata"]["filename"]
-        page_numbers = row["metadata"]["page_numbers"]
-        title = row["metadata"]["title"]
-
-        # Build source citation
-        source_parts = []
-        if filename:
-            source_parts.append(filename)
-        if page_numbers:
-            source_parts.append(f"p. {page_numbers}")
+    # The query embedding and the keyword search run concurrently
+    return background.run(pipeline.retrieve(query, filters, where, num_results)).hits
 
-        source = f"\nSource: {' - '.join(source_parts)}"
-        if title:
-            source += f"\nTitle: {title}"
-
-        contexts.append(f"{row['text']}{source}")
-
-    return "\n\n".join(contexts)
-
-def get_chat_response(messages, context: str) -> str:
+def get_chat_response(pipeline: ChatPipeline, messages, context: str) -> str:
     """Get response from Azure OpenAI API."""
     system_prompt = f"""You are a helpful real estate analyst assistant that answers questions based on the KFH Real Estate Report 2025 Q1.
     Use only the information from the provided context to answer questions. If you're unsure or the context
@@ -79,15 +52,10 @@ def get_chat_response(messages, context: str) -> str:
     messages_with_context = [{"role": "system", "content": system_prompt}, *messages]
 
     # Create the response
-    response = client.chat.completions.create(
-        model=os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT_NAME"),
-        messages=messages_with_context,
-        temperature=0.7,
-        max_tokens=1000,
+    return background.run(
+        pipeline.complete(messages_with_context, temperature=0.7, max_tokens=1000)
     )
 
-    return response.choices[0].message.content
-
 def main():
     print("🏠 KFH Real Estate Report 2025 Q1 - Q&A Assistant")
     print("=" * 60)
@@ -103,8 +71,17 @@ def main():
         print(f"❌ Database connection failed: {e}")
         return
 
-    # Chat loop
+    # Reports the user can name in a question
+    doc_ids = document_ids(table)
+    pipeline = ChatPipeline(
+        table, embedder, chat_model=os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT_NAME")
+    )
+
+    # Chat loop; recent turns are sent verbatim, older ones as a summary
     messages = []
+    memory = ConversationMemory(
+        openai_summarizer(client_for("summary"), os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT_NAME"))
+    )
     
     while True:
         try:
@@ -120,15 +97,21 @@ def main():
 
             print("\n🔍 Searching real estate report...")
             
-            # Get relevant context
-            context = get_context(user_input, table, num_results=3)
+            # Get relevant context, scoped to the periods and sectors asked about
+            filters = parse_query_filters(user_input, doc_ids)
+            if filters:
+                print(f"🎯 Scoped to {filters.describe()}")
+            hits = get_context(pipeline, user_input, num_results=3, filters=filters)
+            packed = pack_context(hits)
             
             print(f"📄 Found relevant sections from the report:")
+            print(f"🧮 {packed.summary()}")
             print("-" * 50)
             
             # Display context
-            for i, chunk in enumerate(context.split("\n\n"), 1):
-                print(f"\n{i}. {chunk[:200]}...")
+            for i, hit in enumerate(packed.hits, 1):
+                print(f"\n{i}. {hit.text[:200]}...")
+                print(f"   Source: {hit.citation()}")
             
             print("-" * 50)
             
@@ -138,7 +121,7 @@ def main():
             print("\n🤖 Generating AI response...")
             
             # Get AI response
-            response = get_chat_response(messages, context)
+            response = get_chat_response(pipeline, memory.build(messages), packed.text)
             
             print(f"\n💡 AI Response:")
             print("-" * 50)
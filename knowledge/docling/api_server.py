@@ -0,0 +1,336 @@
+import asyncio
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+from typing import Annotated, Any, AsyncIterator, Dict, List, Literal, Optional
+
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field, StringConstraints
+
+from utils.async_pipeline import ChatPipeline
+from utils.chat_prompt import chat_messages, detect_definition_request, format_definition_response
+from utils.clients import client_for
+from utils.context_packing import pack_context
+from utils.conversation_memory import ConversationMemory
+from utils.embeddings import CachedEmbedder
+from utils.query_filters import SECTOR_PATTERNS, QueryFilters, document_ids, parse_query_filters
+from utils.response_cache import get_response_cache, history_namespace, stream_text
+from utils.retrieval import connect_database
+from utils.visualization import (
+    create_data_summary_table,
+    create_visualization,
+    detect_chart_type,
+    extract_data_for_visualization,
+)
+
+load_dotenv()
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.getenv("DB_PATH", os.path.join(SCRIPT_DIR, "data", "lancedb"))
+TABLE_NAME = os.getenv("TABLE_NAME", "docling")
+
+# Seconds allowed for a search or visualization request, and for a whole
+# streamed answer
+REQUEST_TIMEOUT = float(os.getenv("API_REQUEST_TIMEOUT", 30))
+CHAT_TIMEOUT = float(os.getenv("API_CHAT_TIMEOUT", 120))
+
+
+# --------------------------------------------------------------
+# Request and response models
+# --------------------------------------------------------------
+
+
+ReportPeriod = Annotated[str, StringConstraints(pattern=r"^\d{4}-Q[1-4]$")]
+Sector = Literal[tuple(SECTOR_PATTERNS)]
+
+
+class SearchRequest(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    query: str = Field(..., min_length=1)
+    k: int = Field(5, ge=1, le=50)
+    # Explicit scope on top of what the query names; each list matches any
+    # of its values. Rendered to SQL by QueryFilters, never passed through.
+    report_period: List[ReportPeriod] = Field(default_factory=list)  # e.g. ["2025-Q1"]
+    sectors: List[Sector] = Field(default_factory=list)
+    doc_id: List[str] = Field(default_factory=list)
+
+    def scope(self) -> QueryFilters:
+        return QueryFilters(
+            periods=self.report_period, sectors=list(self.sectors), doc_ids=self.doc_id
+        )
+
+
+class ChatMessage(BaseModel):
+    role: str
+    content: str
+
+
+class ChatRequest(BaseModel):
+    question: str = Field(..., min_length=1)
+    history: List[ChatMessage] = Field(default_factory=list)  # Earlier turns, oldest first
+    # The API keeps no conversation state, so it never summarizes; a client
+    # that wants turns older than the window kept sends its own summary
+    summary: str = Field("", max_length=8000)
+    k: int = Field(5, ge=1, le=20)
+
+
+class VisualizeRequest(BaseModel):
+    question: str = Field(..., min_length=1)
+    k: int = Field(5, ge=1, le=20)
+
+
+# --------------------------------------------------------------
+# Service state, created once per worker
+# --------------------------------------------------------------
+
+
+class Service:
+    def __init__(self):
+        self.table = None
+        self.pipeline: Optional[ChatPipeline] = None
+        self.embedder = CachedEmbedder(client_for("query_embedding"))
+        self.response_cache = get_response_cache()
+        self.error: Optional[str] = None
+        self._doc_ids: Dict[Any, List[str]] = {}
+
+    def open(self) -> None:
+        """Opens the table; a failure leaves the service alive but not ready."""
+        try:
+            # Sees ingestion runs in other processes (see connect_database)
+            self.table = connect_database(DB_PATH).open_table(TABLE_NAME)
+            self.pipeline = ChatPipeline(self.table, self.embedder)
+            self.error = None
+        except Exception as e:
+            self.table, self.pipeline = None, None
+            self.error = f"Cannot open table '{TABLE_NAME}' in {DB_PATH}: {e}"
+            print(f"❌ {self.error}")
+
+    def require_pipeline(self) -> ChatPipeline:
+        if self.pipeline is None:
+            raise HTTPException(status_code=503, detail=self.error or "Service not ready")
+        return self.pipeline
+
+    async def table_version(self) -> int:
+        """Current table version; reading it may check storage for new versions."""
+        return await asyncio.to_thread(lambda: self.table.version)
+
+    async def known_document_ids(self) -> List[str]:
+        """Document ids in the table, re-read (off the event loop) only when
+        the table version changes."""
+        version = await self.table_version()
+        if version not in self._doc_ids:
+            self._doc_ids = {version: await asyncio.to_thread(document_ids, self.table)}
+        return self._doc_ids[version]
+
+
+service = Service()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await asyncio.to_thread(service.open)
+    yield
+
+
+app = FastAPI(title="KFH Real Estate RAG API", lifespan=lifespan)
+
+
+async def with_timeout(coroutine, timeout: float = REQUEST_TIMEOUT):
+    try:
+        return await asyncio.wait_for(coroutine, timeout)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=f"Request timed out after {timeout:.0f}s")
+
+
+def sse(event: str, data: Any) -> str:
+    """One server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+# --------------------------------------------------------------
+# Health
+# --------------------------------------------------------------
+
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the worker is up."""
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: the table is open and searchable."""
+    if service.table is None:
+        await asyncio.to_thread(service.open)
+    if service.table is None:
+        return JSONResponse({"status": "unavailable", "error": service.error}, status_code=503)
+    try:
+        rows = await asyncio.to_thread(service.table.count_rows)
+    except Exception as e:
+        return JSONResponse({"status": "unavailable", "error": str(e)}, status_code=503)
+    version = await service.table_version()
+    return {"status": "ready", "table": TABLE_NAME, "rows": rows, "version": version}
+
+
+# --------------------------------------------------------------
+# Search, chat and visualization
+# --------------------------------------------------------------
+
+
+@app.post("/search")
+async def search(request: SearchRequest):
+    """Retrieves the most relevant chunks for a query."""
+    pipeline = service.require_pipeline()
+    filters = parse_query_filters(request.query, await service.known_document_ids())
+    turn = await with_timeout(
+        pipeline.retrieve(request.query, filters, request.scope().to_where(), request.k)
+    )
+    return {
+        "query": request.query,
+        "scope": filters.describe(),
+        "hits": [asdict(hit) for hit in turn.hits],
+    }
+
+
+@app.post("/chat")
+async def chat(request: ChatRequest):
+    """Answers a question, streaming server-sent events.
+
+    Events: `context` (the hits used and token usage), then `token` for each
+    piece of the answer, then `done` with the full answer; `error` on failure.
+    """
+    pipeline = service.require_pipeline()
+    question = request.question
+
+    # The client sends the history; recent turns are kept within the same
+    # budget as the Streamlit app, older ones are dropped unless the client
+    # sent a summary of them
+    history = [message.model_dump() for message in request.history]
+    memory = ConversationMemory(summary=request.summary)
+    messages = memory.build([*history, {"role": "user", "content": question}])
+
+    # Answers are only reused for questions with the same scope, asked after
+    # the same conversation
+    filters = parse_query_filters(question, await service.known_document_ids())
+    namespace = history_namespace(
+        f"{service.embedder.namespace}|{filters.describe()}", messages[:-1]
+    )
+
+    # A near-duplicate question is answered from the response cache, which
+    # only needs the query embedding; the search runs on a miss alone
+    try:
+        query_vector = await asyncio.wait_for(pipeline.embed_query(question), REQUEST_TIMEOUT)
+    except Exception as e:
+        print(f"Query embedding failed, searching by keywords only: {e}")
+        query_vector = None
+    version = await service.table_version()
+    cached = None
+    if query_vector is not None:
+        cached = service.response_cache.lookup(query_vector, version, namespace=namespace)
+    if cached:
+        hits = cached.context
+    else:
+        turn = await with_timeout(pipeline.retrieve(question, filters, num_results=request.k))
+        hits = turn.hits
+    packed = pack_context(hits)
+
+    async def events() -> AsyncIterator[str]:
+        yield sse(
+            "context",
+            {
+                "scope": filters.describe(),
+                "usage": packed.summary(),
+                "cached": cached is not None,
+                "hits": [asdict(hit) for hit in packed.hits],
+            },
+        )
+
+        deadline = time.monotonic() + CHAT_TIMEOUT
+        pieces: List[str] = []
+        try:
+            if cached:
+                for piece in stream_text(cached.answer):
+                    pieces.append(piece)
+                    yield sse("token", piece)
+            else:
+                stream = pipeline.stream_chat(
+                    chat_messages(messages, packed.text), temperature=0.7, max_tokens=300
+                ).__aiter__()
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError
+                    try:
+                        piece = await asyncio.wait_for(stream.__anext__(), remaining)
+                    except StopAsyncIteration:
+                        break
+                    pieces.append(piece)
+                    yield sse("token", piece)
+        except asyncio.TimeoutError:
+            yield sse("error", {"detail": f"Answer timed out after {CHAT_TIMEOUT:.0f}s"})
+            return
+        except Exception as e:
+            yield sse("error", {"detail": f"Error getting response: {e}"})
+            return
+
+        answer = "".join(pieces)
+        if not cached and query_vector is not None:
+            service.response_cache.store(
+                question, query_vector, hits, answer, version, namespace=namespace
+            )
+        if detect_definition_request(question):
+            answer = format_definition_response(answer)
+        yield sse("done", {"answer": answer})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/visualize")
+async def visualize(request: VisualizeRequest):
+    """Extracts chartable figures from the relevant chunks.
+
+    Returns the extracted data, the chart type the question asks for, a
+    Markdown summary table and the Plotly figure as JSON.
+    """
+    pipeline = service.require_pipeline()
+    question = request.question
+    filters = parse_query_filters(question, await service.known_document_ids())
+
+    async def build() -> Dict[str, Any]:
+        turn = await pipeline.retrieve(question, filters, num_results=request.k)
+        context = pack_context(turn.hits).text
+        data = await asyncio.to_thread(extract_data_for_visualization, context, question)
+        if not data["values"]:
+            return {"data": data, "chart_type": None, "summary": None, "figure": None}
+        chart_type = detect_chart_type(question)
+        figure = await asyncio.to_thread(create_visualization, data, chart_type, question)
+        return {
+            "data": data,
+            "chart_type": chart_type,
+            "summary": create_data_summary_table(data, question),
+            "figure": json.loads(figure.to_json()),
+        }
+
+    return await with_timeout(build())
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(
+        "api_server:app",
+        host=os.getenv("API_HOST", "0.0.0.0"),
+        port=int(os.getenv("API_PORT", 8000)),
+        workers=int(os.getenv("API_WORKERS", 2)),
+        timeout_keep_alive=int(os.getenv("API_KEEPALIVE_SECONDS", 30)),
+    )
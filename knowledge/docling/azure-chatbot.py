@@ -1,6 +1,4 @@
 import streamlit as st
-import lancedb
-from openai import AzureOpenAI
 from dotenv import load_dotenv
 import os
 import pandas as pd
@@ -8,7 +6,19 @@ import plotly.express as px
 import plotly.graph_objects as go
 import numpy as np
 import re
-from typing import Dict, List, Any
+import html
+from typing import Dict, Iterator, List, Any, Optional
+
+from utils.async_pipeline import ChatPipeline, get_background_loop
+from utils.chat_prompt import chat_messages
+from utils.clients import client_for
+from utils.context_packing import pack_context
+from utils.conversation_memory import ConversationMemory, openai_summarizer
+from utils.embeddings import CachedEmbedder
+from utils.query_cache import get_query_cache
+from utils.query_filters import QueryFilters, combine_where, document_ids, parse_query_filters
+from utils.response_cache import get_response_cache, history_namespace, stream_text
+from utils.retrieval import SearchHit, connect_database, hits_from_arrow, lexical_search
 
 # Load environment variables
 load_dotenv()
@@ -21,31 +31,23 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Initialize Azure OpenAI client
-client = AzureOpenAI(
-    api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-    api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-15-preview"),
-    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT")
-)
+# Embeddings go through the shared on-disk/in-memory cache. Query embeddings
+# get a short timeout so a slow API degrades to keyword search instead of hanging
+embedder = CachedEmbedder(client_for("query_embedding"))
 
 # Database path configuration - Azure compatible
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(SCRIPT_DIR, "data", "lancedb")
 
-def azure_openai_embedding(texts):
-    """Custom embedding function using Azure OpenAI"""
-    if isinstance(texts, str):
-        texts = [texts]
-    
-    try:
-        response = client.embeddings.create(
-            model=os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME"),
-            input=texts
-        )
-        return [data.embedding for data in response.data]
-    except Exception as e:
-        st.error(f"Azure OpenAI embedding error: {e}")
-        return None
+# Repeated questions (reruns, sample questions) skip the embeddings round trip,
+# and paraphrases of an answered question reuse its answer; both caches are
+# process-wide, so they are shared by every Streamlit session
+query_cache = get_query_cache()
+response_cache = get_response_cache()
+
+# Embedding, search and completion requests run on one background event loop,
+# as in 5-chat.py; the script only waits for their results
+background = get_background_loop()
 
 # Initialize LanceDB connection with Azure compatibility
 @st.cache_resource
@@ -64,7 +66,8 @@ def init_db():
         
         # Try to connect to database
         if os.path.exists(DB_PATH):
-            db = lancedb.connect(DB_PATH)
+            # Sees ingestion runs in other processes (see connect_database)
+            db = connect_database(DB_PATH)
             table = db.open_table("docling")
             st.success("✅ Database connected successfully!")
             return table
@@ -76,8 +79,44 @@ def init_db():
         st.info(f"Error: {str(e)}")
         return None
 
-def get_context_fallback(query: str) -> str:
-    """Fallback context when database is not available"""
+@st.cache_data(show_spinner=False)
+def known_document_ids(_table, table_version) -> List[str]:
+    """Document ids in the table, re-read only when the table version changes."""
+    return document_ids(_table)
+
+@st.cache_resource
+def get_pipeline(_table) -> ChatPipeline:
+    """Async retrieval and generation pipeline, shared by every session."""
+    return ChatPipeline(_table, embedder)
+
+def embed_query(query: str, table) -> Optional[List[float]]:
+    """Query embedding, from the query cache or one request; None if it fails."""
+    try:
+        return background.run(get_pipeline(table).embed_query(query))
+    except Exception as e:
+        print(f"Query embedding failed, searching by keywords only: {e}")
+        return None
+
+def get_context_fallback(
+    query: str, table=None, num_results: int = 5, where: Optional[str] = None
+) -> List[SearchHit]:
+    """Fallback context when the embedding API is not available.
+
+    Searches the BM25 full-text index, which needs no embedding. Returns no
+    hits without a table; see `fallback_context_message`.
+    """
+    if table is None:
+        return []
+    try:
+        return hits_from_arrow(
+            lexical_search(table, query, num_results, where=where).to_arrow()
+        )
+    except Exception as e:
+        print(f"Keyword search fallback failed: {e}")
+        return []
+
+def fallback_context_message(query: str) -> str:
+    """Prompt context used when nothing could be retrieved"""
     return f"""
     This is a fallback response for your query: "{query}"
     
@@ -89,119 +128,78 @@ def get_context_fallback(query: str) -> str:
     To get full functionality, please ensure the database is properly set up.
     """
 
-def get_context(query: str, table, num_results: int = 5) -> str:
+def get_context(
+    query: str,
+    table,
+    num_results: int = 5,
+    where: Optional[str] = None,
+    filters: Optional[QueryFilters] = None,
+) -> List[SearchHit]:
     """Search the database for relevant context.
 
+    Runs `ChatPipeline.retrieve` on the background loop: keyword and vector
+    rankings are fused and diversified, and a failed query embedding degrades
+    to keyword search. Errors fall back to `get_context_fallback`.
+
     Args:
         query: User's question
         table: LanceDB table object
         num_results: Number of results to return
+        where: SQL filter pushed down before the scan, e.g.
+            "report_period = '2025-Q1'" or "doc_id = 'KFH_Real_Estate_Report_2025_Q1'"
+        filters: Periods, sectors and documents named in the question; parsed
+            from the query when omitted
 
     Returns:
-        str: Concatenated context from relevant chunks with source information
+        List[SearchHit]: Relevant chunks with score and source information
     """
     if table is None:
-        return get_context_fallback(query)
-    
+        return []
+    if filters is None:
+        filters = parse_query_filters(query)
     try:
-        # Convert query to vector using Azure OpenAI
-        query_vector = azure_openai_embedding(query)
-        if query_vector is None:
-            return get_context_fallback(query)
-        
-        # Search using vector similarity
-        results = table.search(query=query_vector[0], query_type="vector").limit(num_results).to_pandas()
-        contexts = []
-
-        for _, row in results.iterrows():
-            # Extract metadata
-            filename = row["metadata"]["filename"]
-            page_numbers = row["metadata"]["page_numbers"]
-            title = row["metadata"]["title"]
-
-            # Build source citation
-            source_parts = []
-            if filename:
-                source_parts.append(filename)
-            if page_numbers:
-                source_parts.append(f"p. {', '.join(str(p) for p in page_numbers)}")
-
-            source = f"\nSource: {' - '.join(source_parts)}"
-            if title:
-                source += f"\nTitle: {title}"
-
-            contexts.append(f"{row['text']}{source}")
-
-        return "\n\n".join(contexts)
+        turn = background.run(get_pipeline(table).retrieve(query, filters, where, num_results))
+        return turn.hits
     except Exception as e:
         st.error(f"Error searching database: {e}")
-        return get_context_fallback(query)
+        return get_context_fallback(
+            query, table, num_results, combine_where(where, filters.to_where())
+        )
+
+def start_chat_response(table, messages, context: str) -> Iterator[str]:
+    """Starts a streaming completion on the background loop.
 
-def get_chat_response(messages, context: str) -> str:
-    """Get streaming response from Azure OpenAI API.
+    The request is sent immediately, so the model works on its first token
+    while the caller renders the search results.
 
     Args:
+        table: LanceDB table object
         messages: Chat history
         context: Retrieved context from database
 
     Returns:
-        str: Model's response
-    """
-    system_prompt = f"""You are a helpful real estate analyst assistant that answers questions based on the KFH Real Estate Report 2025 Q1.
-    Use only the information from the provided context to answer questions. If you're unsure or the context
-    doesn't contain the relevant information, say so.
-    
-    RESPONSE STYLE: CONCISE & FOCUSED
-    - Keep answers brief and to the point
-    - Use bullet points for key data
-    - Highlight important numbers with **bold**
-    - Avoid lengthy explanations unless specifically requested
-    - Focus on the most relevant information first
-    
-    DEFINITION RESPONSES:
-    - For "what is", "definition", "what does mean" questions:
-      * Provide clear, concise definitions
-      * Use bullet points for key characteristics
-      * Highlight specific requirements or criteria with **bold**
-      * Include relevant examples if available
-      * Keep to 3-5 key points maximum
-    
-    VISUALIZATION REQUESTS:
-    - When users ask for charts, graphs, or visualizations:
-      * Provide a brief summary of the data that will be visualized
-      * Mention that a chart has been generated and displayed
-      * Keep the text response concise since the chart shows the data
-    
-    Context from KFH Real Estate Report 2025 Q1:
-    {context}
-    
-    Always provide accurate, data-driven insights based on the report content.
-    Be concise and direct in your responses.
+        Iterator[str]: Response text as it arrives, for `st.write_stream`
     """
+    return background.stream(
+        get_pipeline(table).stream_chat(
+            chat_messages(messages, context),
+            temperature=0.7,
+            max_tokens=1000,  # Controlled response length
+        )
+    )
+
+def get_chat_response(answer_stream: Iterator[str]) -> str:
+    """Renders a streaming response from Azure OpenAI.
 
-    messages_with_context = [{"role": "system", "content": system_prompt}, *messages]
+    Args:
+        answer_stream: Stream from `start_chat_response`
 
+    Returns:
+        str: Model's response, or an error message starting with
+        "Error getting response"
+    """
     try:
-        # Create the streaming response with controlled length
-        stream = client.chat.completions.create(
-            model=os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME"),
-            messages=messages_with_context,
-            stream=True,
-            max_tokens=1000,
-            temperature=0.7
-        )
-        
-        response = ""
-        message_placeholder = st.empty()
-        
-        for chunk in stream:
-            if chunk.choices[0].delta.content is not None:
-                response += chunk.choices[0].delta.content
-                message_placeholder.markdown(response + "▌")
-        
-        message_placeholder.markdown(response)
-        return response
-        
+        return st.write_stream(answer_stream)
     except Exception as e:
         error_msg = f"Error getting response from Azure OpenAI: {e}"
         st.error(error_msg)
@@ -285,6 +283,12 @@ def main():
     if "messages" not in st.session_state:
         st.session_state.messages = []
 
+    # Recent turns are sent verbatim, older ones as a summary written in the background
+    if "memory" not in st.session_state:
+        st.session_state.memory = ConversationMemory(
+            openai_summarizer(client_for("summary"), os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME"))
+        )
+
     # Display chat messages
     if st.session_state.messages:
         for message in st.session_state.messages:
@@ -300,9 +304,45 @@ def main():
         # Add user message to chat history
         st.session_state.messages.append({"role": "user", "content": prompt})
 
+        # Recent turns verbatim, older ones as the rolling summary
+        history = st.session_state.memory.build(st.session_state.messages)
+
+        # A near-duplicate of an earlier question is answered from the response
+        # cache, skipping both the search and the completion
+        # Periods, sectors and reports named in the question narrow the
+        # search; answers are only reused for questions with the same scope,
+        # asked after the same conversation
+        filters = QueryFilters()
+        query_vector = None
+        cached = None
+        if table is not None:
+            filters = parse_query_filters(prompt, known_document_ids(table, table.version))
+        cache_namespace = history_namespace(
+            f"{embedder.namespace}|{filters.describe()}", history[:-1]
+        )
+        if table is not None and not detect_visualization_request(prompt):
+            query_vector = embed_query(prompt, table)
+            if query_vector is not None:
+                cached = response_cache.lookup(
+                    query_vector, table.version, namespace=cache_namespace
+                )
+
         # Get relevant context
         with st.status("🔍 Searching real estate report...", expanded=False) as status:
-            context = get_context(prompt, table)
+            hits = cached.context if cached else get_context(prompt, table, filters=filters)
+            # Fill the context token budget in relevance order, trimming the
+            # chunk that overflows it
+            packed = pack_context(hits)
+            context = packed.text if hits else fallback_context_message(prompt)
+
+            # Start the completion now; it runs while the results below render
+            answer_stream = None
+            if table is not None and not cached and not detect_visualization_request(prompt):
+                answer_stream = start_chat_response(table, history, context)
+            if filters:
+                st.caption(f"🎯 Scoped to {filters.describe()}")
+            if hits:
+                st.caption(f"🧮 {packed.summary()}")
             
             if table is not None:
                 st.markdown(
@@ -333,33 +373,23 @@ def main():
                 )
 
                 st.write("📄 Found relevant sections from the report:")
-                for chunk in context.split("\n\n"):
-                    if chunk.strip():
-                        # Split into text and metadata parts
-                        parts = chunk.split("\n")
-                        if len(parts) > 1:
-                            text = parts[0]
-                            metadata = {
-                                line.split(": ")[0]: line.split(": ")[1]
-                                for line in parts[1:]
-                                if ": " in line
-                            }
-
-                            source = metadata.get("Source", "Unknown source")
-                            title = metadata.get("Title", "KFH Real Estate Report 2025 Q1")
-
-                            st.markdown(
-                                f"""
-                                <div class="search-result">
-                                    <details>
-                                        <summary>{source}</summary>
-                                        <div class="metadata">Section: {title}</div>
-                                        <div style="margin-top: 8px;">{text}</div>
-                                    </details>
-                                </div>
-                            """,
-                                unsafe_allow_html=True,
-                            )
+                for hit in packed.hits:
+                    source = html.escape(hit.citation() or "Unknown source")
+                    title = html.escape(hit.title or "KFH Real Estate Report 2025 Q1")
+                    text = html.escape(hit.text)
+
+                    st.markdown(
+                        f"""
+                        <div class="search-result">
+                            <details>
+                                <summary>{source}</summary>
+                                <div class="metadata">Section: {title}</div>
+                                <div style="margin-top: 8px;">{text}</div>
+                            </details>
+                        </div>
+                    """,
+                        unsafe_allow_html=True,
+                    )
             else:
                 st.info("📝 Using fallback context - database not available")
 
@@ -380,22 +410,39 @@ def main():
                 
                 **For now, I can help with general real estate questions** or you can try reconnecting the database.
                 """
+                st.markdown(response)
             else:
                 # Check if user wants visualization
                 is_visualization_request = detect_visualization_request(prompt)
                 
                 if is_visualization_request:
                     response = "I can see you want a visualization! However, the visualization features require the full database to be available. Please ensure the database is properly connected to enable chart generation."
+                    st.markdown(response)
+                elif cached:
+                    response = st.write_stream(stream_text(cached.answer))
+                    st.caption(
+                        f"⚡ Answered from cache (similarity {cached.similarity:.2f} to "
+                        f"\"{cached.question}\")"
+                    )
+                    if detect_definition_request(prompt):
+                        response = format_definition_response(response)
                 else:
-                    # Get regular model response
-                    response = get_chat_response(st.session_state.messages, context)
+                    # Regular model response, streamed since before the results rendered
+                    response = get_chat_response(answer_stream)
+                    if query_vector is not None and not response.startswith("Error getting response"):
+                        response_cache.store(
+                            prompt,
+                            query_vector,
+                            hits,
+                            response,
+                            table.version,
+                            namespace=cache_namespace,
+                        )
                     
                     # Check if this is a definition request and format accordingly
                     if detect_definition_request(prompt):
                         response = format_definition_response(response)
 
-            st.markdown(response)
-
         # Add assistant response to chat history
         st.session_state.messages.append({"role": "assistant", "content": response})
 
@@ -439,8 +486,28 @@ def main():
             st.warning("Limited functionality")
             st.info("Check deployment configuration")
         
+        st.header("⚡ Query Cache")
+        cache_stats = query_cache.stats()
+        col1, col2 = st.columns(2)
+        col1.metric("Hits", cache_stats.hits)
+        col2.metric("Misses", cache_stats.misses)
+        st.caption(
+            f"Hit rate {cache_stats.hit_rate:.0%} · {cache_stats.entries} cached queries · "
+            f"~{cache_stats.saved_seconds:.1f}s of embedding latency saved"
+        )
+        answer_stats = response_cache.stats()
+        st.caption(
+            f"Answer cache: {answer_stats.hits} reused answers · {answer_stats.entries} stored"
+        )
+        if table is not None:
+            flight_stats = get_pipeline(table).flights.stats()
+            st.caption(
+                f"Coalesced: {flight_stats.shared} requests joined an identical one in flight"
+            )
+        
         if st.button("Clear Chat History"):
             st.session_state.messages = []
+            st.session_state.memory.reset()
             st.rerun()
 
 if __name__ == "__main__":
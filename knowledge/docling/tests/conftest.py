@@ -0,0 +1,142 @@
+import os
+import sqlite3
+import sys
+from typing import Any, Dict, Iterator, List
+
+import lancedb
+import numpy as np
+import openai
+import pyarrow as pa
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils.context_packing as context_packing  # noqa: E402
+from utils.embeddings import CachedEmbedder, EmbeddingCache  # noqa: E402
+from utils.indexing import ensure_fts_index  # noqa: E402
+from utils.mock_azure import MockAzureOpenAI, MockSettings, mock_embedding, start_mock_server  # noqa: E402
+from utils.query_filters import detect_sectors  # noqa: E402
+from utils.rate_governor import RateGovernor, get_rate_governor  # noqa: E402
+
+API_VERSION = "2024-02-15-preview"
+DIMENSIONS = 64
+EMBEDDING_DEPLOYMENT = "embeddings"
+CHAT_DEPLOYMENT = "chat"
+
+CHUNKS = [
+    ("c1", "2025-Q1", "Private housing", "Private housing prices rose 4% in Q1 2025 in Kuwait."),
+    ("c2", "2025-Q1", "Investment housing", "Investment housing rents were stable across governorates."),
+    ("c3", "2025-Q1", "Commercial", "Commercial office occupancy improved in Kuwait City."),
+    ("c4", "2025-Q1", "Industrial", "Industrial warehouse land values climbed in Shuwaikh."),
+    ("c5", "2024-Q4", "Coastal", "Coastal chalet prices were flat over the quarter."),
+    ("c6", "2024-Q4", "Private housing", "Private housing transactions fell in Q4 2024."),
+]
+
+
+class WhitespaceEncoding:
+    """Stands in for tiktoken, which needs to download cl100k_base."""
+
+    def encode(self, text: str, **_) -> List[str]:
+        return text.split()
+
+    def decode(self, tokens: List[str]) -> str:
+        return " ".join(tokens)
+
+
+class WhitespaceTokenizer:
+    """EmbeddingBatcher tokenizer with the same counts as WhitespaceEncoding."""
+
+    def tokenize(self, text: str) -> List[str]:
+        return text.split()
+
+
+def bucket(governor: RateGovernor, deployment: str) -> Dict[str, Any]:
+    """A deployment's stored rate-governor state."""
+    columns = ["request_limit", "token_limit", "requests", "tokens", "paused_until"]
+    with sqlite3.connect(governor.path) as conn:
+        row = conn.execute(
+            f"SELECT {', '.join(columns)} FROM buckets WHERE deployment = ?", (deployment,)
+        ).fetchone()
+    return dict(zip(columns, row))
+
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch, tmp_path):
+    """Keeps every test off the network and out of the shared data/ files."""
+    monkeypatch.setattr(context_packing, "get_encoding", lambda *_: WhitespaceEncoding())
+    monkeypatch.setenv("AZURE_OPENAI_API_KEY", "mock")
+    monkeypatch.setenv("RATE_GOVERNOR_PATH", str(tmp_path / "governor.sqlite3"))
+    get_rate_governor.cache_clear()
+    yield
+    get_rate_governor.cache_clear()
+
+
+@pytest.fixture
+def mock_server(request) -> Iterator[MockAzureOpenAI]:
+    """Mock Azure OpenAI; parametrize indirectly with MockSettings to inject faults."""
+    server = start_mock_server(getattr(request, "param", None) or MockSettings())
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def sync_client(mock_server):
+    return openai.AzureOpenAI(
+        api_key="mock", api_version=API_VERSION, azure_endpoint=mock_server.endpoint, max_retries=0
+    )
+
+
+@pytest.fixture
+def async_client(mock_server):
+    return openai.AsyncAzureOpenAI(
+        api_key="mock", api_version=API_VERSION, azure_endpoint=mock_server.endpoint, max_retries=0
+    )
+
+
+@pytest.fixture
+def governor(tmp_path) -> RateGovernor:
+    return RateGovernor(tmp_path / "governor.sqlite3")
+
+
+@pytest.fixture
+def embedder(sync_client, governor, tmp_path) -> CachedEmbedder:
+    return CachedEmbedder(
+        sync_client,
+        deployment=EMBEDDING_DEPLOYMENT,
+        dimensions=DIMENSIONS,
+        cache=EmbeddingCache(tmp_path / "embeddings.sqlite3"),
+        governor=governor,
+    )
+
+
+@pytest.fixture
+def table(tmp_path):
+    """Chunk table embedded with the mock's vectors, with a full-text index."""
+    texts = [text for *_, text in CHUNKS]
+    vectors = np.stack([mock_embedding(text, DIMENSIONS) for text in texts])
+    metadata = pa.array(
+        [
+            {"filename": "report.pdf", "page_numbers": [index + 1], "title": section}
+            for index, (_, _, section, _) in enumerate(CHUNKS)
+        ]
+    )
+    data = pa.table(
+        {
+            "id": [chunk_id for chunk_id, *_ in CHUNKS],
+            "doc_id": ["kfh_report"] * len(CHUNKS),
+            "report_period": [period for _, period, *_ in CHUNKS],
+            "section": [section for _, _, section, _ in CHUNKS],
+            "text": texts,
+            "sectors": pa.array(
+                [detect_sectors(text) or None for text in texts], pa.list_(pa.string())
+            ),
+            "metadata": metadata,
+            "vector": pa.FixedSizeListArray.from_arrays(
+                pa.array(vectors.ravel(), pa.float32()), DIMENSIONS
+            ),
+        }
+    )
+    table = lancedb.connect(tmp_path / "lancedb").create_table("docling", data)
+    ensure_fts_index(table)
+    return table
@@ -0,0 +1,179 @@
+import asyncio
+
+import openai
+import pytest
+
+from conftest import CHAT_DEPLOYMENT, CHUNKS
+from utils.async_pipeline import BackgroundLoop, ChatPipeline
+from utils.mock_azure import MockSettings, mock_answer
+from utils.query_cache import QueryEmbeddingCache
+from utils.query_filters import parse_query_filters
+
+CONTEXT = "Private housing prices rose 4% in Q1 2025. Coastal chalet prices were flat."
+MESSAGES = [
+    {"role": "system", "content": f"Answer from the context.\n\n{CONTEXT}"},
+    {"role": "user", "content": "How did private housing prices change?"},
+]
+
+
+def make_pipeline(table, embedder, async_client, governor, mode=None) -> ChatPipeline:
+    return ChatPipeline(
+        table,
+        embedder,
+        client=async_client,
+        chat_model=CHAT_DEPLOYMENT,
+        mode=mode,
+        query_cache=QueryEmbeddingCache(),
+        governor=governor,
+    )
+
+
+@pytest.fixture
+def pipeline(table, embedder, async_client, governor) -> ChatPipeline:
+    return make_pipeline(table, embedder, async_client, governor, mode="hybrid")
+
+
+async def collect(stream):
+    return [piece async for piece in stream]
+
+
+def test_stream_chat_yields_the_answer_as_it_arrives(pipeline, governor):
+    pieces = asyncio.run(collect(pipeline.stream_chat(MESSAGES, max_tokens=50)))
+
+    assert len(pieces) > 1
+    assert "".join(pieces) == "".join(mock_answer(MESSAGES, 50))
+    assert governor.queued() == 0
+
+
+def test_complete_returns_the_whole_answer(pipeline):
+    answer = asyncio.run(pipeline.complete(MESSAGES, max_tokens=50))
+    assert answer == "".join(mock_answer(MESSAGES, 50))
+
+
+@pytest.mark.parametrize("mock_server", [MockSettings(error_rate=1.0)], indirect=True)
+def test_a_failed_stream_raises_and_is_settled(pipeline, governor):
+    with pytest.raises(openai.RateLimitError):
+        asyncio.run(collect(pipeline.stream_chat(MESSAGES, max_tokens=20)))
+
+    assert governor.queued() == 0
+
+
+def test_hybrid_retrieval_finds_the_keyword_match(pipeline):
+    turn = asyncio.run(pipeline.retrieve("Shuwaikh warehouse land values"))
+
+    assert turn.query_vector is not None
+    assert turn.hits[0].chunk_id == "c4"
+    # Picked hits are hydrated with their text and source
+    assert turn.hits[0].text == CHUNKS[3][3]
+    assert turn.hits[0].citation() == "report.pdf - p. 4"
+
+
+def test_retrieval_is_scoped_to_the_named_period(pipeline):
+    query = "private housing in Q4 2024"
+
+    turn = asyncio.run(pipeline.retrieve(query, parse_query_filters(query)))
+
+    assert [hit.chunk_id for hit in turn.hits] == ["c6"]
+
+
+def test_an_empty_scope_falls_back_to_the_whole_table(pipeline):
+    query = "office occupancy in Q3 2023"
+
+    turn = asyncio.run(pipeline.retrieve(query, parse_query_filters(query)))
+
+    assert turn.hits[0].chunk_id == "c3"
+
+
+def test_lexical_mode_needs_no_embedding(table, embedder, async_client, governor, mock_server):
+    pipeline = make_pipeline(table, embedder, async_client, governor, mode="lexical")
+
+    turn = asyncio.run(pipeline.retrieve("chalet"))
+
+    assert turn.query_vector is None
+    assert turn.hits[0].chunk_id == "c5"
+    assert mock_server.requests == 0
+
+
+@pytest.mark.parametrize("mock_server", [MockSettings(error_rate=1.0)], indirect=True)
+def test_a_failed_embedding_falls_back_to_keywords(pipeline):
+    turn = asyncio.run(pipeline.retrieve("chalet"))
+
+    assert turn.query_vector is None
+    assert turn.hits[0].chunk_id == "c5"
+
+
+def test_background_loop_runs_and_streams_for_synchronous_callers():
+    loop = BackgroundLoop()
+
+    async def pieces():
+        for piece in ["a", "b"]:
+            await asyncio.sleep(0)
+            yield piece
+
+    async def fail():
+        yield "a"
+        raise ValueError("stream broke")
+
+    assert loop.run(asyncio.sleep(0, result=42), timeout=5) == 42
+    assert list(loop.stream(pieces())) == ["a", "b"]
+    stream = loop.stream(fail())
+    assert next(stream) == "a"
+    with pytest.raises(ValueError, match="stream broke"):
+        next(stream)
+
+
+def test_identical_streams_share_one_completion(pipeline, mock_server):
+    async def run():
+        return await asyncio.gather(
+            *(collect(pipeline.stream_chat(MESSAGES, max_tokens=20)) for _ in range(3))
+        )
+
+    answers = asyncio.run(run())
+
+    assert answers[0] == answers[1] == answers[2]
+    assert mock_server.requests == 1
+    assert pipeline.flights.stats().shared == 2
+    assert pipeline.flights.in_flight() == 0
+
+
+def test_different_streams_are_not_coalesced(pipeline, mock_server):
+    other = [MESSAGES[0], {"role": "user", "content": "What about coastal chalets?"}]
+
+    async def run():
+        return await asyncio.gather(
+            collect(pipeline.stream_chat(MESSAGES, max_tokens=20)),
+            collect(pipeline.stream_chat(other, max_tokens=20)),
+        )
+
+    asyncio.run(run())
+
+    assert mock_server.requests == 2
+
+
+def test_identical_retrievals_share_one_embedding(pipeline, mock_server):
+    async def run():
+        return await asyncio.gather(
+            *(pipeline.retrieve("industrial land values") for _ in range(3))
+        )
+
+    turns = asyncio.run(run())
+
+    assert mock_server.requests == 1
+    assert turns[0].hits[0].chunk_id == "c4"
+    assert [hit.chunk_id for hit in turns[0].hits] == [hit.chunk_id for hit in turns[2].hits]
+    # Each caller gets its own list to annotate
+    assert turns[0].hits is not turns[1].hits
+
+
+@pytest.mark.parametrize("mock_server", [MockSettings(error_rate=1.0)], indirect=True)
+def test_a_shared_failed_stream_reaches_every_caller(pipeline, governor):
+    async def run():
+        return await asyncio.gather(
+            *(collect(pipeline.stream_chat(MESSAGES, max_tokens=20)) for _ in range(2)),
+            return_exceptions=True,
+        )
+
+    errors = asyncio.run(run())
+
+    assert all(isinstance(error, openai.RateLimitError) for error in errors)
+    assert governor.queued() == 0
@@ -0,0 +1,59 @@
+import openai
+import pytest
+
+from utils.clients import (
+    DEFAULT_MAX_CONNECTIONS,
+    client_for,
+    connection_limits,
+    get_async_client,
+    get_client,
+    operation_timeout,
+)
+
+
+@pytest.fixture
+def azure_env(monkeypatch):
+    monkeypatch.setenv("AZURE_OPENAI_ENDPOINT", "https://example.openai.azure.com")
+    get_client.cache_clear()
+    get_async_client.cache_clear()
+    yield
+    get_client.cache_clear()
+    get_async_client.cache_clear()
+
+
+def test_connection_limits_default_and_override(monkeypatch):
+    monkeypatch.delenv("OPENAI_MAX_CONNECTIONS", raising=False)
+    monkeypatch.setenv("OPENAI_KEEPALIVE_EXPIRY", "30")
+
+    limits = connection_limits()
+
+    assert limits.max_connections == DEFAULT_MAX_CONNECTIONS
+    assert limits.keepalive_expiry == 30.0
+
+
+def test_operation_timeouts(monkeypatch):
+    monkeypatch.delenv("QUERY_EMBEDDING_TIMEOUT", raising=False)
+    assert operation_timeout("query_embedding").read == 5.0
+    assert operation_timeout("chat").connect == 5.0
+
+    monkeypatch.setenv("CHAT_TIMEOUT", "90")
+    assert operation_timeout("chat").read == 90.0
+    with pytest.raises(KeyError):
+        operation_timeout("transcription")
+
+
+def test_the_client_is_shared_by_the_whole_process(azure_env):
+    assert get_client() is get_client()
+    assert isinstance(get_async_client(), openai.AsyncAzureOpenAI)
+
+
+def test_operation_views_share_the_connection_pool(azure_env, monkeypatch):
+    monkeypatch.setenv("SUMMARY_MAX_RETRIES", "0")
+    base = get_client()
+
+    embeddings = client_for("query_embedding")
+    summary = client_for("summary", base)
+
+    assert embeddings._client is summary._client is base._client
+    assert (embeddings.timeout.read, embeddings.max_retries) == (5.0, 1)
+    assert summary.max_retries == 0
@@ -0,0 +1,58 @@
+from utils.context_packing import count_tokens, pack_context, trim_to_tokens
+from utils.retrieval import SearchHit
+
+
+def words(n, prefix="w"):
+    return " ".join(f"{prefix}{i}" for i in range(n))
+
+
+def test_whole_paragraphs_then_whole_sentences_are_kept():
+    text = "One two three.\n\nFour five. Six seven. Eight nine ten."
+
+    assert trim_to_tokens(text, 100) == text
+    assert trim_to_tokens(text, 8) == "One two three.\n\nFour five. Six seven."
+    assert trim_to_tokens(text, 3) == "One two three."
+    assert trim_to_tokens(text, 2) == "One two"
+    assert trim_to_tokens(text, 0) == ""
+
+
+def test_hits_that_fit_are_packed_whole_in_order():
+    hits = [SearchHit(text="Rents rose.", filename="a.pdf"), SearchHit(text="Prices fell.")]
+
+    packed = pack_context(hits, budget=100)
+
+    assert packed.hits == hits
+    assert packed.text == "Rents rose.\nSource: a.pdf\n\nPrices fell."
+    assert packed.tokens == count_tokens(packed.text)
+    assert (packed.trimmed, packed.dropped) == (0, 0)
+
+
+def test_the_first_hit_that_overflows_is_trimmed():
+    long_text = f"{words(80)}.\n\n{words(80, 'x')}."
+    hits = [SearchHit(text=words(50)), SearchHit(text=long_text), SearchHit(text="Short one.")]
+
+    packed = pack_context(hits, budget=150)
+
+    assert [hit.text for hit in packed.hits] == [words(50), f"{words(80)}.", "Short one."]
+    assert packed.tokens <= 150
+    assert packed.trimmed == 1
+    assert packed.summary() == "132 / 150 context tokens · 3 chunks (1 trimmed)"
+
+
+def test_hits_that_would_be_cut_too_short_are_dropped():
+    hits = [SearchHit(text=words(100)), SearchHit(text=words(100))]
+
+    packed = pack_context(hits, budget=150)
+
+    assert len(packed.hits) == 1
+    assert packed.dropped == 1
+    assert packed.summary() == "100 / 150 context tokens · 1 chunk (1 dropped)"
+
+
+def test_budget_defaults_to_the_environment(monkeypatch):
+    monkeypatch.setenv("CONTEXT_TOKEN_BUDGET", "2")
+
+    packed = pack_context([SearchHit(text="one two three")])
+
+    assert packed.budget == 2
+    assert packed.dropped == 1
@@ -0,0 +1,122 @@
+import threading
+
+import pytest
+
+from conftest import CHAT_DEPLOYMENT
+from utils.conversation_memory import ConversationMemory, openai_summarizer
+from utils.mock_azure import MockSettings
+
+
+def conversation(turns):
+    messages = []
+    for i in range(turns):
+        messages.append({"role": "user", "content": f"question {i}"})
+        messages.append({"role": "assistant", "content": f"answer {i}"})
+    return messages
+
+
+def ask(messages, question="new question"):
+    return [*messages, {"role": "user", "content": question}]
+
+
+def test_short_conversations_are_sent_whole():
+    messages = ask(conversation(2))
+
+    assert ConversationMemory(recent_turns=4).build(messages) == messages
+
+
+def test_only_recent_turns_are_kept_without_a_summarizer():
+    messages = ask(conversation(6))
+
+    built = ConversationMemory(recent_turns=2).build(messages)
+
+    assert built == messages[-5:]
+
+
+def test_the_token_budget_bounds_the_window_but_keeps_the_question():
+    messages = ask(conversation(3), "a very long question " * 50)
+
+    # Each message costs its words plus four tokens of chat overhead
+    assert ConversationMemory(token_budget=12).build(messages) == messages[-1:]
+    assert ConversationMemory(token_budget=216).build(messages) == messages[-3:]
+
+
+def test_older_turns_are_folded_into_a_summary_in_the_background():
+    folded = []
+    release = threading.Event()
+
+    def summarize(summary, messages):
+        release.wait(5)
+        folded.append((summary, [m["content"] for m in messages]))
+        return f"{summary} {len(messages)} messages".strip()
+
+    memory = ConversationMemory(summarize, recent_turns=1)
+    messages = ask(conversation(3))
+
+    # The turn does not wait for the summary; the folded messages are left out
+    assert memory.build(messages) == messages[-3:]
+    release.set()
+    memory.wait(5)
+    assert folded == [("", ["question 0", "answer 0", "question 1", "answer 1"])]
+
+    built = memory.build(ask(conversation(3)))
+    assert built[0] == {
+        "role": "system",
+        "content": "Summary of the earlier conversation:\n4 messages",
+    }
+    assert built[1:] == messages[-3:]
+
+
+def test_clearing_the_history_resets_the_summary():
+    memory = ConversationMemory(lambda summary, messages: "summary", recent_turns=1)
+    memory.build(ask(conversation(3)))
+    memory.wait(5)
+
+    assert memory.build(ask([])) == [{"role": "user", "content": "new question"}]
+    assert (memory.summary, memory.summarized) == ("", 0)
+
+
+def test_a_failed_summary_is_retried_next_turn():
+    calls = []
+
+    def summarize(summary, messages):
+        calls.append(len(messages))
+        if len(calls) == 1:
+            raise RuntimeError("deployment unavailable")
+        return "summary"
+
+    memory = ConversationMemory(summarize, recent_turns=1)
+    messages = ask(conversation(3))
+    memory.build(messages)
+    memory.wait(5)
+    assert memory.summary == ""
+
+    memory.build(messages)
+    memory.wait(5)
+    assert (memory.summary, calls) == ("summary", [4, 4])
+
+
+def test_openai_summarizer_asks_the_chat_deployment(sync_client, mock_server):
+    summarize = openai_summarizer(sync_client, CHAT_DEPLOYMENT)
+
+    summary = summarize("", conversation(1))
+
+    assert summary
+    assert mock_server.requests == 1
+
+
+@pytest.mark.parametrize("mock_server", [MockSettings(error_rate=1.0)], indirect=True)
+def test_openai_summarizer_errors_reach_the_memory(sync_client, mock_server):
+    summarize = openai_summarizer(sync_client, CHAT_DEPLOYMENT)
+
+    with pytest.raises(Exception):
+        summarize("", conversation(1))
+
+
+def test_a_supplied_summary_stands_in_for_dropped_turns():
+    messages = ask(conversation(3))
+
+    built = ConversationMemory(recent_turns=1, summary="Offices were discussed").build(messages)
+
+    assert built[0]["content"] == "Summary of the earlier conversation:\nOffices were discussed"
+    assert built[1:] == messages[-3:]
@@ -0,0 +1,123 @@
+import gzip
+import os
+
+import pytest
+
+from utils.conversion_cache import ConversionCache, convert_cached, options_fingerprint
+
+
+class Options:
+    def __init__(self, **values):
+        self.values = values
+
+    def model_dump_json(self):
+        return repr(sorted(self.values.items()))
+
+
+class FormatOption:
+    def __init__(self, **values):
+        self.pipeline_cls = Options
+        self.pipeline_options = Options(**values)
+
+
+class FakeConverter:
+    def __init__(self, **values):
+        self.format_to_options = {"pdf": FormatOption(**values), "docx": FormatOption()}
+        self.calls = 0
+
+    def convert(self, source):
+        self.calls += 1
+        return type("Result", (), {"document": f"converted {source}"})()
+
+
+@pytest.fixture
+def report(tmp_path):
+    path = tmp_path / "report.pdf"
+    path.write_bytes(b"%PDF-1.7 quarterly report")
+    return str(path)
+
+
+def cache(tmp_path, converter=None, **options):
+    return ConversionCache(tmp_path / "cache", converter=converter or FakeConverter(), **options)
+
+
+def test_key_follows_the_file_content_and_the_pipeline_options(tmp_path, report):
+    key = cache(tmp_path).key(report)
+
+    assert cache(tmp_path).key(report) == key
+    assert cache(tmp_path, FakeConverter(do_ocr=True)).key(report) != key
+    with open(report, "ab") as f:
+        f.write(b" revised")
+    assert cache(tmp_path).key(report) != key
+
+
+def test_remote_sources_are_not_cached(tmp_path):
+    assert cache(tmp_path).key("https://example.com/report.pdf") is None
+
+
+def test_fingerprint_ignores_format_order():
+    first = {"pdf": FormatOption(do_ocr=True), "docx": FormatOption()}
+    second = {"docx": FormatOption(), "pdf": FormatOption(do_ocr=True)}
+
+    assert options_fingerprint(first) == options_fingerprint(second)
+
+
+def test_other_docling_versions_are_purged(tmp_path):
+    stale = tmp_path / "cache" / "docling-0.1_core-0.1"
+    stale.mkdir(parents=True)
+    (stale / "old.json.gz").write_bytes(b"")
+
+    cache(tmp_path)
+
+    assert not stale.exists()
+
+
+def test_eviction_drops_least_recently_used_entries(tmp_path):
+    store = cache(tmp_path, max_bytes=250)
+    for age, name in enumerate(["newest", "middle", "oldest"]):
+        path = store.directory / f"{name}.json.gz"
+        path.write_bytes(b"x" * 100)
+        os.utime(path, (1000 - age, 1000 - age))
+
+    store.evict()
+
+    assert sorted(p.name for p in store.directory.iterdir()) == ["middle.json.gz", "newest.json.gz"]
+
+
+def test_corrupt_entries_are_dropped(tmp_path, report):
+    store = cache(tmp_path)
+    path = store.directory / f"{store.key(report)}.json.gz"
+    path.write_bytes(b"not gzip")
+
+    assert store.get(report) is None
+    assert not path.exists()
+
+
+def test_convert_cached_converts_each_file_once(tmp_path, report):
+    pytest.importorskip("docling_core.types.doc")
+    from docling_core.types.doc import DoclingDocument
+
+    converter = FakeConverter()
+    converter.convert = lambda source: type(
+        "Result", (), {"document": DoclingDocument(name="report")}
+    )()
+    store = cache(tmp_path, converter)
+
+    first = convert_cached(converter, report, store)
+    with gzip.open(store.directory / f"{store.key(report)}.json.gz") as f:
+        assert f.read()
+    converter.convert = None  # A second conversion would fail
+
+    assert convert_cached(converter, report, store).name == first.name
+
+
+def test_stage_scripts_and_ingestion_share_cache_keys(tmp_path, report):
+    pytest.importorskip("docling.document_converter")
+    from utils.ingestion import build_converter, default_format_options
+
+    # 1-extraction.py and 2-chunking.py
+    stage = ConversionCache(tmp_path / "cache", converter=build_converter())
+    # convert_documents' parent process, before any worker starts
+    ingestion = ConversionCache(tmp_path / "cache", format_options=default_format_options())
+
+    assert stage.key(report) == ingestion.key(report)
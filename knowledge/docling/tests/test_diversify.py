@@ -0,0 +1,87 @@
+import numpy as np
+import pyarrow as pa
+
+from conftest import DIMENSIONS
+from utils.diversify import (
+    DIVERSIFY_COLUMNS,
+    diversify,
+    mmr_select,
+    overfetch_limit,
+    ranked_relevance,
+)
+from utils.mock_azure import mock_embedding
+from utils.retrieval import lexical_search, rrf_fuse, vector_search
+
+
+def test_overfetch_limit(monkeypatch):
+    monkeypatch.delenv("MMR_OVERFETCH", raising=False)
+    assert overfetch_limit(5) == 20
+
+    monkeypatch.setenv("MMR_OVERFETCH", "0")
+    assert overfetch_limit(5) == 5
+
+
+def test_near_duplicates_are_dropped():
+    candidates = np.array([[1.0, 0.0], [0.999, 0.01], [0.0, 1.0]])
+
+    assert mmr_select(candidates, 3, query_vector=[1.0, 0.0]) == [0, 2]
+
+
+def test_novelty_outweighs_a_slightly_more_relevant_repeat():
+    candidates = np.array([[1.0, 0.0], [0.9, 0.3], [0.6, 0.8]])
+
+    def pick(lambda_mult):
+        return mmr_select(candidates, 2, [1.0, 0.0], lambda_mult, duplicate_threshold=1.1)
+
+    assert pick(1.0) == [0, 1]
+    assert pick(0.3) == [0, 2]
+
+
+def test_without_a_query_relevance_follows_rank():
+    candidates = np.eye(3)
+
+    assert mmr_select(candidates, 3, lambda_mult=1.0) == [0, 1, 2]
+    assert mmr_select(np.empty((0, 2)), 3) == []
+
+
+def test_ranked_relevance_scales_fused_scores():
+    results = pa.table({"_relevance_score": pa.array([0.04, 0.02, 0.01], pa.float32())})
+
+    np.testing.assert_allclose(ranked_relevance(results), [1.0, 0.5, 0.25])
+    assert ranked_relevance(pa.table({"_distance": [0.1]})) is None
+
+
+def test_diversify_keeps_the_fused_order(table):
+    query = "private housing prices"
+    query_vector = mock_embedding(query, DIMENSIONS).tolist()
+    fused = rrf_fuse(
+        [
+            lexical_search(table, query, 6, DIVERSIFY_COLUMNS).to_arrow(),
+            vector_search(table, query_vector, 6, columns=DIVERSIFY_COLUMNS).to_arrow(),
+        ]
+    )
+    # A query vector pointing elsewhere must not override the fused ranking
+    elsewhere = mock_embedding("coastal chalet", DIMENSIONS).tolist()
+
+    hits = diversify(fused, 3, elsewhere, lambda_mult=1.0)
+
+    assert [hit.chunk_id for hit in hits] == fused.column("id").to_pylist()[:3]
+
+
+def test_diversify_uses_cosine_relevance_for_vector_results(table):
+    query_vector = mock_embedding("industrial warehouse land", DIMENSIONS)
+    # Reverse the ranking; cosine relevance restores the closest chunk first
+    results = vector_search(table, query_vector.tolist(), 6, columns=DIVERSIFY_COLUMNS).to_arrow()
+    reversed_results = results.take(np.arange(results.num_rows)[::-1])
+
+    hits = diversify(reversed_results, 1, query_vector.tolist(), lambda_mult=1.0)
+
+    assert hits[0].chunk_id == "c4"
+
+
+def test_results_without_vectors_are_truncated(table):
+    results = lexical_search(table, "housing", 6).to_arrow()
+
+    hits = diversify(results, 2)
+
+    assert [hit.chunk_id for hit in hits] == results.column("id").to_pylist()[:2]
@@ -0,0 +1,110 @@
+import numpy as np
+import openai
+import pytest
+
+from conftest import API_VERSION, DIMENSIONS, EMBEDDING_DEPLOYMENT, WhitespaceTokenizer, bucket
+from utils.embedding_batcher import AdaptiveConcurrency, EmbeddingBatcher, EmbeddingBatchError
+from utils.mock_azure import MockSettings, mock_embedding
+from utils.rate_governor import BATCH
+
+
+def batcher(client, governor, **options):
+    batcher = EmbeddingBatcher(
+        client,
+        deployment=EMBEDDING_DEPLOYMENT,
+        dimensions=DIMENSIONS,
+        tokenizer=WhitespaceTokenizer(),
+        governor=governor,
+        **options,
+    )
+    batcher._backoff = lambda attempts: 0.0  # Retry dead-lettered batches at once
+    return batcher
+
+
+def test_batcher_packs_inputs_into_few_requests(sync_client, governor, mock_server):
+    texts = [f"chunk number {index}" for index in range(10)]
+
+    vectors = batcher(sync_client, governor, max_inputs_per_request=4).embed(texts)
+
+    assert mock_server.requests == 3
+    for text, vector in zip(texts, vectors):
+        np.testing.assert_allclose(vector, mock_embedding(text, DIMENSIONS), atol=1e-6)
+
+
+@pytest.mark.parametrize("mock_server", [MockSettings(max_input_tokens=100)], indirect=True)
+def test_batcher_bisects_to_isolate_a_rejected_input(sync_client, governor, mock_server):
+    texts = [f"chunk number {index}" for index in range(8)]
+    # One "word" to the batcher's tokenizer, far over the mock's input limit
+    texts[5] = "x" * 1000
+
+    with pytest.raises(EmbeddingBatchError) as error:
+        batcher(sync_client, governor, max_inputs_per_request=8).embed(texts)
+
+    assert list(error.value.failed) == [5]
+    assert "BadRequestError" in error.value.failed[5]
+    assert error.value.vectors[5] is None
+    assert all(vector is not None for i, vector in enumerate(error.value.vectors) if i != 5)
+
+
+@pytest.mark.parametrize(
+    "mock_server", [MockSettings(timeout_rate=0.5, hang_seconds=1.0, seed=3)], indirect=True
+)
+def test_batcher_retries_dead_lettered_batches(governor, mock_server):
+    client = openai.AzureOpenAI(
+        api_key="mock", api_version=API_VERSION, azure_endpoint=mock_server.endpoint, timeout=0.2
+    )
+    texts = [f"chunk number {index}" for index in range(6)]
+
+    vectors = batcher(client, governor, max_inputs_per_request=2, max_retries=8).embed(texts)
+
+    assert all(vector is not None for vector in vectors)
+    assert mock_server.requests > 3  # Some batches timed out and were retried
+
+
+@pytest.mark.parametrize(
+    "mock_server", [MockSettings(error_rate=0.5, retry_after=0.05, seed=1)], indirect=True
+)
+def test_batcher_backs_off_on_429(sync_client, governor, mock_server):
+    texts = [f"chunk number {index}" for index in range(6)]
+
+    vectors = batcher(sync_client, governor, max_inputs_per_request=2).embed(texts)
+
+    assert all(vector is not None for vector in vectors)
+    assert mock_server.requests > 3  # Throttled batches were requeued
+    assert bucket(governor, EMBEDDING_DEPLOYMENT)["paused_until"] > 0  # Shared with other processes
+
+
+def test_pack_respects_token_and_input_limits(sync_client, governor):
+    packer = batcher(sync_client, governor, max_tokens_per_request=10, max_inputs_per_request=3)
+
+    batches = packer.pack([4, 4, 4, 1, 1, 1, 1, 12])
+
+    assert [batch.indices for batch in batches] == [[0, 1], [2, 3, 4], [5, 6], [7]]
+    assert [batch.tokens for batch in batches] == [8, 6, 2, 12]
+
+
+def test_pack_keeps_batch_requests_under_the_bucket(sync_client, governor):
+    # The default 20,000-token bucket less its interactive reserve
+    assert governor.max_request_tokens(EMBEDDING_DEPLOYMENT, BATCH) == 16_000
+
+    packer = batcher(sync_client, governor, max_tokens_per_request=300_000)
+
+    assert [batch.indices for batch in packer.pack([10_000] * 3)] == [[0], [1], [2]]
+
+
+def test_limiter_halves_on_throttle_and_pauses():
+    limiter = AdaptiveConcurrency(initial=8, maximum=8)
+
+    limiter.on_throttle(retry_after=30)
+
+    assert limiter.limit == 4
+    assert limiter.capacity(in_flight=0) == 0
+
+
+def test_limiter_backs_off_before_the_quota_runs_out():
+    limiter = AdaptiveConcurrency(initial=4, maximum=8)
+
+    limiter.on_success({"x-ratelimit-remaining-tokens": "100"}, next_tokens=500)
+
+    assert limiter.limit < 4
+    assert limiter.paused_until > 0
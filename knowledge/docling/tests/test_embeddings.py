@@ -0,0 +1,65 @@
+import asyncio
+import time
+
+import numpy as np
+
+from conftest import DIMENSIONS
+from utils.embeddings import EmbeddingCache, embedding_key
+from utils.mock_azure import mock_embedding
+
+
+def test_embedding_cache_round_trip(tmp_path):
+    EmbeddingCache(tmp_path / "cache.sqlite3").put_many({"a": [0.5, 1.0], "b": [2.0, 3.0]})
+
+    # A fresh instance reads from disk, not from the first one's memory
+    found = EmbeddingCache(tmp_path / "cache.sqlite3").get_many(["a", "b", "c"])
+
+    assert found == {"a": [0.5, 1.0], "b": [2.0, 3.0]}
+
+
+def test_cached_embedder_requests_each_text_once(embedder, mock_server):
+    first = embedder.embed(["rents", "prices", "rents"])
+    assert mock_server.requests == 1
+    assert first[0] == first[2]
+    np.testing.assert_allclose(first[1], mock_embedding("prices", DIMENSIONS), atol=1e-6)
+
+    second = embedder.embed(["prices", "occupancy"])
+    assert mock_server.requests == 2  # Only "occupancy" was missing
+    assert second[0] == first[1]
+
+
+def test_embed_async_shares_the_cache(embedder, async_client, mock_server):
+    vector = asyncio.run(embedder.embed_async(["land values"], async_client))[0]
+
+    assert embedder.embed(["land values"])[0] == vector
+    assert mock_server.requests == 1
+
+
+def test_key_covers_deployment_dimensions_and_normalized_text():
+    key = embedding_key("large", 1024, "office  rents\n")
+
+    assert embedding_key("large", 1024, "office rents") == key
+    assert embedding_key("large", 256, "office rents") != key
+    assert embedding_key("small", 1024, "office rents") != key
+
+
+def test_disk_tier_evicts_least_recently_used(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    cache = EmbeddingCache(path, max_entries=2)
+    for key in ["a", "b"]:
+        cache.put_many({key: [1.0]})
+        time.sleep(0.01)
+    # A disk hit (here from another process's cache) makes "a" more recent than "b"
+    EmbeddingCache(path).get_many(["a"])
+    time.sleep(0.01)
+
+    cache.put_many({"c": [1.0]})
+
+    assert sorted(EmbeddingCache(path).get_many(["a", "b", "c"])) == ["a", "c"]
+
+
+def test_memory_tier_is_bounded(tmp_path):
+    cache = EmbeddingCache(tmp_path / "cache.sqlite3", memory_entries=2)
+    cache.put_many({"a": [1.0], "b": [2.0], "c": [3.0]})
+
+    assert list(cache._memory) == ["b", "c"]
@@ -0,0 +1,68 @@
+import pyarrow as pa
+import pyarrow.compute as pc
+
+import utils.incremental as incremental
+from conftest import CHUNKS
+from utils.incremental import (
+    chunk_id,
+    delete_ids,
+    existing_chunk_ids,
+    find_stale_ids,
+    supports_incremental,
+    upsert_rows,
+)
+
+
+def test_chunk_id_changes_with_text_or_metadata():
+    key = chunk_id("report.pdf", "Rents rose.", {"page_numbers": [1], "section": "Rents"})
+
+    assert chunk_id("report.pdf", "Rents rose.", {"section": "Rents", "page_numbers": [1]}) == key
+    assert chunk_id("report.pdf", "Rents fell.", {"page_numbers": [1], "section": "Rents"}) != key
+    assert chunk_id("report.pdf", "Rents rose.", {"page_numbers": [2], "section": "Rents"}) != key
+    assert chunk_id("other.pdf", "Rents rose.", {"page_numbers": [1], "section": "Rents"}) != key
+
+
+def test_existing_ids_map_to_their_document(table):
+    existing = existing_chunk_ids(table)
+
+    assert supports_incremental(table)
+    assert existing == {chunk: "report.pdf" for chunk, *_ in CHUNKS}
+
+
+def test_stale_ids_spare_unchanged_and_protected_documents():
+    existing = {"a1": "a.pdf", "a2": "a.pdf", "b1": "b.pdf", "gone1": "gone.pdf"}
+
+    # a2 was edited away; b.pdf failed this run; gone.pdf left the corpus
+    stale = find_stale_ids(existing, {"a1"}, {"a.pdf", "b.pdf"}, protected_filenames=["b.pdf"])
+    assert stale == ["a2", "gone1"]
+
+    kept = find_stale_ids(existing, {"a1"}, {"a.pdf", "b.pdf"}, ["b.pdf"], prune_missing=False)
+    assert kept == ["a2"]
+
+
+def test_upsert_updates_matches_and_inserts_new_rows(table):
+    rows = table.to_arrow()
+    updated = rows.filter(pc.is_in(rows.column("id"), pa.array(["c1", "c2"])))
+    updated = updated.set_column(
+        rows.schema.get_field_index("section"), "section", pa.array(["Updated"] * 2)
+    )
+    new = rows.filter(pc.equal(rows.column("id"), "c3"))
+    new = new.set_column(rows.schema.get_field_index("id"), "id", pa.array(["c7"]))
+
+    upsert_rows(table, updated)
+    upsert_rows(table, new)
+    upsert_rows(table, [])
+
+    stored = table.to_arrow()
+    sections = dict(zip(stored.column("id").to_pylist(), stored.column("section").to_pylist()))
+    assert table.count_rows() == len(CHUNKS) + 1
+    assert sections["c1"] == sections["c2"] == "Updated"
+    assert sections["c7"] == "Commercial"
+
+
+def test_delete_ids_in_batches(table, monkeypatch):
+    monkeypatch.setattr(incremental, "DELETE_BATCH_SIZE", 2)
+
+    delete_ids(table, ["c1", "c2", "c3", "missing"])
+
+    assert sorted(existing_chunk_ids(table)) == ["c4", "c5", "c6"]
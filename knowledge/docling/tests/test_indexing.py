@@ -0,0 +1,114 @@
+import lancedb
+import numpy as np
+import pyarrow as pa
+import pytest
+
+import utils.indexing as indexing
+from utils.indexing import (
+    SCALAR_INDEXES,
+    choose_index_params,
+    ensure_fts_index,
+    ensure_scalar_indexes,
+    ensure_vector_index,
+    find_vector_index,
+    pq_sub_vectors,
+)
+
+
+def vector_table(tmp_path, num_rows, dimensions=32):
+    vectors = np.random.default_rng(0).standard_normal((num_rows, dimensions)).astype(np.float32)
+    data = pa.table(
+        {
+            "id": [str(i) for i in range(num_rows)],
+            "text": [f"chunk {i}" for i in range(num_rows)],
+            "vector": pa.FixedSizeListArray.from_arrays(pa.array(vectors.ravel()), dimensions),
+        }
+    )
+    return lancedb.connect(tmp_path / "lancedb").create_table("docling", data)
+
+
+@pytest.mark.parametrize(
+    "dimensions, target, expected",
+    [(3072, 192, 192), (1000, 62, 50), (1536, 96, 96), (7, 4, 1), (256, 0, 1), (64, 100, 64)],
+)
+def test_pq_sub_vectors_divide_the_width(dimensions, target, expected):
+    assert pq_sub_vectors(dimensions, target) == expected
+
+
+def test_params_scale_with_the_corpus(monkeypatch):
+    for name in ["VECTOR_INDEX_TYPE", "VECTOR_INDEX_PARTITIONS", "VECTOR_INDEX_SUB_VECTORS"]:
+        monkeypatch.delenv(name, raising=False)
+
+    small = choose_index_params(10_000, 3072)
+    large = choose_index_params(4_096_000, 3072)
+
+    assert (small.index_type, small.num_partitions, small.num_sub_vectors) == ("IVF_PQ", 100, 192)
+    assert large.num_partitions == 1000
+
+
+def test_params_can_be_overridden(monkeypatch):
+    monkeypatch.setenv("VECTOR_INDEX_PARTITIONS", "8")
+    monkeypatch.setenv("VECTOR_INDEX_SUB_VECTORS", "62")
+
+    params = choose_index_params(10_000, 1000)
+    assert (params.num_partitions, params.num_sub_vectors) == (8, 50)
+
+    monkeypatch.setenv("VECTOR_INDEX_TYPE", "ivf_hnsw_sq")
+    assert choose_index_params(10_000, 1000).num_sub_vectors is None
+
+
+def test_small_tables_are_scanned_without_an_index(tmp_path):
+    table = vector_table(tmp_path, 50)
+
+    assert ensure_vector_index(table).action == "skipped"
+    assert find_vector_index(table) is None
+
+
+def test_vector_index_is_created_then_kept_current(tmp_path, monkeypatch):
+    monkeypatch.setattr(indexing, "MIN_ROWS_FOR_INDEX", 256)
+    monkeypatch.setenv("VECTOR_INDEX_PARTITIONS", "2")
+    table = vector_table(tmp_path, 512)
+
+    report = ensure_vector_index(table)
+
+    assert report.action == "created"
+    assert report.params.num_sub_vectors == 2  # 32 dimensions // 16
+    assert find_vector_index(table) is not None
+    assert ensure_vector_index(table).action == "current"
+    assert ensure_vector_index(table, force=True).action == "rebuilt"
+
+
+def test_fts_index_is_built_at_any_size_and_refreshed(tmp_path):
+    table = vector_table(tmp_path, 3)
+
+    assert ensure_fts_index(table).action == "created"
+    assert ensure_fts_index(table).action == "current"
+
+    table.add(
+        pa.table(
+            {
+                "id": ["3"],
+                "text": ["new chunk"],
+                "vector": pa.FixedSizeListArray.from_arrays(pa.array(np.zeros(32, np.float32)), 32),
+            }
+        )
+    )
+    assert ensure_fts_index(table).action == "updated"
+    assert table.search("new", query_type="fts").limit(1).to_arrow().column("id")[0].as_py() == "3"
+
+
+def test_scalar_indexes_cover_the_filter_columns(table):
+    reports = ensure_scalar_indexes(table)
+
+    assert [report.kind for report in reports] == [
+        f"{column} {index_type.lower()}" for column, index_type in SCALAR_INDEXES.items()
+    ]
+    assert {report.action for report in reports} == {"created"}
+    assert {report.action for report in ensure_scalar_indexes(table)} == {"current"}
+    assert {report.action for report in ensure_scalar_indexes(table, force=True)} == {"rebuilt"}
+
+
+def test_scalar_indexes_skip_columns_older_tables_lack(tmp_path):
+    table = vector_table(tmp_path, 3)
+
+    assert [report.kind for report in ensure_scalar_indexes(table)] == ["id btree"]
@@ -0,0 +1,90 @@
+import json
+import os
+
+import pytest
+
+import utils.ingestion as ingestion
+from utils.ingestion import convert_documents, default_worker_count, discover_documents
+
+
+class FakeConverter:
+    """Returns the source as the document, or raises for names containing "bad"."""
+
+    def convert(self, source):
+        if "bad" in source:
+            raise RuntimeError("unreadable")
+        return type("Result", (), {"document": f"doc:{source}"})()
+
+
+@pytest.fixture
+def fake_converter(monkeypatch):
+    def load(use_cache=True, format_options=None):
+        monkeypatch.setattr(ingestion, "_converter", FakeConverter())
+        monkeypatch.setattr(ingestion, "_cache", None)
+
+    monkeypatch.setattr(ingestion, "_load_converter", load)
+
+
+def test_discover_scans_directories_for_supported_files(tmp_path):
+    (tmp_path / "nested").mkdir()
+    for name in ["b.pdf", "nested/a.DOCX", "notes.csv"]:
+        (tmp_path / name).write_text("x")
+
+    found = discover_documents(str(tmp_path))
+
+    assert found == sorted([str(tmp_path / "b.pdf"), str(tmp_path / "nested" / "a.DOCX")])
+
+
+def test_discover_resolves_manifest_entries(tmp_path):
+    (tmp_path / "list.txt").write_text("# reports\nq1.pdf\n\n/abs/q2.pdf\n")
+    (tmp_path / "list.json").write_text(json.dumps({"documents": ["q3.pdf"]}))
+
+    assert discover_documents(str(tmp_path / "list.txt")) == [
+        str(tmp_path / "q1.pdf"),
+        "/abs/q2.pdf",
+    ]
+    assert discover_documents(str(tmp_path / "list.json")) == [str(tmp_path / "q3.pdf")]
+
+
+def test_discover_rejects_missing_sources_and_bad_manifests(tmp_path):
+    (tmp_path / "broken.json").write_text("{not json")
+    (tmp_path / "scalar.json").write_text('"q1.pdf"')
+
+    for source in ["missing.pdf", "broken.json", "scalar.json"]:
+        with pytest.raises(ValueError):
+            discover_documents(str(tmp_path / source))
+
+
+def test_worker_count_is_bounded_by_the_documents(monkeypatch):
+    monkeypatch.setenv("INGEST_WORKERS", "8")
+    assert default_worker_count(3) == 3
+
+    monkeypatch.delenv("INGEST_WORKERS")
+    assert 1 <= default_worker_count(100) <= max(1, (os.cpu_count() or 2) // 2)
+
+
+def test_single_worker_converts_in_process_and_reports_failures(fake_converter):
+    outcomes = list(
+        convert_documents(
+            ["a.pdf", "bad.pdf"], max_workers=1, use_cache=False, format_options={"pdf": None}
+        )
+    )
+
+    assert [outcome.document for outcome in outcomes] == ["doc:a.pdf", None]
+    assert outcomes[1].error == "RuntimeError: unreadable"
+
+
+def test_single_worker_leaves_the_callers_thread_settings_alone(fake_converter, monkeypatch):
+    monkeypatch.delenv("OMP_NUM_THREADS", raising=False)
+
+    list(convert_documents(["a.pdf"], max_workers=1, use_cache=False, format_options={"pdf": None}))
+
+    assert "OMP_NUM_THREADS" not in os.environ
+
+
+def test_pool_workers_cap_their_threads(fake_converter, monkeypatch):
+    monkeypatch.delenv("OMP_NUM_THREADS", raising=False)
+
+    ingestion._init_worker(3, use_cache=False, format_options={"pdf": None})
+
+    assert os.environ["OMP_NUM_THREADS"] == "3"
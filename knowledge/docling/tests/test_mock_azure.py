@@ -0,0 +1,96 @@
+import numpy as np
+import openai
+import pytest
+
+from conftest import CHAT_DEPLOYMENT, DIMENSIONS, EMBEDDING_DEPLOYMENT
+from utils.mock_azure import MockAzureOpenAI, MockSettings, mock_answer, mock_embedding
+
+MESSAGES = [
+    {"role": "system", "content": "Rents rose in Hawalli. Chalet prices were flat."},
+    {"role": "user", "content": "What happened to rents?"},
+]
+
+
+def embed(client, texts):
+    response = client.embeddings.create(
+        model=EMBEDDING_DEPLOYMENT, input=texts, dimensions=DIMENSIONS
+    )
+    return [item.embedding for item in response.data]
+
+
+def test_embeddings_are_deterministic_unit_vectors(sync_client):
+    first, second = embed(sync_client, ["office rents", "office rents"])
+
+    assert first == second
+    assert np.linalg.norm(first) == pytest.approx(1.0, abs=1e-5)
+    np.testing.assert_allclose(first, mock_embedding("office rents", DIMENSIONS), atol=1e-6)
+
+
+def test_texts_sharing_words_embed_close_together():
+    rents = mock_embedding("office rents in Kuwait City", DIMENSIONS)
+    similar = mock_embedding("office rents", DIMENSIONS)
+    unrelated = mock_embedding("coastal chalet", DIMENSIONS)
+
+    assert rents @ similar > rents @ unrelated
+
+
+def test_chat_answers_from_the_context(sync_client):
+    response = sync_client.chat.completions.create(model=CHAT_DEPLOYMENT, messages=MESSAGES)
+
+    assert response.choices[0].message.content.startswith("Rents rose in Hawalli.")
+    assert response.usage.completion_tokens == len(mock_answer(MESSAGES))
+
+
+def test_chat_streams_the_same_answer(sync_client):
+    stream = sync_client.chat.completions.create(
+        model=CHAT_DEPLOYMENT, messages=MESSAGES, max_tokens=3, stream=True
+    )
+    pieces = [
+        chunk.choices[0].delta.content
+        for chunk in stream
+        if chunk.choices and chunk.choices[0].delta.content
+    ]
+
+    assert pieces == mock_answer(MESSAGES, 3)
+
+
+@pytest.mark.parametrize(
+    "mock_server", [MockSettings(error_rate=1.0, retry_after=2.5)], indirect=True
+)
+def test_injected_429_advertises_retry_after(sync_client):
+    with pytest.raises(openai.RateLimitError) as error:
+        embed(sync_client, ["rents"])
+
+    assert error.value.response.headers["retry-after-ms"] == "2500"
+
+
+@pytest.mark.parametrize("mock_server", [MockSettings(rpm=1)], indirect=True)
+def test_quota_is_enforced_per_deployment(sync_client):
+    raw = sync_client.embeddings.with_raw_response.create(
+        model=EMBEDDING_DEPLOYMENT, input=["rents"]
+    )
+    assert raw.headers["x-ratelimit-remaining-requests"] == "0"
+
+    with pytest.raises(openai.RateLimitError):
+        embed(sync_client, ["prices"])
+    # Another deployment has its own window
+    sync_client.chat.completions.create(model=CHAT_DEPLOYMENT, messages=MESSAGES)
+
+
+@pytest.mark.parametrize("mock_server", [MockSettings(max_input_tokens=10)], indirect=True)
+def test_one_oversized_input_fails_the_whole_request(sync_client, mock_server):
+    with pytest.raises(openai.BadRequestError) as error:
+        embed(sync_client, ["rents", "x" * 100])
+
+    assert error.value.code == "context_length_exceeded"
+    assert mock_server.requests == 1
+
+
+@pytest.mark.parametrize("mock_server", [MockSettings(error_rate=0.5, seed=7)], indirect=True)
+def test_faults_repeat_with_the_same_seed(mock_server):
+    draws = [mock_server.draw()[0] for _ in range(20)]
+    second = MockAzureOpenAI(("127.0.0.1", 0), MockSettings(error_rate=0.5, seed=7))
+    try:
+        assert [second.draw()[0] for _ in range(20)] == draws
+    finally:
+        second.server_close()
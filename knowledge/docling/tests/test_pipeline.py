@@ -0,0 +1,95 @@
+import time
+
+import pyarrow as pa
+import pytest
+
+from utils.pipeline import batched, rows_to_arrow, run_streaming_pipeline
+
+
+def embed(batch):
+    return [{**row, "vector": [float(row["n"])]} for row in batch if row["n"] % 5]
+
+
+def test_batched_is_lazy():
+    pulled = []
+
+    def numbers():
+        for n in range(10):
+            pulled.append(n)
+            yield n
+
+    batches = batched(numbers(), 4)
+
+    assert next(batches) == [0, 1, 2, 3]
+    assert len(pulled) == 4
+    assert list(batches) == [[4, 5, 6, 7], [8, 9]]
+
+
+def test_rows_to_arrow_uses_the_table_schema():
+    schema = pa.schema([("n", pa.int32()), ("vector", pa.list_(pa.float16()))])
+
+    table = rows_to_arrow([{"n": 1, "vector": [0.5]}], schema)
+
+    assert table.schema == schema
+
+
+def test_every_embedded_row_is_written_once():
+    written = []
+
+    stats = run_streaming_pipeline(
+        ({"n": n} for n in range(1, 24)), embed, written.extend, batch_rows=5
+    )
+
+    # Rows the embedder leaves out are skipped, not written as placeholders
+    assert [row["n"] for row in written] == [n for n in range(1, 24) if n % 5]
+    assert stats.rows_written == len(written)
+    assert stats.batches == 5
+
+
+def test_a_slow_writer_holds_back_the_producer():
+    pulled = []
+    written = []
+    backlog = []
+
+    def rows():
+        for n in range(200):
+            pulled.append(n)
+            yield {"n": n}
+
+    def write(batch):
+        time.sleep(0.01)
+        written.extend(batch)
+        backlog.append(len(pulled) - len(written))
+
+    run_streaming_pipeline(rows(), list, write, batch_rows=10, max_pending=2)
+
+    assert len(written) == 200
+    # Batches waiting in the queue, plus one being embedded and one being written
+    assert max(backlog) <= (2 + 2) * 10
+
+
+def test_producer_errors_are_raised_after_the_pipeline_stops():
+    def rows():
+        yield {"n": 1}
+        raise RuntimeError("chunker failed")
+
+    written = []
+    with pytest.raises(RuntimeError, match="chunker failed"):
+        run_streaming_pipeline(rows(), embed, written.extend, batch_rows=1)
+    assert [row["n"] for row in written] == [1]
+
+
+def test_writer_errors_stop_the_producer():
+    pulled = []
+
+    def rows():
+        for n in range(1, 1000):
+            pulled.append(n)
+            yield {"n": n}
+
+    def write(batch):
+        raise OSError("disk full")
+
+    with pytest.raises(OSError, match="disk full"):
+        run_streaming_pipeline(rows(), embed, write, batch_rows=10, max_pending=1)
+    assert len(pulled) < 100
@@ -0,0 +1,77 @@
+import asyncio
+import time
+
+from utils.query_cache import QueryEmbeddingCache, normalize_query
+
+
+def test_queries_differing_in_case_or_spacing_share_an_entry():
+    cache = QueryEmbeddingCache()
+    calls = []
+
+    def embed(query):
+        calls.append(query)
+        return [1.0]
+
+    cache.get_or_embed("What are the  trends?", embed)
+    cache.get_or_embed("what are the trends?", embed)
+
+    assert normalize_query(" What  ARE the trends? ") == "what are the trends?"
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.hit_rate) == (1, 1, 0.5)
+
+
+def test_namespaces_keep_deployments_apart():
+    cache = QueryEmbeddingCache()
+    cache.put("rents", [1.0], namespace="large:3072")
+
+    assert cache.get("rents", namespace="large:256") is None
+    assert cache.get("rents", namespace="large:3072") == [1.0]
+
+
+def test_failed_embeddings_are_not_cached():
+    cache = QueryEmbeddingCache()
+
+    assert cache.get_or_embed("rents", lambda query: None) is None
+    assert cache.get_or_embed("rents", lambda query: [2.0]) == [2.0]
+
+
+def test_entries_expire_and_the_oldest_are_evicted():
+    cache = QueryEmbeddingCache(max_entries=2, ttl_seconds=0.05)
+    for query in ["a", "b", "c"]:
+        cache.put(query, [1.0])
+
+    assert cache.get("a") is None
+    assert cache.stats().evicted == 1
+    time.sleep(0.06)
+    assert cache.get("b") is None
+    assert cache.stats().expired == 1
+
+
+def test_async_lookup_shares_entries_with_the_sync_one():
+    cache = QueryEmbeddingCache()
+    cache.put("rents", [1.0])
+
+    async def embed(query):
+        return [2.0]
+
+    assert asyncio.run(cache.get_or_embed_async("Rents", embed)) == [1.0]
+    assert asyncio.run(cache.get_or_embed_async("prices", embed)) == [2.0]
+    assert cache.get("prices") == [2.0]
+
+
+def test_rerun_skips_the_embedder(embedder, mock_server):
+    cache = QueryEmbeddingCache()
+    calls = []
+
+    def embed(query):
+        calls.append(query)
+        return embedder.embed([query])[0]
+
+    first = cache.get_or_embed("Office occupancy", embed, embedder.namespace)
+    # A Streamlit rerun with the same question
+    second = cache.get_or_embed("office occupancy ", embed, embedder.namespace)
+
+    assert first == second
+    assert calls == ["Office occupancy"]
+    assert mock_server.requests == 1
@@ -0,0 +1,87 @@
+import pytest
+
+from conftest import DIMENSIONS
+from utils.mock_azure import mock_embedding
+from utils.query_filters import (
+    QueryFilters,
+    combine_where,
+    detect_sectors,
+    document_ids,
+    parse_query_filters,
+    scope_sectors,
+)
+from utils.retrieval import vector_search
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("Office occupancy in Kuwait City", ["commercial"]),
+        ("Warehouse land and chalets", ["industrial", "coastal"]),
+        ("Residential prices", ["private_housing", "investment_housing"]),
+        ("Private housing and other housing", ["private_housing"]),
+        ("Land prices", []),
+    ],
+)
+def test_detect_sectors(text, expected):
+    assert detect_sectors(text) == expected
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("residential rents", ["private_housing", "investment_housing"]),
+        ("residential vs commercial rents", []),
+        ("offices and warehouses", []),
+        ("compare private housing with apartments", []),
+    ],
+)
+def test_comparisons_and_several_sectors_are_not_scoped(query, expected):
+    assert scope_sectors(query) == expected
+
+
+def test_questions_are_parsed_into_filters():
+    filters = parse_query_filters(
+        "Commercial rents in Q1 2025 and 2024 per KFH report 2025 q1",
+        known_doc_ids=["kfh_report", "other_report"],
+    )
+
+    assert filters == QueryFilters(
+        periods=["2025-Q1"], years=[2024], sectors=["commercial"], doc_ids=["kfh_report"]
+    )
+    assert filters.describe() == "kfh_report · 2025-Q1 · 2024 · commercial"
+    assert filters.to_where() == (
+        "doc_id IN ('kfh_report') AND (report_period = '2025-Q1' OR report_period LIKE '2024-%')"
+        " AND array_has_any(sectors, ['commercial'])"
+    )
+
+
+def test_unscoped_questions_have_no_filter():
+    filters = parse_query_filters("What drives land values?")
+
+    assert not filters
+    assert filters.to_where() is None
+    assert filters.describe() == ""
+
+
+def test_values_are_quoted():
+    assert QueryFilters(doc_ids=["o'neil"]).to_where() == "doc_id IN ('o''neil')"
+
+
+def test_combine_where_skips_empty_clauses():
+    assert combine_where(None, "") is None
+    assert combine_where("a = 1", None) == "a = 1"
+    assert combine_where("a = 1", "b = 2") == "(a = 1) AND (b = 2)"
+
+
+def test_document_ids_are_read_from_the_table(table):
+    assert document_ids(table) == ["kfh_report"]
+
+
+def test_retrieval_is_scoped_to_the_named_period(table):
+    query = "private housing in Q4 2024"
+    where = parse_query_filters(query).to_where()
+
+    results = vector_search(table, mock_embedding(query, DIMENSIONS).tolist(), 5, where=where)
+
+    assert results.to_arrow().column("id").to_pylist() == ["c6"]
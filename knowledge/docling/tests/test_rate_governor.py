@@ -0,0 +1,150 @@
+import asyncio
+import time
+
+import openai
+import pytest
+
+import utils.context_packing as context_packing
+from conftest import EMBEDDING_DEPLOYMENT, bucket
+from utils.mock_azure import MockSettings
+from utils.rate_governor import (
+    BATCH,
+    INTERACTIVE,
+    RateGovernor,
+    RateGovernorTimeout,
+    estimate_chat_tokens,
+    estimate_embedding_tokens,
+)
+
+
+@pytest.fixture
+def small_quota(monkeypatch):
+    # 6,000 TPM: a 10s bucket holds 1,000 tokens and refills 100 per second
+    monkeypatch.setenv("RATE_LIMITS", "dep=6000:600")
+
+
+def test_settle_refunds_an_overestimate(governor, small_quota):
+    ticket = governor.acquire("dep", 500)
+    assert bucket(governor, "dep")["tokens"] == pytest.approx(500, abs=5)
+
+    governor.settle(ticket, used_tokens=100)
+
+    assert bucket(governor, "dep")["tokens"] == pytest.approx(900, abs=5)
+
+
+def test_settle_charges_an_underestimate(governor, small_quota):
+    governor.settle(governor.acquire("dep", 100), used_tokens=400)
+    assert bucket(governor, "dep")["tokens"] == pytest.approx(600, abs=5)
+
+
+def test_failed_request_settled_at_zero_costs_nothing(governor, small_quota):
+    governor.settle(governor.acquire("dep", 300), used_tokens=0)
+    assert bucket(governor, "dep")["tokens"] == pytest.approx(1000, abs=5)
+
+
+def test_oversized_batch_work_never_starves_interactive_requests(governor):
+    # Default quota: a 20,000-token bucket with a 4,000-token reserve
+    async def scenario():
+        ingest = asyncio.create_task(governor.acquire_async("dep", 250_000, BATCH))
+        await asyncio.sleep(0.3)
+        # Installments were paid, but never out of the reserve
+        assert 4000 - 5 <= bucket(governor, "dep")["tokens"] < 5000
+
+        ticket = await governor.acquire_async("dep", 50, INTERACTIVE, timeout=0.2)
+
+        assert ticket.waited < 0.2
+        ingest.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await ingest
+
+    asyncio.run(scenario())
+
+    # The abandoned request's installments are refunded
+    assert bucket(governor, "dep")["tokens"] == pytest.approx(20_000, abs=100)
+    assert governor.queued() == 0
+
+
+def test_oversized_batch_work_is_paid_in_installments(tmp_path, small_quota):
+    # A 1s bucket of the 6,000 TPM quota holds 100 tokens, 20 of them reserved
+    governor = RateGovernor(tmp_path / "governor.sqlite3", burst_seconds=1)
+    assert governor.max_request_tokens("dep", BATCH) == 80
+    assert governor.max_request_tokens("dep", INTERACTIVE) == 100
+
+    ticket = governor.acquire("dep", 150, BATCH, timeout=5)
+
+    assert ticket.waited > 0.5
+    assert bucket(governor, "dep")["tokens"] >= 20 - 1
+
+
+def test_batch_work_leaves_the_interactive_reserve(governor, small_quota):
+    governor.acquire("dep", 750, BATCH)
+
+    # 250 tokens left: within the 20% reserve, so only interactive work gets in
+    with pytest.raises(RateGovernorTimeout):
+        governor.acquire("dep", 100, BATCH, timeout=0.2)
+    governor.acquire("dep", 100, INTERACTIVE, timeout=0.2)
+    assert governor.queued() == 0
+
+
+@pytest.mark.parametrize("mock_server", [MockSettings(rpm=120, tpm=6000)], indirect=True)
+def test_settle_calibrates_from_response_headers(embedder, governor, mock_server):
+    embedder.embed(["occupancy rates"])
+
+    state = bucket(governor, EMBEDDING_DEPLOYMENT)
+    assert state["request_limit"] == 120
+    assert state["token_limit"] == 6000
+    assert state["requests"] <= 119  # x-ratelimit-remaining-requests after one request
+
+
+@pytest.mark.parametrize(
+    "mock_server", [MockSettings(error_rate=1.0, retry_after=1.0)], indirect=True
+)
+def test_429_pauses_the_deployment(embedder, governor, mock_server):
+    with pytest.raises(openai.RateLimitError):
+        embedder.embed(["land values"])
+
+    state = bucket(governor, EMBEDDING_DEPLOYMENT)
+    assert state["paused_until"] > time.time()
+    assert state["tokens"] <= 0
+    with pytest.raises(RateGovernorTimeout):
+        governor.acquire(EMBEDDING_DEPLOYMENT, 1, timeout=0.2)
+    assert governor.queued() == 0
+
+
+@pytest.mark.parametrize(
+    "mock_server", [MockSettings(error_rate=1.0, retry_after=5.0)], indirect=True
+)
+def test_query_embedding_gives_up_while_paused(embedder, governor, mock_server):
+    with pytest.raises(openai.RateLimitError):
+        embedder.embed(["land values"])
+    embedder.admission_timeout = 0.2
+
+    started = time.monotonic()
+    with pytest.raises(RateGovernorTimeout):
+        embedder.embed(["rents"])
+
+    assert time.monotonic() - started < 1.0
+    assert mock_server.requests == 1
+
+
+def test_disabled_governor_caps_nothing(tmp_path):
+    governor = RateGovernor(tmp_path / "governor.sqlite3", enabled=False)
+    assert governor.max_request_tokens("dep", BATCH) > 10**12
+
+
+def test_disabled_governor_admits_everything(tmp_path):
+    governor = RateGovernor(tmp_path / "governor.sqlite3", enabled=False)
+
+    governor.settle(governor.acquire("dep", 10**9, timeout=0))
+
+    assert not (tmp_path / "governor.sqlite3").exists()
+
+
+def test_estimates_need_no_tokenizer(monkeypatch):
+    def unavailable(*_):
+        raise RuntimeError("tiktoken is not available")
+
+    monkeypatch.setattr(context_packing, "get_encoding", unavailable)
+
+    assert estimate_embedding_tokens(["a" * 400]) == pytest.approx(100, abs=2)
+    assert estimate_chat_tokens([{"role": "user", "content": "a" * 400}], 50) >= 150
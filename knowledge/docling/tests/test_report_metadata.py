@@ -0,0 +1,31 @@
+import pytest
+
+from utils.report_metadata import document_id, find_report_periods, parse_report_period
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("KFH_Real_Estate_Report_2025_Q1.pdf", "2025-Q1"),
+        ("rents in Q4 2024", "2024-Q4"),
+        ("2025-q2 update", "2025-Q2"),
+        ("Q3_2023.pdf", "2023-Q3"),
+        ("Report 2025 Q5", None),
+        ("FAQ12025", None),
+        ("no period here", None),
+    ],
+)
+def test_parse_report_period(text, expected):
+    assert parse_report_period(text) == expected
+
+
+def test_periods_are_listed_in_order_of_appearance():
+    text = "Compared with Q4 2024, rents in 2025 Q1 rose"
+
+    assert find_report_periods(text) == [(2024, 4), (2025, 1)]
+
+
+def test_document_id_is_the_file_stem():
+    assert document_id("data/pdfs/KFH_Real_Estate_Report_2025_Q1.pdf") == (
+        "KFH_Real_Estate_Report_2025_Q1"
+    )
@@ -0,0 +1,99 @@
+import time
+
+import lancedb
+
+from utils.mock_azure import mock_embedding
+from utils.response_cache import SemanticResponseCache, history_namespace, stream_text
+from utils.retrieval import connect_database
+
+QUESTION = "How did private housing prices move in Q1 2025?"
+
+
+def vector(text):
+    return mock_embedding(text, 64)
+
+
+def test_the_same_question_hits_and_an_unrelated_one_misses():
+    cache = SemanticResponseCache(threshold=0.9)
+    cache.store(QUESTION, vector(QUESTION), ["c1"], "They rose 4%.", table_version=1)
+
+    hit = cache.lookup(vector(QUESTION), table_version=1)
+    assert (hit.question, hit.context, hit.answer) == (QUESTION, ["c1"], "They rose 4%.")
+    assert hit.similarity > 0.99
+    assert cache.lookup(vector("Warehouse land values in Shuwaikh"), table_version=1) is None
+
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.entries) == (1, 1, 1)
+
+
+def test_namespaces_keep_scopes_apart():
+    cache = SemanticResponseCache(threshold=0.9)
+    cache.store(QUESTION, vector(QUESTION), [], "answer", 1, namespace="large:64|2025-Q1")
+
+    assert cache.lookup(vector(QUESTION), 1, namespace="large:64|2024-Q4") is None
+    assert cache.lookup(vector(QUESTION), 1, namespace="large:64|2025-Q1") is not None
+
+
+def test_history_namespace_separates_conversations():
+    first = [{"role": "user", "content": "Tell me about Kuwait City offices"}]
+    second = [{"role": "user", "content": "Tell me about Shuwaikh warehouses"}]
+
+    assert history_namespace("large:64", []) == "large:64"
+    assert history_namespace("large:64", first) == history_namespace("large:64", list(first))
+    assert history_namespace("large:64", first) != history_namespace("large:64", second)
+
+    # "And in Q2?" after different conversations must not share an answer
+    cache = SemanticResponseCache(threshold=0.9)
+    follow_up = vector("And in Q2?")
+    cache.store("And in Q2?", follow_up, [], "Offices...", 1, history_namespace("ns", first))
+    assert cache.lookup(follow_up, 1, history_namespace("ns", second)) is None
+    assert cache.lookup(follow_up, 1, history_namespace("ns", first)).answer == "Offices..."
+
+
+def test_entries_expire_and_the_least_used_are_evicted():
+    cache = SemanticResponseCache(threshold=0.9, max_entries=2, ttl_seconds=0.05)
+    questions = ["Office occupancy", "Chalet prices", "Warehouse land"]
+    cache.store(questions[0], vector(questions[0]), [], "a", 1)
+    cache.lookup(vector(questions[0]), 1)
+    for question in questions[1:]:
+        cache.store(question, vector(question), [], "b", 1)
+
+    assert cache.lookup(vector(questions[1]), 1) is None
+    assert cache.stats().entries == 2
+    time.sleep(0.06)
+    assert cache.lookup(vector(questions[0]), 1) is None
+    assert cache.stats().entries == 0
+
+
+def test_a_new_table_version_drops_every_answer():
+    cache = SemanticResponseCache(threshold=0.9)
+    cache.store(QUESTION, vector(QUESTION), [], "answer", table_version=1)
+
+    assert cache.lookup(vector(QUESTION), table_version=2) is None
+    assert cache.stats().invalidations == 1
+
+
+def test_writes_from_another_process_invalidate_answers(table, tmp_path, monkeypatch):
+    monkeypatch.setenv("TABLE_REFRESH_SECONDS", "0")
+    uri = str(tmp_path / "lancedb")
+    reader = connect_database(uri).open_table("docling")
+    stale = lancedb.connect(uri).open_table("docling")
+    cache = SemanticResponseCache(threshold=0.9)
+    cache.store(QUESTION, vector(QUESTION), [], "answer", reader.version)
+
+    # An ingestion run with its own connection
+    writer = lancedb.connect(uri).open_table("docling")
+    writer.add(writer.to_arrow().slice(0, 1))
+
+    assert stale.version != writer.version  # A plain handle never notices
+    assert reader.version == writer.version
+    assert cache.lookup(vector(QUESTION), reader.version) is None
+
+
+def test_stream_text_rebuilds_the_answer():
+    answer = "Private housing prices rose 4% in Q1 2025."
+
+    pieces = list(stream_text(answer, chunk_words=3))
+
+    assert "".join(pieces) == answer
+    assert len(pieces) == 3
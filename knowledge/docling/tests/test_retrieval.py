@@ -0,0 +1,197 @@
+import lancedb
+import pyarrow as pa
+import pytest
+
+import utils.retrieval as retrieval
+from conftest import CHUNKS, DIMENSIONS
+from utils.mock_azure import mock_embedding
+from utils.retrieval import (
+    ID_COLUMNS,
+    SearchHit,
+    fetch_chunks,
+    format_context,
+    hits_from_arrow,
+    hybrid_search,
+    hydrate_hits,
+    parse_pages,
+    rrf_fuse,
+    search,
+    search_many,
+    search_mode,
+    split_by_query,
+    vector_search,
+)
+
+
+def ranking(ids):
+    return pa.table({"id": ids, "text": [f"text of {chunk}" for chunk in ids]})
+
+
+def embedded(query):
+    return mock_embedding(query, DIMENSIONS).tolist()
+
+
+def test_vector_search_ranks_the_closest_chunk_first(table):
+    query_vector = embedded("Commercial office occupancy in Kuwait City")
+    results = vector_search(table, query_vector, 3).to_arrow()
+    assert results.column("id")[0].as_py() == "c3"
+
+
+def test_rrf_fuse_rewards_chunks_both_searches_agree_on():
+    fused = rrf_fuse([ranking(["a", "b", "c"]), ranking(["b", "d", "a"])])
+
+    assert fused.column("id").to_pylist() == ["b", "a", "d", "c"]
+    scores = fused.column("_relevance_score").to_pylist()
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_rrf_fuse_respects_the_limit():
+    fused = rrf_fuse([ranking(["a", "b", "c"]), ranking(["c", "d"])], limit=2)
+    assert fused.num_rows == 2
+
+
+def test_rrf_fuse_of_empty_rankings_is_empty():
+    fused = rrf_fuse([ranking([]), ranking([])])
+
+    assert fused.num_rows == 0
+    assert "_relevance_score" in fused.column_names
+
+
+def test_filters_are_applied_before_the_vector_scan(table):
+    query_vector = embedded("Private housing prices")
+
+    results = vector_search(table, query_vector, 3, where="report_period = '2024-Q4'").to_arrow()
+
+    assert set(results.column("report_period").to_pylist()) == {"2024-Q4"}
+    assert results.num_rows == 2
+
+
+def test_hybrid_search_finds_the_keyword_match(table):
+    query = "Shuwaikh warehouse land values"
+
+    results = hybrid_search(table, query, embedded(query), 3).to_arrow()
+
+    assert results.column("id")[0].as_py() == "c4"
+    assert "_relevance_score" in results.column_names
+
+
+def test_hybrid_search_falls_back_to_vectors_without_a_text_index(table, tmp_path):
+    plain = lancedb.connect(tmp_path / "plain").create_table(
+        "docling", table.to_arrow().select(["id", "text", "vector"])
+    )
+    query = "Commercial office occupancy in Kuwait City"
+
+    results = hybrid_search(plain, query, embedded(query), 3).to_arrow()
+
+    assert "_distance" in results.column_names
+    assert results.column("id")[0].as_py() == "c3"
+
+
+def test_lexical_mode_needs_no_embedding(table):
+    results = search(table, "chalet", None, 3, mode="lexical").to_arrow()
+
+    assert results.column("id")[0].as_py() == "c5"
+    # Without an embedding every mode falls back to BM25
+    fallback = search(table, "chalet", None, 3, mode="hybrid").to_arrow()
+    assert fallback.column("id")[0].as_py() == "c5"
+
+
+def test_search_mode_defaults_to_hybrid_and_validates(monkeypatch):
+    monkeypatch.delenv("SEARCH_MODE", raising=False)
+    assert search_mode() == "hybrid"
+
+    monkeypatch.setenv("SEARCH_MODE", "Vector")
+    assert search_mode() == "vector"
+    with pytest.raises(ValueError):
+        search_mode("semantic")
+
+
+@pytest.mark.parametrize("value, expected", [("3, 4", [3, 4]), ([5], [5]), (None, []), ("", [])])
+def test_parse_pages_accepts_strings_and_lists(value, expected):
+    assert parse_pages(value) == expected
+
+
+def test_hits_carry_metadata_and_the_search_s_score(table):
+    results = vector_search(table, embedded("Chalet prices"), 2).to_arrow()
+
+    hits = hits_from_arrow(results)
+
+    assert len(hits) == 2
+    hit = next(hit for hit in hits if hit.chunk_id == "c5")
+    assert (hit.filename, hit.pages, hit.title) == ("report.pdf", [5], "Coastal")
+    assert (hit.doc_id, hit.report_period, hit.section) == ("kfh_report", "2024-Q4", "Coastal")
+    assert hit.score_type == "distance"
+    assert hit.score == pytest.approx(results.column("_distance")[hits.index(hit)].as_py())
+
+
+def test_hits_tolerate_missing_columns():
+    hits = hits_from_arrow(pa.table({"text": ["Rents rose."]}))
+
+    assert hits == [SearchHit(text="Rents rose.")]
+    assert hits[0].citation() == ""
+
+
+def test_context_lists_each_hit_with_its_source():
+    hits = [
+        SearchHit(text="Rents rose.", filename="report.pdf", pages=[3, 4], title="Rents"),
+        SearchHit(text="Prices fell."),
+    ]
+
+    assert format_context(hits) == (
+        "Rents rose.\nSource: report.pdf - p. 3, 4\nTitle: Rents\n\nPrices fell."
+    )
+
+
+def test_id_only_hits_are_hydrated_in_rank_order(table):
+    query = "Shuwaikh warehouse land values"
+    results = hybrid_search(table, query, embedded(query), 3, columns=ID_COLUMNS).to_arrow()
+    ranked = hits_from_arrow(results)
+    assert all(hit.text is None for hit in ranked)
+
+    hydrated = hydrate_hits(table, [*ranked, SearchHit(chunk_id="deleted")])
+
+    assert [hit.chunk_id for hit in hydrated] == [hit.chunk_id for hit in ranked]
+    assert [hit.score for hit in hydrated] == [hit.score for hit in ranked]
+    assert hydrated[0].text == CHUNKS[3][3]
+    assert hydrated[0].citation() == "report.pdf - p. 4"
+
+
+def test_chunks_are_fetched_in_batches(table, monkeypatch):
+    monkeypatch.setattr(retrieval, "FETCH_BATCH_SIZE", 2)
+
+    chunks = fetch_chunks(table, ["c1", "c2", "c3", "c1", "missing"], columns=["text"])
+
+    assert sorted(chunks) == ["c1", "c2", "c3"]
+    assert chunks["c2"].text == CHUNKS[1][3]
+    assert chunks["c2"].filename is None  # Only the requested columns are read
+
+
+QUERIES = ["Commercial office occupancy", "Coastal chalet prices", "Shuwaikh warehouse land"]
+
+
+@pytest.mark.parametrize("mode", ["vector", "hybrid"])
+def test_search_many_embeds_every_query_in_one_request(table, embedder, mock_server, mode):
+    results = search_many(table, QUERIES, embedder.embed, k=2, mode=mode)
+
+    assert mock_server.requests == 1
+    assert [hits[0].chunk_id for hits in results] == ["c3", "c5", "c4"]
+    assert all(len(hits) == 2 for hits in results)
+
+
+def test_search_many_lexical_mode_needs_no_embedding(table):
+    def embed(texts):
+        raise AssertionError("lexical searches must not embed")
+
+    results = search_many(table, ["chalet", "warehouse"], embed, k=1, mode="lexical")
+
+    assert [[hit.chunk_id for hit in hits] for hits in results] == [["c5"], ["c4"]]
+    assert search_many(table, [], embed) == []
+
+
+def test_split_by_query_without_a_query_index():
+    results = pa.table({"id": ["a", "b"]})
+
+    parts = split_by_query(results, 2)
+
+    assert parts[0] is results
+    assert parts[1].num_rows == 0
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from utils.singleflight import SingleFlight, request_key
+
+
+def test_concurrent_calls_share_one_result():
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def run():
+        flights = SingleFlight()
+        results = await asyncio.gather(*(flights.do("key", work) for _ in range(5)))
+        return flights, results
+
+    flights, results = asyncio.run(run())
+
+    assert results == ["result"] * 5
+    assert len(calls) == 1
+    assert flights.stats().shared == 4
+    assert flights.in_flight() == 0
+
+
+def test_error_reaches_every_caller():
+    async def work():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream failed")
+
+    async def run():
+        flights = SingleFlight()
+        return await asyncio.gather(
+            *(flights.do("key", work) for _ in range(3)), return_exceptions=True
+        )
+
+    assert all(isinstance(error, ValueError) for error in asyncio.run(run()))
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    async def work():
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def run():
+        flights = SingleFlight()
+        first = asyncio.ensure_future(flights.do("key", work))
+        second = asyncio.ensure_future(flights.do("key", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == "result"
+
+
+def test_late_stream_subscriber_replays_earlier_items():
+    async def items():
+        for item in range(5):
+            await asyncio.sleep(0.01)
+            yield item
+
+    async def consume(flights, delay):
+        await asyncio.sleep(delay)
+        return [item async for item in flights.stream("key", items)]
+
+    async def run():
+        flights = SingleFlight()
+        results = await asyncio.gather(consume(flights, 0), consume(flights, 0.025))
+        return flights, results
+
+    flights, results = asyncio.run(run())
+
+    assert results == [[0, 1, 2, 3, 4]] * 2
+    assert flights.stats().started == 1
+
+
+def test_request_key_ignores_dict_order():
+    assert request_key({"a": 1, "b": 2}) == request_key({"b": 2, "a": 1})
+    assert request_key("chat", [{"role": "user"}]) != request_key("chat", [{"role": "system"}])
+
+
+@pytest.mark.parametrize("key", ["key", ("embed", "ns", "query")])
+def test_finished_calls_are_forgotten(key):
+    async def work():
+        return object()
+
+    async def run():
+        flights = SingleFlight()
+        return await flights.do(key, work), await flights.do(key, work)
+
+    first, second = asyncio.run(run())
+    assert first is not second
@@ -0,0 +1,87 @@
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from utils.mock_azure import mock_embedding
+from utils.recall_report import load_vectors, recall_report, shorten
+from utils.vector_config import (
+    FULL_DIMENSIONS,
+    embedding_dimensions,
+    matches_vector_config,
+    requested_dimensions,
+    vector_value_type,
+)
+
+
+def test_full_size_requests_send_no_dimensions(monkeypatch):
+    monkeypatch.delenv("EMBEDDING_DIMENSIONS", raising=False)
+    assert (embedding_dimensions(), requested_dimensions()) == (FULL_DIMENSIONS, None)
+
+    monkeypatch.setenv("EMBEDDING_DIMENSIONS", "1024")
+    assert requested_dimensions() == 1024
+
+
+@pytest.mark.parametrize("value", ["0", "4096"])
+def test_out_of_range_dimensions_are_rejected(monkeypatch, value):
+    monkeypatch.setenv("EMBEDDING_DIMENSIONS", value)
+    with pytest.raises(ValueError):
+        embedding_dimensions()
+
+
+def test_storage_type_is_configurable(monkeypatch):
+    monkeypatch.setenv("EMBEDDING_STORAGE_DTYPE", "Float16")
+    assert vector_value_type() == pa.float16()
+
+    monkeypatch.setenv("EMBEDDING_STORAGE_DTYPE", "int8")
+    with pytest.raises(ValueError):
+        vector_value_type()
+
+
+def test_table_must_match_size_and_storage_type(table, monkeypatch):
+    # The test table stores 64-dimensional float32 vectors
+    monkeypatch.setenv("EMBEDDING_DIMENSIONS", "64")
+    monkeypatch.delenv("EMBEDDING_STORAGE_DTYPE", raising=False)
+    assert matches_vector_config(table)
+
+    monkeypatch.setenv("EMBEDDING_STORAGE_DTYPE", "float16")
+    assert not matches_vector_config(table)
+    monkeypatch.setenv("EMBEDDING_DIMENSIONS", "32")
+    monkeypatch.delenv("EMBEDDING_STORAGE_DTYPE")
+    assert not matches_vector_config(table)
+
+
+def test_shorten_matches_the_api_s_shortened_embeddings():
+    full = mock_embedding("warehouse land values")
+
+    shortened = shorten(full[None, :], 256)[0]
+
+    np.testing.assert_allclose(shortened, mock_embedding("warehouse land values", 256), atol=1e-5)
+
+
+def test_recall_report_scores_each_configuration():
+    texts = [f"chunk {i} about sector {i % 7} in area {i % 11}" for i in range(60)]
+    vectors = np.stack([mock_embedding(text, 256) for text in texts])
+
+    rows = recall_report(vectors, [64, 256], [5], num_queries=20)
+
+    assert [(row.dimensions, row.dtype) for row in rows] == [
+        (64, "float32"),
+        (64, "float16"),
+        (256, "float32"),
+        (256, "float16"),
+    ]
+    assert rows[2].recall[5] == 1.0  # Full size, full precision is the baseline
+    assert rows[1].size_ratio == 8.0
+    assert all(0.0 <= row.recall[5] <= 1.0 for row in rows)
+
+
+def test_recall_report_needs_more_vectors_than_k():
+    with pytest.raises(ValueError):
+        recall_report(np.eye(5, dtype=np.float32), [2], [5])
+
+
+def test_load_vectors_reads_the_vector_column(table, tmp_path):
+    vectors = load_vectors(str(tmp_path / "lancedb"), "docling")
+
+    assert vectors.shape == (table.count_rows(), 64)
+    assert vectors.dtype == np.float32
@@ -0,0 +1,350 @@
+import asyncio
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass, field, replace
+from functools import lru_cache
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, TypeVar
+
+import openai
+import pyarrow as pa
+
+from utils.clients import client_for, get_async_client
+from utils.context_packing import count_tokens
+from utils.diversify import DIVERSIFY_COLUMNS, diversify, overfetch_limit
+from utils.indexing import find_fts_index
+from utils.query_cache import QueryEmbeddingCache, get_query_cache, normalize_query
+from utils.query_filters import QueryFilters, combine_where, parse_query_filters
+from utils.rate_governor import (
+    INTERACTIVE,
+    RateGovernor,
+    estimate_chat_tokens,
+    get_rate_governor,
+    retry_after_seconds,
+)
+from utils.retrieval import (
+    SearchHit,
+    hydrate_hits,
+    lexical_search,
+    rrf_fuse,
+    search_mode,
+    vector_search,
+)
+from utils.singleflight import SingleFlight, request_key
+
+T = TypeVar("T")
+
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+class BackgroundLoop:
+    """An asyncio event loop on a daemon thread.
+
+    Lets the synchronous Streamlit and CLI front ends drive the async
+    pipeline: `run` blocks for one coroutine, and `stream` starts an async
+    iterator immediately and hands its items to the calling thread.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self.loop.run_forever, name="async-pipeline", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, coroutine: Awaitable[T]) -> "Future[T]":
+        """Schedules a coroutine on the loop without waiting for it."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def run(self, coroutine: Awaitable[T], timeout: Optional[float] = None) -> T:
+        """Runs a coroutine on the loop and waits for its result."""
+        return self.submit(coroutine).result(timeout)
+
+    def stream(self, items: AsyncIterator[T]) -> Iterator[T]:
+        """Consumes an async iterator on the loop, yielding items here.
+
+        Consumption starts right away, before the returned iterator is first
+        advanced, so e.g. a completion request is already in flight while the
+        caller renders search results.
+        """
+        buffer: "queue.Queue[Any]" = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async for item in items:
+                    buffer.put(item)
+            except BaseException as e:
+                buffer.put(_Failure(e))
+            finally:
+                buffer.put(done)
+
+        self.submit(pump())
+
+        def iterate() -> Iterator[T]:
+            while True:
+                item = buffer.get()
+                if item is done:
+                    return
+                if isinstance(item, _Failure):
+                    raise item.error
+                yield item
+
+        return iterate()
+
+
+@lru_cache(maxsize=None)
+def get_background_loop() -> BackgroundLoop:
+    """Process-wide loop; the async clients it serves are bound to it."""
+    return BackgroundLoop()
+
+
+@dataclass
+class PreparedTurn:
+    hits: List[SearchHit] = field(default_factory=list)
+    query_vector: Optional[List[float]] = None
+    intents: Dict[str, Any] = field(default_factory=dict)  # Detector name -> result
+
+
+class ChatPipeline:
+    """Asynchronous retrieval and generation for one chat turn.
+
+    Steps that do not depend on each other overlap: the query embedding is
+    requested while the BM25 search and the intent detectors run, the vector
+    side starts as soon as the embedding arrives, and the two rankings are
+    fused in-process. Completions stream from AsyncAzureOpenAI.
+
+    Identical requests that are in flight at the same time, such as many
+    sessions sending the same sample question, share one embedding, one
+    search and one completion; the streamed tokens fan out to every caller.
+    """
+
+    def __init__(
+        self,
+        table: Any,
+        embedder: Any,
+        client: Any = None,
+        chat_model: Optional[str] = None,
+        num_results: int = 5,
+        mode: Optional[str] = None,
+        query_cache: Optional[QueryEmbeddingCache] = None,
+        governor: Optional[RateGovernor] = None,
+    ):
+        """Initialize the pipeline.
+
+        Args:
+            table: LanceDB table object
+            embedder: CachedEmbedder; its cache and deployment are reused
+            client: AsyncAzureOpenAI client; defaults to the shared pooled one
+                (see utils.clients), with chat and query embedding timeouts
+            chat_model: Chat deployment; defaults to AZURE_OPENAI_DEPLOYMENT_NAME
+            num_results: Hits per turn
+            mode: vector, hybrid or lexical; defaults to SEARCH_MODE or hybrid
+            query_cache: Query embedding cache; defaults to the process-wide one
+            governor: Rate governor completions are admitted through, at
+                interactive priority; defaults to the shared one
+        """
+        self.table = table
+        self.embedder = embedder
+        client = client or get_async_client()
+        self.client = client_for("chat", client)
+        self.embedding_client = client_for("query_embedding", client)
+        self.chat_model = chat_model or os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
+        self.num_results = num_results
+        self.mode = search_mode(mode)
+        self.query_cache = query_cache or get_query_cache()
+        self.flights = SingleFlight()
+        self.governor = governor or get_rate_governor()
+
+    async def embed_query(self, query: str) -> Optional[List[float]]:
+        """Query embedding, from the query cache or one async request."""
+
+        async def embed(text: str) -> List[float]:
+            return (await self.embedder.embed_async([text], self.embedding_client))[0]
+
+        namespace = self.embedder.namespace
+        return await self.flights.do(
+            ("embed", namespace, normalize_query(query)),
+            lambda: self.query_cache.get_or_embed_async(query, embed, namespace=namespace),
+        )
+
+    async def _search(
+        self, query: str, embedding: Optional["asyncio.Task"], where: Optional[str], k: int
+    ) -> PreparedTurn:
+        limit = overfetch_limit(k)
+        lexical = None
+        if self.mode != "vector" and find_fts_index(self.table) is not None:
+            lexical = asyncio.create_task(
+                asyncio.to_thread(
+                    lambda: lexical_search(
+                        self.table, query, limit, DIVERSIFY_COLUMNS, where
+                    ).to_arrow()
+                )
+            )
+
+        query_vector = None
+        if embedding is not None:
+            try:
+                query_vector = await embedding
+            except Exception as e:
+                # Keyword results alone are better than no answer
+                print(f"Query embedding failed, searching by keywords only: {e}")
+
+        rankings: List[pa.Table] = []
+        if query_vector is not None:
+            rankings.append(
+                await asyncio.to_thread(
+                    lambda: vector_search(
+                        self.table, query_vector, limit, columns=DIVERSIFY_COLUMNS, where=where
+                    ).to_arrow()
+                )
+            )
+        if lexical is not None:
+            rankings.append(await lexical)
+
+        if not rankings:
+            return PreparedTurn(query_vector=query_vector)
+        results = rankings[0] if len(rankings) == 1 else rrf_fuse(rankings, limit)
+        picked = diversify(results, k, query_vector)
+        # Text and metadata are read for the picked hits only
+        hits = await asyncio.to_thread(hydrate_hits, self.table, picked)
+        return PreparedTurn(hits, query_vector)
+
+    async def retrieve(
+        self,
+        query: str,
+        filters: Optional[QueryFilters] = None,
+        where: Optional[str] = None,
+        num_results: Optional[int] = None,
+    ) -> PreparedTurn:
+        """Searches for a question's context.
+
+        Args:
+            query: User question
+            filters: Scope parsed from the question; parsed here when omitted
+            where: Extra SQL prefilter
+            num_results: Hits to return; defaults to the pipeline's
+
+        Returns:
+            PreparedTurn with the diversified hits and the query embedding
+        """
+        k = num_results or self.num_results
+        if filters is None:
+            filters = parse_query_filters(query)
+        scoped = combine_where(where, filters.to_where())
+
+        async def run() -> PreparedTurn:
+            embedding = (
+                asyncio.create_task(self.embed_query(query)) if self.mode != "lexical" else None
+            )
+            turn = await self._search(query, embedding, scoped, k)
+            if not turn.hits and filters:
+                # Nothing matched the inferred scope; search without it
+                turn = await self._search(query, embedding, where, k)
+            return turn
+
+        # Reading the version may check storage for other processes' writes
+        version = await asyncio.to_thread(lambda: self.table.version)
+        key = ("retrieve", normalize_query(query), scoped, where, k, version)
+        turn = await self.flights.do(key, run)
+        # Callers share the result; give each its own copy to annotate
+        return replace(turn, hits=list(turn.hits), intents={})
+
+    async def prepare(
+        self,
+        query: str,
+        filters: Optional[QueryFilters] = None,
+        intents: Optional[Dict[str, Callable[[str], Any]]] = None,
+    ) -> PreparedTurn:
+        """Runs retrieval and the intent detectors concurrently.
+
+        Args:
+            query: User question
+            filters: See `retrieve`
+            intents: Named detectors such as `detect_visualization_request`,
+                each called with the question on a worker thread
+
+        Returns:
+            PreparedTurn with hits, query embedding and detector results
+        """
+        intents = intents or {}
+        turn, *values = await asyncio.gather(
+            self.retrieve(query, filters),
+            *(asyncio.to_thread(detect, query) for detect in intents.values()),
+        )
+        return replace(turn, intents=dict(zip(intents, values)))
+
+    async def _create(self, **kwargs: Any) -> Any:
+        """Raw completion response; a 429 pauses the deployment for every process."""
+        try:
+            return await self.client.chat.completions.with_raw_response.create(
+                model=self.chat_model, **kwargs
+            )
+        except openai.RateLimitError as e:
+            retry_after = retry_after_seconds(e.response.headers)
+            await asyncio.to_thread(self.governor.throttled, self.chat_model, retry_after)
+            raise
+
+    async def stream_chat(self, messages: List[Dict[str, str]], **options: Any) -> AsyncIterator[str]:
+        """Streams a completion's text deltas.
+
+        Args:
+            messages: Chat messages, system prompt included
+            **options: Extra completion parameters, e.g. max_tokens
+
+        Yields:
+            Text as it arrives; identical concurrent requests share one stream
+        """
+
+        async def deltas() -> AsyncIterator[str]:
+            prompt_tokens = estimate_chat_tokens(messages, 0)
+            ticket = await self.governor.acquire_async(
+                self.chat_model, prompt_tokens + (options.get("max_tokens") or 0), INTERACTIVE
+            )
+            raw = None
+            pieces: List[str] = []
+            try:
+                raw = await self._create(messages=messages, stream=True, **options)
+                async for chunk in raw.parse():
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        pieces.append(chunk.choices[0].delta.content)
+                        yield chunk.choices[0].delta.content
+            finally:
+                # Streams carry no usage; charge the prompt and what was generated,
+                # or nothing if the request was never accepted
+                if raw is None:
+                    await asyncio.to_thread(self.governor.settle, ticket, 0)
+                else:
+                    used = prompt_tokens + await asyncio.to_thread(count_tokens, "".join(pieces))
+                    await asyncio.to_thread(self.governor.settle, ticket, used, raw.headers)
+
+        key = ("stream", request_key(self.chat_model, messages, options))
+        async for text in self.flights.stream(key, deltas):
+            yield text
+
+    async def complete(self, messages: List[Dict[str, str]], **options: Any) -> str:
+        """Non-streaming completion, for the CLI."""
+
+        async def create() -> str:
+            ticket = await self.governor.acquire_async(
+                self.chat_model,
+                estimate_chat_tokens(messages, options.get("max_tokens")),
+                INTERACTIVE,
+            )
+            try:
+                raw = await self._create(messages=messages, **options)
+                response = raw.parse()
+            except Exception:
+                await asyncio.to_thread(self.governor.settle, ticket, 0)
+                raise
+            await asyncio.to_thread(
+                self.governor.settle, ticket, response.usage.total_tokens, raw.headers
+            )
+            return response.choices[0].message.content
+
+        key = ("complete", request_key(self.chat_model, messages, options))
+        return await self.flights.do(key, create)
@@ -0,0 +1,77 @@
+from typing import Dict, List
+
+
+def chat_messages(messages, context: str) -> List[Dict[str, str]]:
+    """Prepends the system prompt with the retrieved context to the chat history."""
+    system_prompt = f"""You are a helpful real estate analyst assistant that answers questions based on the KFH Real Estate Report 2025 Q1.
+    Use only the information from the provided context to answer questions. If you're unsure or the context
+    doesn't contain the relevant information, say so.
+    
+    RESPONSE STYLE: CONCISE & FOCUSED
+    - Keep answers brief and to the point
+    - Use bullet points for key data
+    - Highlight important numbers with **bold**
+    - Avoid lengthy explanations unless specifically requested
+    - Focus on the most relevant information first
+    
+    DEFINITION RESPONSES:
+    - For "what is", "definition", "what does mean" questions:
+      * Provide clear, concise definitions
+      * Use bullet points for key characteristics
+      * Highlight specific requirements or criteria with **bold**
+      * Include relevant examples if available
+      * Keep to 3-5 key points maximum
+    
+    VISUALIZATION REQUESTS:
+    - When users ask for charts, graphs, or visualizations:
+      * Provide a brief summary of the data that will be visualized
+      * Mention that a chart has been generated and displayed
+      * Keep the text response concise since the chart shows the data
+    
+    Context from KFH Real Estate Report 2025 Q1:
+    {context}
+    
+    Always provide accurate, data-driven insights based on the report content.
+    Be concise and direct in your responses.
+    """
+
+    return [{"role": "system", "content": system_prompt}, *messages]
+
+
+def detect_definition_request(user_input: str) -> bool:
+    """Detect if user is asking for a definition or explanation"""
+    user_input_lower = user_input.lower()
+    
+    definition_keywords = [
+        'what is', 'what are', 'definition', 'define', 'what does mean',
+        'what does this mean', 'explain', 'describe', 'tell me about',
+        'meaning of', 'concept of', 'understanding'
+    ]
+    
+    return any(keyword in user_input_lower for keyword in definition_keywords)
+
+
+def format_definition_response(response_text: str) -> str:
+    """Format definition responses for better presentation"""
+    
+    # If response already has bullet points, enhance them
+    if '•' in response_text or '*' in response_text:
+        # Clean up existing bullet points
+        formatted = response_text.replace('•', '•').replace('*', '•')
+        
+        # Add definition header if not present
+        if not response_text.startswith('##'):
+            formatted = f"## 📖 Definition\n\n{formatted}"
+        
+        return formatted
+    
+    # If no bullet points, try to structure the response
+    sentences = response_text.split('. ')
+    if len(sentences) > 1:
+        formatted = "## 📖 Definition\n\n"
+        for i, sentence in enumerate(sentences):
+            if sentence.strip():
+                formatted += f"• {sentence.strip()}\n"
+        return formatted
+    
+    return response_text
@@ -0,0 +1,131 @@
+import os
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+DEFAULT_API_VERSION = "2024-02-15-preview"
+
+DEFAULT_MAX_CONNECTIONS = 20
+DEFAULT_MAX_KEEPALIVE = 10
+DEFAULT_KEEPALIVE_EXPIRY = 120.0  # Seconds an idle connection stays open
+DEFAULT_CONNECT_TIMEOUT = 5.0
+
+# Per-operation (read timeout seconds, retries), overridable with
+# <OPERATION>_TIMEOUT and <OPERATION>_MAX_RETRIES, e.g. CHAT_TIMEOUT
+OPERATIONS: Dict[str, Tuple[float, int]] = {
+    "query_embedding": (5.0, 1),  # Interactive; fall back to keywords rather than wait
+    "embeddings": (60.0, 0),  # Bulk ingestion; EmbeddingBatcher handles 429s itself
+    "chat": (60.0, 2),
+    "summary": (30.0, 1),  # Background conversation summaries
+}
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def connection_limits() -> Any:
+    """Connection pool shared by every request of a client.
+
+    OPENAI_MAX_CONNECTIONS, OPENAI_MAX_KEEPALIVE and OPENAI_KEEPALIVE_EXPIRY
+    override the defaults. Idle connections are kept well beyond httpx's 5s
+    default so consecutive chat turns reuse the TLS session.
+    """
+    # Built with the Limits class of the HTTP library openai itself uses
+    # (httpx or httpx2, depending on the openai release)
+    from openai._constants import DEFAULT_CONNECTION_LIMITS
+
+    return type(DEFAULT_CONNECTION_LIMITS)(
+        max_connections=_env_int("OPENAI_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS),
+        max_keepalive_connections=_env_int("OPENAI_MAX_KEEPALIVE", DEFAULT_MAX_KEEPALIVE),
+        keepalive_expiry=_env_float("OPENAI_KEEPALIVE_EXPIRY", DEFAULT_KEEPALIVE_EXPIRY),
+    )
+
+
+def operation_timeout(operation: str) -> Any:
+    """Timeout for an operation: a short connect, an operation-specific read.
+
+    Raises:
+        KeyError: If the operation is not in OPERATIONS
+    """
+    from openai import Timeout
+
+    read, _ = OPERATIONS[operation]
+    read = _env_float(f"{operation.upper()}_TIMEOUT", read)
+    return Timeout(read, connect=_env_float("OPENAI_CONNECT_TIMEOUT", DEFAULT_CONNECT_TIMEOUT))
+
+
+def _client_kwargs(api_version: Optional[str]) -> Dict[str, Any]:
+    return {
+        "api_key": os.getenv("AZURE_OPENAI_API_KEY"),
+        "api_version": os.getenv("AZURE_OPENAI_API_VERSION", api_version or DEFAULT_API_VERSION),
+        "azure_endpoint": os.getenv("AZURE_OPENAI_ENDPOINT"),
+        "max_retries": _env_int("OPENAI_MAX_RETRIES", 2),
+    }
+
+
+@lru_cache(maxsize=None)
+def get_client(api_version: Optional[str] = None) -> Any:
+    """Process-wide AzureOpenAI client with a pooled, keep-alive HTTP client.
+
+    Cached for the life of the process, so Streamlit reruns and every module
+    reuse the same connections instead of repeating TLS handshakes.
+
+    Args:
+        api_version: Fallback when AZURE_OPENAI_API_VERSION is unset
+
+    Returns:
+        AzureOpenAI client; use `client_for` for per-operation settings
+    """
+    from openai import AzureOpenAI, DefaultHttpxClient
+
+    return AzureOpenAI(
+        http_client=DefaultHttpxClient(
+            limits=connection_limits(), timeout=operation_timeout("chat")
+        ),
+        **_client_kwargs(api_version),
+    )
+
+
+@lru_cache(maxsize=None)
+def get_async_client(api_version: Optional[str] = None) -> Any:
+    """Process-wide AsyncAzureOpenAI client, pooled like `get_client`.
+
+    Its connections belong to the event loop that first uses them; the chat
+    apps drive it from the single loop of `utils.async_pipeline`.
+    """
+    from openai import AsyncAzureOpenAI, DefaultAsyncHttpxClient
+
+    return AsyncAzureOpenAI(
+        http_client=DefaultAsyncHttpxClient(
+            limits=connection_limits(), timeout=operation_timeout("chat")
+        ),
+        **_client_kwargs(api_version),
+    )
+
+
+def client_for(operation: str, client: Any = None) -> Any:
+    """View of a shared client with an operation's timeout and retry policy.
+
+    The view shares the client's connection pool.
+
+    Args:
+        operation: A key of OPERATIONS, e.g. "chat" or "query_embedding"
+        client: Sync or async client; defaults to `get_client()`
+
+    Returns:
+        Client configured via `with_options`
+
+    Raises:
+        KeyError: If the operation is not in OPERATIONS
+    """
+    _, retries = OPERATIONS[operation]
+    return (client or get_client()).with_options(
+        timeout=operation_timeout(operation),
+        max_retries=_env_int(f"{operation.upper()}_MAX_RETRIES", retries),
+    )
@@ -0,0 +1,159 @@
+import os
+import re
+from dataclasses import dataclass, field, replace
+from functools import lru_cache
+from typing import Any, List, Optional
+
+from utils.retrieval import CONTEXT_SEPARATOR, SearchHit, format_hit
+
+ENCODING_NAME = "cl100k_base"  # Same encoding the chunker counts with
+DEFAULT_TOKEN_BUDGET = 6000
+# A trimmed hit shorter than this is not worth its source line
+MIN_TRIMMED_TOKENS = 64
+
+_PARAGRAPH = re.compile(r"\n\s*\n")
+_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+
+
+@lru_cache(maxsize=None)
+def get_encoding(name: str = ENCODING_NAME) -> Any:
+    """Loads (once) the tiktoken encoding used for prompt budgets."""
+    from tiktoken import get_encoding as load_encoding
+
+    return load_encoding(name)
+
+
+def count_tokens(text: str, encoding: Any = None) -> int:
+    """Number of tokens in `text` under the prompt encoding."""
+    return len((encoding or get_encoding()).encode(text))
+
+
+def context_token_budget() -> int:
+    """Token budget for retrieved context; CONTEXT_TOKEN_BUDGET or 6000."""
+    return int(os.getenv("CONTEXT_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET))
+
+
+def trim_to_tokens(text: str, max_tokens: int, encoding: Any = None) -> str:
+    """Shortens text to at most `max_tokens`, cutting at natural boundaries.
+
+    Whole paragraphs are kept first, then whole sentences of the next
+    paragraph. Only when not even the first sentence fits is the text cut
+    mid-sentence.
+
+    Args:
+        text: Chunk text
+        max_tokens: Token limit for the result
+        encoding: tiktoken encoding; defaults to `get_encoding()`
+
+    Returns:
+        The longest boundary-aligned prefix within the limit
+    """
+    encoding = encoding or get_encoding()
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text, encoding) <= max_tokens:
+        return text
+
+    kept: List[str] = []
+    used = 0
+    separator_tokens = count_tokens("\n\n", encoding)
+    for paragraph in _PARAGRAPH.split(text):
+        cost = count_tokens(paragraph, encoding) + (separator_tokens if kept else 0)
+        if used + cost <= max_tokens:
+            kept.append(paragraph)
+            used += cost
+            continue
+
+        # The paragraph does not fit whole; keep as many sentences as do
+        sentences: List[str] = []
+        budget = max_tokens - used - (separator_tokens if kept else 0)
+        for sentence in _SENTENCE.split(paragraph):
+            cost = count_tokens(sentence, encoding) + (1 if sentences else 0)
+            if cost > budget:
+                break
+            sentences.append(sentence)
+            budget -= cost
+        if sentences:
+            kept.append(" ".join(sentences))
+        break
+
+    if kept:
+        return "\n\n".join(kept)
+    return encoding.decode(encoding.encode(text)[:max_tokens])
+
+
+@dataclass
+class PackedContext:
+    text: str  # Prompt context
+    hits: List[SearchHit] = field(default_factory=list)  # As packed, trimmed text included
+    tokens: int = 0
+    budget: int = 0
+    trimmed: int = 0  # Hits shortened to fit
+    dropped: int = 0  # Hits left out entirely
+
+    def summary(self) -> str:
+        """One-line usage report, e.g. "2,310 / 6,000 context tokens · 4 chunks (1 trimmed)"."""
+        chunks = f"{len(self.hits)} chunk" + ("" if len(self.hits) == 1 else "s")
+        line = f"{self.tokens:,} / {self.budget:,} context tokens · {chunks}"
+        notes = []
+        if self.trimmed:
+            notes.append(f"{self.trimmed} trimmed")
+        if self.dropped:
+            notes.append(f"{self.dropped} dropped")
+        return line + (f" ({', '.join(notes)})" if notes else "")
+
+
+def pack_context(
+    hits: List[SearchHit],
+    budget: Optional[int] = None,
+    encoding: Any = None,
+) -> PackedContext:
+    """Fills a token budget with hits in relevance order.
+
+    Hits that fit are included whole. The first one that does not is trimmed
+    at a paragraph or sentence boundary to the remaining budget (if at least
+    MIN_TRIMMED_TOKENS remain); later, shorter hits may still fit whole.
+
+    Args:
+        hits: Retrieved hits, most relevant first
+        budget: Token budget; defaults to CONTEXT_TOKEN_BUDGET or 6000
+        encoding: tiktoken encoding; defaults to `get_encoding()`
+
+    Returns:
+        PackedContext with the prompt text and token accounting
+    """
+    encoding = encoding or get_encoding()
+    budget = budget or context_token_budget()
+    separator_tokens = count_tokens(CONTEXT_SEPARATOR, encoding)
+
+    packed: List[SearchHit] = []
+    used = trimmed = dropped = 0
+    for hit in hits:
+        separator = separator_tokens if packed else 0
+        cost = count_tokens(format_hit(hit), encoding) + separator
+        if used + cost <= budget:
+            packed.append(hit)
+            used += cost
+            continue
+
+        # Room left for the text once the source lines are paid for
+        overhead = count_tokens(format_hit(replace(hit, text="")), encoding) + separator
+        room = budget - used - overhead
+        if room < MIN_TRIMMED_TOKENS:
+            dropped += 1
+            continue
+
+        text = trim_to_tokens(hit.text or "", room, encoding)
+        packed.append(replace(hit, text=text))
+        used += count_tokens(text, encoding) + overhead
+        trimmed += 1
+
+    text = CONTEXT_SEPARATOR.join(format_hit(hit) for hit in packed)
+    return PackedContext(
+        text=text,
+        hits=packed,
+        tokens=count_tokens(text, encoding),
+        budget=budget,
+        trimmed=trimmed,
+        dropped=dropped,
+    )
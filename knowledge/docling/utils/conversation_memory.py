@@ -0,0 +1,188 @@
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.context_packing import count_tokens
+from utils.rate_governor import BACKGROUND, estimate_chat_tokens, get_rate_governor
+
+DEFAULT_RECENT_TURNS = 4  # User/assistant pairs kept verbatim
+DEFAULT_HISTORY_TOKEN_BUDGET = 2000
+SUMMARY_MAX_TOKENS = 300
+# Per-message overhead of the chat format (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+Message = Dict[str, str]
+# (previous summary, messages to fold in) -> new summary
+Summarizer = Callable[[str, List[Message]], str]
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and a real estate analyst assistant about the KFH Real Estate Reports.
+Update the summary with the new messages. Keep the questions asked, the figures, periods and sectors discussed, and any preferences the user stated. Drop greetings and formatting.
+Reply with the updated summary only, in at most {max_words} words."""
+
+# Summaries are written off the request path; one pool serves every session
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="conversation-summary")
+
+
+def message_tokens(message: Message, encoding: Any = None) -> int:
+    return count_tokens(message.get("content") or "", encoding) + MESSAGE_OVERHEAD_TOKENS
+
+
+def openai_summarizer(client: Any, model: Optional[str], max_tokens: int = SUMMARY_MAX_TOKENS) -> Summarizer:
+    """Summarizer that asks a chat deployment to fold messages into the summary.
+
+    Args:
+        client: AzureOpenAI client
+        model: Chat deployment name
+        max_tokens: Completion limit, which also bounds the summary size
+
+    Returns:
+        Callable for ConversationMemory
+    """
+
+    governor = get_rate_governor()
+
+    def summarize(summary: str, messages: List[Message]) -> str:
+        transcript = "\n".join(f"{m['role']}: {m.get('content') or ''}" for m in messages)
+        prompt = [
+            {"role": "system", "content": SUMMARY_PROMPT.format(max_words=max_tokens * 3 // 4)},
+            {
+                "role": "user",
+                "content": f"Current summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}",
+            },
+        ]
+        # Summaries yield to live chat requests for the same deployment
+        ticket = governor.acquire(model, estimate_chat_tokens(prompt, max_tokens), BACKGROUND)
+        try:
+            raw = client.chat.completions.with_raw_response.create(
+                model=model, messages=prompt, temperature=0, max_tokens=max_tokens
+            )
+            response = raw.parse()
+        except Exception:
+            governor.settle(ticket, used_tokens=0)
+            raise
+        governor.settle(ticket, response.usage.total_tokens, raw.headers)
+        return (response.choices[0].message.content or "").strip()
+
+    return summarize
+
+
+class ConversationMemory:
+    """Bounded chat history: recent turns verbatim, older ones as a summary.
+
+    `build` returns the messages to send with the next completion. The most
+    recent turns are kept word for word while they fit the token budget;
+    everything older is folded into a running summary by a background job,
+    so the live turn never waits for it. Until a fold finishes, the messages
+    it covers are simply left out.
+    """
+
+    def __init__(
+        self,
+        summarize: Optional[Summarizer] = None,
+        recent_turns: Optional[int] = None,
+        token_budget: Optional[int] = None,
+        encoding: Any = None,
+        summary: str = "",
+    ):
+        """Initialize the memory.
+
+        Args:
+            summarize: Folds messages into the summary, e.g. `openai_summarizer(...)`;
+                without one, older turns are dropped
+            recent_turns: User/assistant pairs kept verbatim; defaults to
+                MEMORY_RECENT_TURNS or 4
+            token_budget: Tokens for verbatim history; defaults to
+                MEMORY_TOKEN_BUDGET or 2000
+            encoding: tiktoken encoding; defaults to the prompt encoding
+            summary: Summary of the turns before the history passed to
+                `build`, e.g. one a stateless API's client keeps
+        """
+        self.summarize = summarize
+        self.recent_turns = recent_turns or int(
+            os.getenv("MEMORY_RECENT_TURNS", DEFAULT_RECENT_TURNS)
+        )
+        self.token_budget = token_budget or int(
+            os.getenv("MEMORY_TOKEN_BUDGET", DEFAULT_HISTORY_TOKEN_BUDGET)
+        )
+        self.encoding = encoding
+
+        self.summary = summary
+        self.summarized = 0  # Leading messages already folded into the summary
+        self._pending: Optional[Future] = None
+        self._generation = 0  # Bumped on reset so stale folds are discarded
+        self._lock = threading.Lock()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.summary = ""
+            self.summarized = 0
+            self._pending = None
+            self._generation += 1
+
+    def _window_start(self, messages: List[Message]) -> int:
+        """Index of the oldest message kept verbatim."""
+        start = len(messages)
+        used = 0
+        max_messages = self.recent_turns * 2 + 1  # Plus the new question
+        while start > 0 and len(messages) - start < max_messages:
+            cost = message_tokens(messages[start - 1], self.encoding)
+            # The newest message is always sent, even if it alone is over budget
+            if used + cost > self.token_budget and start < len(messages):
+                break
+            used += cost
+            start -= 1
+        return start
+
+    def _fold(self, generation: int, summary: str, messages: List[Message], upto: int) -> None:
+        try:
+            new_summary = self.summarize(summary, messages)
+        except Exception as e:
+            print(f"Conversation summary failed: {e}")
+            new_summary = None
+        with self._lock:
+            if generation == self._generation:
+                if new_summary:
+                    self.summary = new_summary
+                    self.summarized = upto
+                self._pending = None
+
+    def build(self, messages: List[Message]) -> List[Message]:
+        """Messages to send for the next completion.
+
+        Args:
+            messages: Full chat history, ending with the new user message
+
+        Returns:
+            A summary system message (once there is one) followed by the
+            recent messages that fit the budget
+        """
+        if len(messages) < self.summarized:
+            # The history was cleared or replaced
+            self.reset()
+
+        start = self._window_start(messages)
+        with self._lock:
+            summary = self.summary
+            if self.summarize and start > self.summarized and self._pending is None:
+                self._pending = _executor.submit(
+                    self._fold,
+                    self._generation,
+                    summary,
+                    list(messages[self.summarized:start]),
+                    start,
+                )
+
+        window = list(messages[start:])
+        if not summary:
+            return window
+        return [
+            {"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"},
+            *window,
+        ]
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """Blocks until a pending summary update finishes (for scripts and tests)."""
+        pending = self._pending
+        if pending is not None:
+            pending.result(timeout)
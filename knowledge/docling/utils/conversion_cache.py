@@ -0,0 +1,213 @@
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+from typing import Any, Mapping, Optional
+
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent.parent / "data" / "conversion_cache"
+DEFAULT_MAX_BYTES = 2 * 1024**3  # 2 GB
+
+
+def _package_version(name: str) -> str:
+    try:
+        return version(name)
+    except PackageNotFoundError:
+        return "unknown"
+
+
+def docling_version_tag() -> str:
+    """Version tag that invalidates the cache whenever docling is upgraded."""
+    return f"docling-{_package_version('docling')}_core-{_package_version('docling-core')}"
+
+
+def options_fingerprint(format_options: Mapping[Any, Any]) -> str:
+    """Hashes per-format pipeline classes and options.
+
+    Args:
+        format_options: InputFormat -> FormatOption mapping, as passed to
+            `DocumentConverter(format_options=...)`
+
+    Returns:
+        Hex digest that changes whenever the pipeline configuration changes
+    """
+    parts = []
+    for fmt, option in sorted(format_options.items(), key=lambda item: str(item[0])):
+        pipeline_cls = getattr(option, "pipeline_cls", None)
+        pipeline_options = getattr(option, "pipeline_options", None)
+        try:
+            dumped = pipeline_options.model_dump_json() if pipeline_options else ""
+        except Exception:
+            dumped = repr(pipeline_options)
+        parts.append(f"{fmt}:{getattr(pipeline_cls, '__name__', '')}:{dumped}")
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def converter_fingerprint(converter: Any) -> str:
+    """Hashes a DocumentConverter's per-format pipeline classes and options.
+
+    Args:
+        converter: The DocumentConverter whose configuration identifies a result
+
+    Returns:
+        Hex digest that changes whenever the pipeline configuration changes
+    """
+    return options_fingerprint(getattr(converter, "format_to_options", {}) or {})
+
+
+def file_digest(path: str) -> str:
+    """Streams a file through SHA-256 without loading it into memory."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ConversionCache:
+    """Content-addressed on-disk cache of converted DoclingDocuments.
+
+    Entries are keyed by the source file's SHA-256 plus the converter's pipeline
+    fingerprint and stored as gzipped JSON under a per-docling-version directory.
+    Entries written by other docling versions are purged on startup, and the
+    least recently used entries are evicted once the cache exceeds `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        max_bytes: Optional[int] = None,
+        converter: Any = None,
+        format_options: Optional[Mapping[Any, Any]] = None,
+    ):
+        """Initialize the cache.
+
+        Args:
+            cache_dir: Cache root; defaults to CONVERSION_CACHE_DIR or data/conversion_cache
+            max_bytes: Size bound; defaults to CONVERSION_CACHE_MAX_MB or 2 GB
+            converter: Converter used to fingerprint pipeline options
+            format_options: Without a converter, the format options of the
+                converter to fingerprint, e.g. those a pool of workers is built
+                with. Formats they leave out get docling's defaults, as in the
+                workers, so the key matches a converter built from them.
+        """
+        root = Path(cache_dir or os.getenv("CONVERSION_CACHE_DIR") or DEFAULT_CACHE_DIR)
+        if max_bytes is None:
+            max_mb = os.getenv("CONVERSION_CACHE_MAX_MB")
+            max_bytes = int(max_mb) * 1024**2 if max_mb else DEFAULT_MAX_BYTES
+
+        if converter is None:
+            from docling.document_converter import DocumentConverter
+
+            converter = DocumentConverter(format_options=format_options)
+        fingerprint = converter_fingerprint(converter)
+
+        self.root = root
+        self.max_bytes = max_bytes
+        self.options = fingerprint
+        self.directory = root / docling_version_tag()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._purge_stale_versions()
+
+    def _purge_stale_versions(self) -> None:
+        for entry in self.root.iterdir():
+            if entry.is_dir() and entry != self.directory:
+                shutil.rmtree(entry, ignore_errors=True)
+
+    def key(self, source: str) -> Optional[str]:
+        """Returns the cache key for a local file, or None for remote sources."""
+        if not os.path.isfile(source):
+            return None
+        return hashlib.sha256(
+            f"{file_digest(source)}:{self.options}".encode("utf-8")
+        ).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json.gz"
+
+    def get(self, source: str) -> Optional[Any]:
+        """Loads the cached DoclingDocument for a source, if present."""
+        key = self.key(source)
+        if key is None:
+            return None
+
+        path = self._path(key)
+        try:
+            with gzip.open(path, "rb") as f:
+                data = json.loads(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            # Corrupt or partially written entry; drop it and re-convert
+            path.unlink(missing_ok=True)
+            return None
+
+        from docling_core.types.doc import DoclingDocument
+
+        os.utime(path)  # Refresh recency for LRU eviction
+        return DoclingDocument.model_validate(data)
+
+    def put(self, source: str, document: Any) -> None:
+        """Stores a converted DoclingDocument and enforces the size bound."""
+        key = self.key(source)
+        if key is None:
+            return
+
+        payload = json.dumps(document.export_to_dict(), separators=(",", ":"))
+
+        # Write to a temp file and rename so concurrent readers never see partial data
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb") as f:
+                f.write(payload.encode("utf-8"))
+            os.replace(tmp_path, self._path(key))
+        except Exception:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+
+        self.evict()
+
+    def evict(self) -> None:
+        """Deletes least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        for path in self.directory.glob("*.json.gz"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self) -> None:
+        """Removes every cached document."""
+        shutil.rmtree(self.root, ignore_errors=True)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+
+def convert_cached(converter: Any, source: str, cache: Optional[ConversionCache] = None):
+    """Converts a document, reusing the cached DoclingDocument when available.
+
+    Args:
+        converter: DocumentConverter used on a cache miss
+        source: Path or URL of the document
+        cache: Cache to consult; a default cache for `converter` is used if omitted
+
+    Returns:
+        The converted DoclingDocument
+    """
+    cache = cache or ConversionCache(converter=converter)
+
+    document = cache.get(source)
+    if document is None:
+        document = converter.convert(source).document
+        cache.put(source, document)
+    return document
@@ -0,0 +1,156 @@
+import os
+from typing import List, Optional
+
+import numpy as np
+import pyarrow as pa
+
+from utils.retrieval import ID_COLUMNS, SearchHit, hits_from_arrow
+
+DEFAULT_LAMBDA = 0.7
+DEFAULT_DUPLICATE_THRESHOLD = 0.95
+DEFAULT_OVERFETCH = 4
+
+# Search columns for a diversified query: ids plus the vectors MMR compares
+# candidates with. Text and metadata are read only for the hits MMR picks
+# (see `retrieval.hydrate_hits`), not for every over-fetched candidate.
+DIVERSIFY_COLUMNS = [*ID_COLUMNS, "vector"]
+
+
+def overfetch_limit(k: int, overfetch: Optional[int] = None) -> int:
+    """Number of candidates to retrieve so MMR can pick `k` distinct ones."""
+    overfetch = overfetch or int(os.getenv("MMR_OVERFETCH", DEFAULT_OVERFETCH))
+    return k * max(overfetch, 1)
+
+
+def _unit_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def mmr_select(
+    candidates: np.ndarray,
+    k: int,
+    query_vector: Optional[List[float]] = None,
+    lambda_mult: float = DEFAULT_LAMBDA,
+    duplicate_threshold: float = DEFAULT_DUPLICATE_THRESHOLD,
+    relevance: Optional[np.ndarray] = None,
+) -> List[int]:
+    """Picks up to `k` relevant, mutually distinct candidates.
+
+    Maximal marginal relevance scores each candidate as
+    `lambda * relevance - (1 - lambda) * max similarity to those already
+    picked`. Candidates at least `duplicate_threshold` similar to a picked
+    one are dropped outright, so fewer than `k` may be returned.
+
+    Args:
+        candidates: Candidate embeddings, one row each, in retrieval order
+        k: Number of candidates to pick
+        query_vector: Query embedding; relevance is cosine similarity to it.
+            Without one, relevance falls off linearly with retrieval rank.
+        lambda_mult: 1.0 ranks by relevance alone, 0.0 by novelty alone
+        duplicate_threshold: Cosine similarity above which a candidate is a
+            near-duplicate of a picked one
+        relevance: Precomputed relevance per candidate, e.g. fused search
+            scores; takes precedence over `query_vector`
+
+    Returns:
+        Row indices of the picked candidates, in pick order
+    """
+    num_candidates = len(candidates)
+    if num_candidates == 0 or k <= 0:
+        return []
+
+    unit = _unit_rows(candidates.astype(np.float32))
+    if relevance is not None:
+        relevance = np.asarray(relevance, dtype=np.float32)
+    elif query_vector is not None:
+        query = np.asarray(query_vector, dtype=np.float32)
+        relevance = unit @ (query / max(float(np.linalg.norm(query)), 1e-12))
+    else:
+        relevance = 1.0 - np.arange(num_candidates, dtype=np.float32) / num_candidates
+
+    similarity = unit @ unit.T
+    max_similarity = np.full(num_candidates, -np.inf, dtype=np.float32)
+    available = np.ones(num_candidates, dtype=bool)
+
+    picked = []
+    while len(picked) < k and available.any():
+        redundancy = np.where(np.isfinite(max_similarity), max_similarity, 0.0)
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * redundancy
+        best = int(np.argmax(np.where(available, scores, -np.inf)))
+        picked.append(best)
+
+        max_similarity = np.maximum(max_similarity, similarity[best])
+        available[best] = False
+        available &= max_similarity < duplicate_threshold
+    return picked
+
+
+def arrow_vectors(results: pa.Table, column: str = "vector") -> np.ndarray:
+    """Reads a fixed-size-list vector column into a float32 matrix."""
+    vectors = results.column(column).combine_chunks()
+    width = vectors.type.list_size
+    values = vectors.flatten().to_numpy(zero_copy_only=False)
+    return values.reshape(-1, width).astype(np.float32)
+
+
+def ranked_relevance(results: pa.Table) -> Optional[np.ndarray]:
+    """Relevance of an already ranked (hybrid or RRF-fused) result, or None.
+
+    Fused scores are only meaningful relative to each other, so they are
+    scaled to (0, 1] by the best one, the same range as rank-based relevance.
+    """
+    if "_relevance_score" not in results.column_names:
+        return None
+    scores = results.column("_relevance_score").to_numpy(zero_copy_only=False)
+    scores = np.nan_to_num(scores.astype(np.float32))
+    best = float(scores.max()) if len(scores) else 0.0
+    if best <= 0.0:
+        return 1.0 - np.arange(len(scores), dtype=np.float32) / max(len(scores), 1)
+    return scores / best
+
+
+def diversify(
+    results: pa.Table,
+    k: int,
+    query_vector: Optional[List[float]] = None,
+    lambda_mult: Optional[float] = None,
+    duplicate_threshold: Optional[float] = None,
+) -> List[SearchHit]:
+    """Reduces an over-fetched search result to `k` distinct hits.
+
+    Args:
+        results: Arrow result of a search with DIVERSIFY_COLUMNS, ideally
+            `overfetch_limit(k)` rows
+        k: Number of hits to return
+        query_vector: Query embedding (None for lexical searches). Only used
+            as relevance for pure vector results; hybrid and RRF-fused
+            results keep their fused order via `_relevance_score`.
+        lambda_mult: Relevance/novelty trade-off; defaults to MMR_LAMBDA or 0.7
+        duplicate_threshold: Near-duplicate cut-off; defaults to
+            DUPLICATE_THRESHOLD or 0.95
+
+    Returns:
+        Up to `k` hits in pick order. Without a vector column the first `k`
+        hits are returned unchanged. Hits searched with DIVERSIFY_COLUMNS
+        carry only ids and scores until passed to `retrieval.hydrate_hits`.
+    """
+    hits = hits_from_arrow(results)
+    if "vector" not in results.column_names or len(hits) <= 1:
+        return hits[:k]
+
+    lambda_mult = lambda_mult if lambda_mult is not None else float(
+        os.getenv("MMR_LAMBDA", DEFAULT_LAMBDA)
+    )
+    duplicate_threshold = duplicate_threshold or float(
+        os.getenv("DUPLICATE_THRESHOLD", DEFAULT_DUPLICATE_THRESHOLD)
+    )
+    picked = mmr_select(
+        arrow_vectors(results),
+        k,
+        query_vector=query_vector,
+        lambda_mult=lambda_mult,
+        duplicate_threshold=duplicate_threshold,
+        relevance=ranked_relevance(results),
+    )
+    return [hits[index] for index in picked]
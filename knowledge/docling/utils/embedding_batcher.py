@@ -0,0 +1,309 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import openai
+
+from utils.rate_governor import (
+    BATCH,
+    RateGovernor,
+    get_rate_governor,
+    header_float,
+    retry_after_seconds,
+)
+from utils.vector_config import requested_dimensions
+
+# Azure OpenAI / OpenAI limits for a single embeddings request
+MAX_INPUTS_PER_REQUEST = 2048
+MAX_TOKENS_PER_REQUEST = 300_000
+MAX_TOKENS_PER_INPUT = 8191
+
+# A batch that keeps getting throttled is eventually reported instead of looping
+MAX_THROTTLES_PER_BATCH = 20
+
+
+class EmbeddingBatchError(Exception):
+    """Raised when some inputs could not be embedded after all retries.
+
+    Attributes:
+        vectors: One entry per input; None where embedding failed
+        failed: Input index mapped to the last error seen for it
+    """
+
+    def __init__(self, vectors: List[Optional[List[float]]], failed: Dict[int, str]):
+        super().__init__(f"{len(failed)} of {len(vectors)} inputs failed to embed")
+        self.vectors = vectors
+        self.failed = failed
+
+
+@dataclass
+class _Batch:
+    indices: List[int]
+    tokens: int
+    attempts: int = 0
+    throttles: int = 0
+    not_before: float = 0.0
+
+
+class AdaptiveConcurrency:
+    """AIMD concurrency limit that also honours rate-limit headers.
+
+    The limit grows by roughly one slot per window of successful requests and
+    halves on every 429, and all dispatching pauses for the advertised
+    retry-after period.
+    """
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: int = 16):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.paused_until = 0.0
+
+    def capacity(self, in_flight: int) -> int:
+        """Number of additional requests that may be dispatched now."""
+        if time.monotonic() < self.paused_until:
+            return 0
+        return max(0, int(self.limit) - in_flight)
+
+    def on_success(self, headers: Any = None, next_tokens: int = 0) -> None:
+        self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+        if headers is None:
+            return
+        remaining_requests = header_float(headers, "x-ratelimit-remaining-requests")
+        remaining_tokens = header_float(headers, "x-ratelimit-remaining-tokens")
+        if (remaining_requests is not None and remaining_requests < 1) or (
+            remaining_tokens is not None and remaining_tokens < next_tokens
+        ):
+            # The quota window is nearly spent; back off before we get a 429
+            self.limit = max(self.minimum, self.limit / 2)
+            self.pause(retry_after_seconds(headers))
+
+    def on_throttle(self, retry_after: float) -> None:
+        self.limit = max(self.minimum, self.limit / 2)
+        self.pause(retry_after)
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class EmbeddingBatcher:
+    """Packs texts into token-budgeted requests and embeds them concurrently.
+
+    Failed batches go to a dead-letter queue and are retried with exponential
+    backoff. A batch rejected as a bad request is split so one bad input
+    cannot sink its neighbours. Inputs that still fail are reported through
+    EmbeddingBatchError rather than replaced with placeholder vectors.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        deployment: Optional[str] = None,
+        dimensions: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        max_tokens_per_request: int = MAX_TOKENS_PER_REQUEST,
+        max_inputs_per_request: int = MAX_INPUTS_PER_REQUEST,
+        max_retries: int = 5,
+        tokenizer: Any = None,
+        governor: Optional[RateGovernor] = None,
+    ):
+        """Initialize the batcher.
+
+        Args:
+            client: AzureOpenAI client; its built-in retries are disabled so 429s
+                reach the adaptive limiter
+            deployment: Embedding deployment; defaults to AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME
+            dimensions: Requested embedding size; defaults to EMBEDDING_DIMENSIONS
+                (see utils.vector_config)
+            max_concurrency: Upper bound on parallel requests; defaults to
+                EMBEDDING_MAX_CONCURRENCY or 8
+            max_tokens_per_request: Token budget packed into one request; the
+                governor's `max_request_tokens` lowers it when smaller
+            max_inputs_per_request: Input count packed into one request
+            max_retries: Attempts per batch before its inputs are marked failed
+            tokenizer: An OpenAITokenizerWrapper; the cl100k_base tiktoken encoding
+                it wraps is used directly when omitted
+            governor: Rate governor each request is admitted through, at batch
+                priority; defaults to the shared one
+        """
+        self.client = client.with_options(max_retries=0)
+        self.deployment = deployment or os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME")
+        self.dimensions = dimensions or requested_dimensions()
+        self.max_tokens_per_request = max_tokens_per_request
+        self.max_inputs_per_request = max_inputs_per_request
+        self.max_retries = max_retries
+
+        maximum = max_concurrency or int(os.getenv("EMBEDDING_MAX_CONCURRENCY", 8))
+        self.limiter = AdaptiveConcurrency(initial=max(1, maximum // 2), maximum=maximum)
+
+        self.tokenizer = tokenizer
+        self._encoding = None
+        self.governor = governor or get_rate_governor()
+
+    def count_tokens(self, text: str) -> int:
+        if self.tokenizer is not None:
+            return len(self.tokenizer.tokenize(text))
+        if self._encoding is None:
+            from tiktoken import get_encoding
+
+            self._encoding = get_encoding("cl100k_base")
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def pack(self, token_counts: List[int]) -> List[_Batch]:
+        """Greedily groups inputs, in order, under the per-request limits.
+
+        The token budget is also capped at the largest batch the rate governor
+        admits at once, so a request never has to wait for several refills.
+        """
+        max_tokens = min(
+            self.max_tokens_per_request,
+            self.governor.max_request_tokens(self.deployment, BATCH),
+        )
+        batches = []
+        current, current_tokens = [], 0
+        for index, tokens in enumerate(token_counts):
+            if current and (
+                current_tokens + tokens > max_tokens
+                or len(current) >= self.max_inputs_per_request
+            ):
+                batches.append(_Batch(current, current_tokens))
+                current, current_tokens = [], 0
+            current.append(index)
+            current_tokens += tokens
+        if current:
+            batches.append(_Batch(current, current_tokens))
+        return batches
+
+    def _send(self, texts: List[str], tokens: int) -> Tuple[List[List[float]], Any]:
+        kwargs = {"model": self.deployment, "input": texts}
+        if self.dimensions:
+            kwargs["dimensions"] = self.dimensions
+        # Waits while live chat traffic or the quota window needs the deployment
+        ticket = self.governor.acquire(self.deployment, tokens, BATCH)
+        try:
+            raw = self.client.embeddings.with_raw_response.create(**kwargs)
+        except Exception:
+            self.governor.settle(ticket, used_tokens=0)
+            raise
+        response = raw.parse()
+        usage = getattr(response, "usage", None)
+        self.governor.settle(ticket, getattr(usage, "total_tokens", None), raw.headers)
+        return [data.embedding for data in response.data], raw.headers
+
+    def _backoff(self, attempts: int) -> float:
+        return min(60.0, 2 ** attempts)
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embeds texts with packed, concurrent requests.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            One vector per input text, in input order
+
+        Raises:
+            EmbeddingBatchError: If some inputs failed after all retries; the
+                successfully embedded vectors are carried on the exception
+        """
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        failed: Dict[int, str] = {}
+
+        token_counts = [self.count_tokens(text) for text in texts]
+        embeddable = []
+        for index, tokens in enumerate(token_counts):
+            if tokens > MAX_TOKENS_PER_INPUT:
+                failed[index] = f"input has {tokens} tokens (limit {MAX_TOKENS_PER_INPUT})"
+            else:
+                embeddable.append(index)
+
+        pending = deque(
+            _Batch([embeddable[i] for i in batch.indices], batch.tokens)
+            for batch in self.pack([token_counts[i] for i in embeddable])
+        )
+        dead_letter: List[_Batch] = []
+
+        with ThreadPoolExecutor(max_workers=self.limiter.maximum) as pool:
+            in_flight = {}
+            while pending or dead_letter or in_flight:
+                now = time.monotonic()
+                for batch in [b for b in dead_letter if b.not_before <= now]:
+                    dead_letter.remove(batch)
+                    pending.append(batch)
+
+                for _ in range(self.limiter.capacity(len(in_flight))):
+                    if not pending:
+                        break
+                    batch = pending.popleft()
+                    future = pool.submit(
+                        self._send, [texts[i] for i in batch.indices], batch.tokens
+                    )
+                    in_flight[future] = batch
+
+                if not in_flight:
+                    wake = min(
+                        [b.not_before for b in dead_letter] + [self.limiter.paused_until]
+                    )
+                    time.sleep(max(0.05, min(wake - time.monotonic(), 1.0)))
+                    continue
+
+                done, _ = wait(in_flight, timeout=0.5, return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch = in_flight.pop(future)
+                    try:
+                        batch_vectors, headers = future.result()
+                    except openai.RateLimitError as e:
+                        # Throttling is not the batch's fault; requeue without a strike
+                        retry_after = retry_after_seconds(e.response.headers)
+                        self.limiter.on_throttle(retry_after)
+                        self.governor.throttled(self.deployment, retry_after)
+                        batch.throttles += 1
+                        if batch.throttles > MAX_THROTTLES_PER_BATCH:
+                            for index in batch.indices:
+                                failed[index] = f"RateLimitError: {e}"
+                        else:
+                            pending.appendleft(batch)
+                        continue
+                    except openai.BadRequestError as e:
+                        self._retry_or_fail(batch, e, dead_letter, failed, split=True)
+                        continue
+                    except Exception as e:
+                        self._retry_or_fail(batch, e, dead_letter, failed, split=False)
+                        continue
+
+                    next_tokens = pending[0].tokens if pending else 0
+                    self.limiter.on_success(headers, next_tokens)
+                    for index, vector in zip(batch.indices, batch_vectors):
+                        vectors[index] = vector
+
+        if failed:
+            raise EmbeddingBatchError(vectors, failed)
+        return vectors
+
+    def _retry_or_fail(
+        self,
+        batch: _Batch,
+        error: Exception,
+        dead_letter: List[_Batch],
+        failed: Dict[int, str],
+        split: bool,
+    ) -> None:
+        batch.attempts += 1
+        if split and len(batch.indices) > 1:
+            # Isolate the offending input(s) by bisecting the batch
+            middle = len(batch.indices) // 2
+            for indices in (batch.indices[:middle], batch.indices[middle:]):
+                dead_letter.append(_Batch(indices, batch.tokens // 2, batch.attempts - 1))
+            return
+
+        if batch.attempts > self.max_retries or split:
+            for index in batch.indices:
+                failed[index] = f"{type(error).__name__}: {error}"
+            return
+
+        batch.not_before = time.monotonic() + self._backoff(batch.attempts)
+        dead_letter.append(batch)
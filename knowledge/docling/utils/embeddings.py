@@ -0,0 +1,346 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import openai
+
+from utils.embedding_batcher import EmbeddingBatchError
+from utils.rate_governor import (
+    INTERACTIVE,
+    RateGovernor,
+    estimate_embedding_tokens,
+    get_rate_governor,
+    retry_after_seconds,
+)
+from utils.vector_config import requested_dimensions
+
+DEFAULT_CACHE_PATH = (
+    Path(__file__).resolve().parent.parent / "data" / "embedding_cache.sqlite3"
+)
+DEFAULT_MAX_ENTRIES = 200_000
+DEFAULT_MEMORY_ENTRIES = 2048
+SQLITE_BATCH_SIZE = 500  # Stay well below SQLite's bound-variable limit
+# Seconds a single (interactive) request may wait for rate-governor admission;
+# past that the caller falls back to keyword search rather than queueing
+DEFAULT_ADMISSION_TIMEOUT = 2.0
+
+
+def normalize_text(text: str) -> str:
+    """Collapses whitespace so trivially different strings share a cache entry."""
+    return " ".join(text.split())
+
+
+def embedding_key(deployment: Optional[str], dimensions: Optional[int], text: str) -> str:
+    """Cache key for an embedding: deployment, dimensions and normalized text hash."""
+    payload = f"{deployment or ''}\x00{dimensions or ''}\x00{normalize_text(text)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Two-tier embedding cache: an in-memory LRU in front of SQLite on disk.
+
+    The SQLite file runs in WAL mode with a busy timeout, so the chat apps and
+    ingestion scripts can share one cache from several processes. Vectors are
+    stored as packed float32, and the least recently used rows are evicted
+    once the table grows past `max_entries`.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_entries: Optional[int] = None,
+        memory_entries: int = DEFAULT_MEMORY_ENTRIES,
+    ):
+        """Initialize the cache.
+
+        Args:
+            path: SQLite file; defaults to EMBEDDING_CACHE_PATH or data/embedding_cache.sqlite3
+            max_entries: On-disk size bound; defaults to EMBEDDING_CACHE_MAX_ENTRIES
+            memory_entries: Number of vectors kept in the in-process LRU
+        """
+        self.path = str(path or os.getenv("EMBEDDING_CACHE_PATH") or DEFAULT_CACHE_PATH)
+        self.max_entries = max_entries or int(
+            os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)
+        )
+        self.memory_entries = memory_entries
+
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Looks keys up in memory first, then on disk.
+
+        Returns:
+            Mapping of the keys that were found to their vectors
+        """
+        found = {}
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+
+        missing = [key for key in keys if key not in found]
+        if not missing:
+            return found
+
+        conn = self._connection()
+        rows = []
+        for i in range(0, len(missing), SQLITE_BATCH_SIZE):
+            batch = missing[i:i + SQLITE_BATCH_SIZE]
+            placeholders = ", ".join("?" for _ in batch)
+            rows.extend(
+                conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchall()
+            )
+
+        if rows:
+            with conn:
+                conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(time.time(), key) for key, _ in rows],
+                )
+        for key, blob in rows:
+            vector = array("f", blob).tolist()
+            found[key] = vector
+            self._remember(key, vector)
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]) -> None:
+        """Stores vectors in both tiers and enforces the on-disk size bound."""
+        if not items:
+            return
+
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, array("f", vector).tobytes(), now) for key, vector in items.items()],
+            )
+            (count,) = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            if count > self.max_entries:
+                conn.execute(
+                    "DELETE FROM embeddings WHERE key IN ("
+                    "SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+
+        for key, vector in items.items():
+            self._remember(key, vector)
+
+
+@lru_cache(maxsize=None)
+def get_embedding_cache() -> EmbeddingCache:
+    """Process-wide cache shared by every embedder (and every Streamlit rerun)."""
+    return EmbeddingCache()
+
+
+class CachedEmbedder:
+    """Azure OpenAI embeddings that only call the API for texts not seen before."""
+
+    def __init__(
+        self,
+        client: Any,
+        deployment: Optional[str] = None,
+        dimensions: Optional[int] = None,
+        cache: Optional[EmbeddingCache] = None,
+        batcher: Any = None,
+        governor: Optional[RateGovernor] = None,
+        admission_timeout: Optional[float] = None,
+    ):
+        """Initialize the embedder.
+
+        Args:
+            client: AzureOpenAI client used on cache misses
+            deployment: Embedding deployment; defaults to AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME
+            dimensions: Requested embedding size; defaults to EMBEDDING_DIMENSIONS
+                (see utils.vector_config)
+            cache: Cache to use; defaults to the process-wide cache
+            batcher: Optional EmbeddingBatcher used for misses instead of a
+                single request (for bulk ingestion)
+            governor: Rate governor single requests are admitted through, at
+                interactive priority; defaults to the shared one
+            admission_timeout: Seconds a single request waits for admission
+                before failing with RateGovernorTimeout; defaults to
+                EMBEDDING_ADMISSION_TIMEOUT or 2
+        """
+        self.client = client
+        self.deployment = deployment or os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME")
+        self.dimensions = dimensions or requested_dimensions()
+        self.cache = cache or get_embedding_cache()
+        self.batcher = batcher
+        self.governor = governor or get_rate_governor()
+        self.admission_timeout = admission_timeout or float(
+            os.getenv("EMBEDDING_ADMISSION_TIMEOUT", DEFAULT_ADMISSION_TIMEOUT)
+        )
+
+    @property
+    def namespace(self) -> str:
+        """Identifies the vector space: deployment and requested dimensions."""
+        return f"{self.deployment or ''}:{self.dimensions or ''}"
+
+    def _request_kwargs(self, texts: List[str]) -> Dict[str, Any]:
+        kwargs = {"model": self.deployment, "input": texts}
+        if self.dimensions:
+            kwargs["dimensions"] = self.dimensions
+        return kwargs
+
+    def _request(self, texts: List[str]) -> List[List[float]]:
+        if self.batcher is not None:
+            return self.batcher.embed(texts)
+
+        ticket = self.governor.acquire(
+            self.deployment,
+            estimate_embedding_tokens(texts),
+            INTERACTIVE,
+            timeout=self.admission_timeout,
+        )
+        try:
+            raw = self.client.embeddings.with_raw_response.create(**self._request_kwargs(texts))
+            response = raw.parse()
+        except Exception as e:
+            self.governor.settle(ticket, used_tokens=0)
+            if isinstance(e, openai.RateLimitError):
+                self.governor.throttled(self.deployment, retry_after_seconds(e.response.headers))
+            raise
+        self.governor.settle(ticket, response.usage.total_tokens, raw.headers)
+        return [data.embedding for data in response.data]
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embeds texts, serving repeats from the cache.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            One vector per input text, in input order
+
+        Raises:
+            EmbeddingBatchError: If the batcher could not embed some texts; the
+                vectors that did succeed are cached and carried on the exception
+        """
+        keys = [embedding_key(self.deployment, self.dimensions, text) for text in texts]
+        found = self.cache.get_many(list(dict.fromkeys(keys)))
+
+        # Embed each distinct missing text once, even if it repeats in the input
+        pending = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in pending:
+                pending[key] = text
+
+        failed_keys = {}
+        if pending:
+            try:
+                vectors = self._request(list(pending.values()))
+            except EmbeddingBatchError as e:
+                vectors = e.vectors
+                pending_keys = list(pending.keys())
+                failed_keys = {pending_keys[i]: reason for i, reason in e.failed.items()}
+
+            fresh = {
+                key: vector
+                for key, vector in zip(pending.keys(), vectors)
+                if vector is not None
+            }
+            self.cache.put_many(fresh)
+            found.update(fresh)
+
+        if failed_keys:
+            # Re-map failures onto the caller's input positions
+            raise EmbeddingBatchError(
+                [found.get(key) for key in keys],
+                {i: failed_keys[key] for i, key in enumerate(keys) if key in failed_keys},
+            )
+        return [found[key] for key in keys]
+
+    async def embed_async(self, texts: List[str], client: Any) -> List[List[float]]:
+        """Async counterpart of `embed`, for the request path.
+
+        Misses are embedded with one request on `client`; the batcher is not
+        used. Vectors land in the same cache as `embed`'s.
+
+        Args:
+            texts: Texts to embed
+            client: AsyncAzureOpenAI client
+
+        Returns:
+            One vector per input text, in input order
+        """
+        keys = [embedding_key(self.deployment, self.dimensions, text) for text in texts]
+        # SQLite reads and writes would block the event loop
+        found = await asyncio.to_thread(self.cache.get_many, list(dict.fromkeys(keys)))
+
+        pending = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in pending:
+                pending[key] = text
+
+        if pending:
+            texts = list(pending.values())
+            ticket = await self.governor.acquire_async(
+                self.deployment,
+                estimate_embedding_tokens(texts),
+                INTERACTIVE,
+                timeout=self.admission_timeout,
+            )
+            try:
+                raw = await client.embeddings.with_raw_response.create(
+                    **self._request_kwargs(texts)
+                )
+                response = raw.parse()
+            except Exception as e:
+                await asyncio.to_thread(self.governor.settle, ticket, 0)
+                if isinstance(e, openai.RateLimitError):
+                    await asyncio.to_thread(
+                        self.governor.throttled,
+                        self.deployment,
+                        retry_after_seconds(e.response.headers),
+                    )
+                raise
+            await asyncio.to_thread(
+                self.governor.settle, ticket, response.usage.total_tokens, raw.headers
+            )
+            fresh = dict(zip(pending.keys(), [data.embedding for data in response.data]))
+            await asyncio.to_thread(self.cache.put_many, fresh)
+            found.update(fresh)
+        return [found[key] for key in keys]
@@ -0,0 +1,123 @@
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+DELETE_BATCH_SIZE = 500
+
+
+def chunk_id(filename: Optional[str], text: str, metadata: Dict[str, Any]) -> str:
+    """Stable content hash for a chunk.
+
+    The id changes whenever the chunk text or any of its metadata changes, so an
+    edited chunk is re-embedded and its previous version is detected as stale.
+
+    Args:
+        filename: Source document of the chunk
+        text: Chunk text
+        metadata: Remaining metadata stored alongside the chunk
+
+    Returns:
+        Hex SHA-256 digest
+    """
+    payload = json.dumps(
+        {"filename": filename, "text": text, "metadata": metadata},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class UpsertReport:
+    skipped: int = 0
+    upserted: int = 0
+    removed: int = 0
+    failed: int = 0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.skipped} unchanged (skipped), {self.upserted} new or updated, "
+            f"{self.removed} removed, {self.failed} failed"
+        )
+
+
+def supports_incremental(table: Any) -> bool:
+    """Whether the table carries the stable `id` column used for upserts."""
+    return "id" in table.schema.names
+
+
+def existing_chunk_ids(table: Any) -> Dict[str, Optional[str]]:
+    """Maps every stored chunk id to its source filename.
+
+    Only the id and metadata columns are read; the vectors stay on disk.
+    """
+    num_rows = table.count_rows()
+    if num_rows == 0:
+        return {}
+
+    batch = (
+        table.search()
+        .select(["id", "metadata"])
+        .limit(num_rows)
+        .to_arrow()
+    )
+    ids = batch.column("id").to_pylist()
+    filenames = [
+        metadata["filename"] if metadata else None
+        for metadata in batch.column("metadata").to_pylist()
+    ]
+    return dict(zip(ids, filenames))
+
+
+def find_stale_ids(
+    existing: Dict[str, Optional[str]],
+    seen_ids: Set[str],
+    current_filenames: Set[str],
+    protected_filenames: Iterable[str] = (),
+    prune_missing: bool = True,
+) -> List[str]:
+    """Finds stored chunks that were not produced again by this run.
+
+    Args:
+        existing: Stored ids mapped to their filename (see `existing_chunk_ids`)
+        seen_ids: Every chunk id produced by this run, embedded or skipped
+        current_filenames: Every document that is part of the corpus for this run
+        protected_filenames: Documents whose stored chunks must not be deleted,
+            e.g. because their conversion or embedding failed in this run
+        prune_missing: Delete chunks of documents that are no longer in the corpus
+
+    Returns:
+        Ids of the stored chunks to delete
+    """
+    protected = set(protected_filenames)
+    return [
+        stored_id
+        for stored_id, filename in existing.items()
+        if stored_id not in seen_ids
+        and filename not in protected
+        and (filename in current_filenames or prune_missing)
+    ]
+
+
+def upsert_rows(table: Any, rows: Any) -> None:
+    """Merge-inserts rows (dicts or an Arrow table) on `id`.
+
+    Concurrent readers never see an empty table.
+    """
+    if len(rows) == 0:
+        return
+    (
+        table.merge_insert("id")
+        .when_matched_update_all()
+        .when_not_matched_insert_all()
+        .execute(rows)
+    )
+
+
+def delete_ids(table: Any, ids: List[str]) -> None:
+    """Deletes rows by id in bounded batches to keep the SQL predicate small."""
+    for i in range(0, len(ids), DELETE_BATCH_SIZE):
+        batch = ids[i:i + DELETE_BATCH_SIZE]
+        quoted = ", ".join(f"'{chunk}'" for chunk in batch)
+        table.delete(f"id IN ({quoted})")
@@ -0,0 +1,247 @@
+import math
+import os
+from dataclasses import dataclass
+from typing import Any, List, Optional
+
+import pyarrow as pa
+
+VECTOR_COLUMN = "vector"
+TEXT_COLUMN = "text"
+
+# Filter columns and their scalar index types: bitmaps for low-cardinality
+# values, a B-tree for headings, a label list for page-number lists
+SCALAR_INDEXES = {
+    "id": "BTREE",  # Hydrating the hits a search picked reads them by id
+    "doc_id": "BITMAP",
+    "report_period": "BITMAP",
+    "section": "BTREE",
+    "sectors": "LABEL_LIST",
+    "metadata.page_numbers": "LABEL_LIST",
+}
+
+# Below this many rows a brute-force scan is as fast as an ANN index
+MIN_ROWS_FOR_INDEX = 2048
+
+# Retrain once the table has grown this much beyond the rows the index was
+# trained on, since the partition count no longer fits the data
+STALE_GROWTH_FACTOR = 2.0
+
+
+@dataclass
+class VectorIndexParams:
+    index_type: str
+    num_partitions: int
+    num_sub_vectors: Optional[int] = None
+    distance_type: str = "l2"
+
+
+@dataclass
+class IndexReport:
+    action: str  # skipped, created, rebuilt, updated or current
+    rows: int
+    params: Optional[VectorIndexParams] = None
+    kind: str = "vector"  # vector or full-text
+
+    def __str__(self) -> str:
+        if self.params is None:
+            return f"{self.kind} index {self.action} ({self.rows} rows)"
+        return (
+            f"{self.kind} index {self.action} ({self.rows} rows, {self.params.index_type}, "
+            f"{self.params.num_partitions} partitions"
+            + (f", {self.params.num_sub_vectors} sub-vectors" if self.params.num_sub_vectors else "")
+            + ")"
+        )
+
+
+def pq_sub_vectors(dimensions: int, target: int) -> int:
+    """Largest sub-vector count at or below `target` that divides `dimensions`.
+
+    PQ splits each vector into equal slices, so the count must divide the
+    width; e.g. 1000 dimensions with a target of 62 gives 50.
+    """
+    for count in range(min(max(1, target), dimensions), 0, -1):
+        if dimensions % count == 0:
+            return count
+    return 1
+
+
+def choose_index_params(num_rows: int, dimensions: int) -> VectorIndexParams:
+    """Derives ANN index parameters from the corpus size.
+
+    Partitions follow the usual sqrt(n) rule for small corpora and ~4k rows per
+    partition for large ones; PQ uses about 16 dimensions per sub-vector,
+    adjusted down to a divisor of `dimensions` (the override too). Every value
+    can be overridden through VECTOR_INDEX_TYPE (IVF_PQ or IVF_HNSW_SQ),
+    VECTOR_INDEX_PARTITIONS and VECTOR_INDEX_SUB_VECTORS.
+
+    Args:
+        num_rows: Rows in the table
+        dimensions: Width of the vector column
+
+    Returns:
+        VectorIndexParams for `build_vector_index`
+    """
+    index_type = os.getenv("VECTOR_INDEX_TYPE", "IVF_PQ").upper()
+
+    if num_rows <= 1_000_000:
+        partitions = int(round(math.sqrt(num_rows)))
+    else:
+        partitions = num_rows // 4096
+    partitions = int(os.getenv("VECTOR_INDEX_PARTITIONS", max(1, partitions)))
+
+    sub_vectors = None
+    if index_type == "IVF_PQ":
+        target = int(os.getenv("VECTOR_INDEX_SUB_VECTORS", dimensions // 16))
+        sub_vectors = pq_sub_vectors(dimensions, target)
+
+    return VectorIndexParams(index_type, partitions, sub_vectors)
+
+
+def _vector_dimensions(table: Any) -> int:
+    return table.schema.field(VECTOR_COLUMN).type.list_size
+
+
+def _find_index(table: Any, column: str, index_type: Optional[str] = None) -> Optional[Any]:
+    for index in table.list_indices():
+        if column in index.columns and (index_type is None or index.index_type == index_type):
+            return index
+    return None
+
+
+def find_vector_index(table: Any) -> Optional[Any]:
+    """Returns the index config covering the vector column, if one exists."""
+    return _find_index(table, VECTOR_COLUMN)
+
+
+def find_fts_index(table: Any) -> Optional[Any]:
+    """Returns the full-text index on the text column, if one exists."""
+    return _find_index(table, TEXT_COLUMN, "FTS")
+
+
+def build_vector_index(table: Any, params: VectorIndexParams) -> None:
+    """(Re)creates the ANN index on the vector column."""
+    from lancedb.index import IvfHnswSq, IvfPq
+
+    if params.index_type == "IVF_HNSW_SQ":
+        config = IvfHnswSq(
+            distance_type=params.distance_type, num_partitions=params.num_partitions
+        )
+    else:
+        config = IvfPq(
+            distance_type=params.distance_type,
+            num_partitions=params.num_partitions,
+            num_sub_vectors=params.num_sub_vectors,
+        )
+    table.create_index(VECTOR_COLUMN, config=config, replace=True)
+
+
+def ensure_vector_index(table: Any, force: bool = False) -> IndexReport:
+    """Creates, refreshes or rebuilds the vector index as the corpus changes.
+
+    Args:
+        table: LanceDB table with a `vector` column
+        force: Rebuild even if the existing index is current
+
+    Returns:
+        IndexReport describing what was done
+    """
+    num_rows = table.count_rows()
+    existing = find_vector_index(table)
+
+    if existing is None and num_rows < MIN_ROWS_FOR_INDEX:
+        return IndexReport("skipped", num_rows)
+
+    params = choose_index_params(num_rows, _vector_dimensions(table))
+    if existing is None:
+        build_vector_index(table, params)
+        return IndexReport("created", num_rows, params)
+
+    stats = table.index_stats(existing.name)
+    indexed = stats.num_indexed_rows if stats else 0
+    if force or num_rows > max(indexed, 1) * STALE_GROWTH_FACTOR:
+        build_vector_index(table, params)
+        return IndexReport("rebuilt", num_rows, params)
+
+    if stats and stats.num_unindexed_rows:
+        # Folds newly added rows into the existing partitions
+        table.optimize()
+        return IndexReport("updated", num_rows)
+
+    return IndexReport("current", num_rows)
+
+
+def ensure_fts_index(table: Any, force: bool = False) -> IndexReport:
+    """Creates or refreshes the BM25 full-text index on the text column.
+
+    Unlike the vector index it is useful at any table size, so it is always
+    built. New rows are folded in by `optimize`; until then they are still
+    found by a flat scan.
+
+    Args:
+        table: LanceDB table with a `text` column
+        force: Rebuild even if the existing index is current
+
+    Returns:
+        IndexReport describing what was done
+    """
+    from lancedb.index import FTS
+
+    num_rows = table.count_rows()
+    existing = find_fts_index(table)
+
+    if existing is None or force:
+        table.create_index(TEXT_COLUMN, config=FTS(), replace=True)
+        return IndexReport("created" if existing is None else "rebuilt", num_rows, kind="full-text")
+
+    stats = table.index_stats(existing.name)
+    if stats and stats.num_unindexed_rows:
+        table.optimize()
+        return IndexReport("updated", num_rows, kind="full-text")
+
+    return IndexReport("current", num_rows, kind="full-text")
+
+
+def _column_type(table: Any, path: str) -> Optional[Any]:
+    """Arrow type of a possibly nested column ("metadata.page_numbers"), or None."""
+    schema = table.schema
+    *parents, name = path.split(".")
+    for parent in parents:
+        if schema.get_field_index(parent) < 0:
+            return None
+        schema = schema.field(parent).type
+    index = schema.get_field_index(name)
+    return schema.field(index).type if index >= 0 else None
+
+
+def ensure_scalar_indexes(table: Any, force: bool = False) -> List[IndexReport]:
+    """Creates the scalar indexes in SCALAR_INDEXES for columns the table has.
+
+    They are kept up to date by `optimize` like the other indexes. Filters on
+    these columns are then answered from the index instead of a column scan.
+
+    Args:
+        table: LanceDB chunk table
+        force: Rebuild indexes that already exist
+
+    Returns:
+        One IndexReport per indexed column
+    """
+    from lancedb.index import BTree, Bitmap, LabelList
+
+    configs = {"BITMAP": Bitmap, "BTREE": BTree, "LABEL_LIST": LabelList}
+    num_rows = table.count_rows()
+    reports = []
+    for column, index_type in SCALAR_INDEXES.items():
+        column_type = _column_type(table, column)
+        if column_type is None:
+            continue
+        if index_type == "LABEL_LIST" and not pa.types.is_list(column_type):
+            continue  # Tables written before page numbers became lists
+        kind = f"{column} {index_type.lower()}"
+        existing = _find_index(table, column)
+        if existing is not None and not force:
+            reports.append(IndexReport("current", num_rows, kind=kind))
+            continue
+        table.create_index(column, config=configs[index_type](), replace=True)
+        reports.append(IndexReport("created" if existing is None else "rebuilt", num_rows, kind=kind))
+    return reports
@@ -0,0 +1,293 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from itertools import islice
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from utils.conversion_cache import ConversionCache
+
+SUPPORTED_EXTENSIONS = {".pdf", ".docx", ".xlsx", ".pptx", ".md", ".html", ".htm"}
+MANIFEST_EXTENSIONS = {".json", ".txt"}
+
+# One warm DocumentConverter (and its conversion cache) per worker process,
+# created by the pool initializer
+_converter = None
+_cache = None
+
+
+@dataclass
+class ConversionOutcome:
+    """Result of converting a single document in the ingestion pool."""
+
+    source: str
+    document: Optional[Any] = None
+    error: Optional[str] = None
+    seconds: float = 0.0
+    cached: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.document is not None
+
+
+def discover_documents(source: str) -> List[str]:
+    """Expands a directory, manifest or single file into a list of documents.
+
+    Args:
+        source: A directory to scan, a manifest file (.txt with one path per line
+            or .json with a list of paths / {"documents": [...]}), or a document
+
+    Returns:
+        Sorted list of document paths. Relative manifest entries are resolved
+        against the manifest's directory.
+
+    Raises:
+        ValueError: If the source does not exist or the manifest is malformed
+    """
+    path = Path(source)
+
+    if path.is_dir():
+        return sorted(
+            str(p)
+            for p in path.rglob("*")
+            if p.is_file() and p.suffix.lower() in SUPPORTED_EXTENSIONS
+        )
+
+    if not path.exists():
+        raise ValueError(f"Document source not found: {source}")
+
+    if path.suffix.lower() not in MANIFEST_EXTENSIONS:
+        return [str(path)]
+
+    try:
+        if path.suffix.lower() == ".json":
+            entries = json.loads(path.read_text(encoding="utf-8"))
+            if isinstance(entries, dict):
+                entries = entries.get("documents", [])
+        else:
+            entries = [
+                line.strip()
+                for line in path.read_text(encoding="utf-8").splitlines()
+                if line.strip() and not line.strip().startswith("#")
+            ]
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Failed to parse manifest {source}: {str(e)}")
+
+    if not isinstance(entries, list):
+        raise ValueError(f"Manifest {source} must contain a list of documents")
+
+    return [
+        str(Path(entry) if Path(entry).is_absolute() else path.parent / entry)
+        for entry in entries
+    ]
+
+
+def default_format_options() -> Dict[Any, Any]:
+    """Pipeline configuration the ingestion workers convert documents with.
+
+    Formats not listed use docling's defaults, which only change with the
+    docling version the conversion cache is already keyed by.
+    """
+    from docling.datamodel.base_models import InputFormat
+    from docling.datamodel.pipeline_options import PdfPipelineOptions
+    from docling.document_converter import PdfFormatOption
+
+    return {InputFormat.PDF: PdfFormatOption(pipeline_options=PdfPipelineOptions())}
+
+
+def build_converter(format_options: Optional[Dict[Any, Any]] = None) -> Any:
+    """DocumentConverter configured like the ingestion workers.
+
+    Every pipeline stage converts with it, so they all read and write the
+    same conversion cache entries.
+    """
+    from docling.document_converter import DocumentConverter
+
+    return DocumentConverter(format_options=format_options or default_format_options())
+
+
+def _init_worker(
+    threads_per_worker: int, use_cache: bool = True, format_options: Optional[Dict[Any, Any]] = None
+) -> None:
+    """Pool initializer: caps the worker's threads and builds its converter."""
+    # Keep the layout/table models from oversubscribing the CPU across workers.
+    # Only spawned workers get this; the caller's own process is left alone.
+    os.environ.setdefault("OMP_NUM_THREADS", str(threads_per_worker))
+    _load_converter(use_cache, format_options)
+
+
+def _load_converter(
+    use_cache: bool = True, format_options: Optional[Dict[Any, Any]] = None
+) -> None:
+    """Builds the process's DocumentConverter once so every task reuses it."""
+    global _converter, _cache
+
+    _converter = build_converter(format_options)
+    _cache = ConversionCache(converter=_converter) if use_cache else None
+
+
+def _convert_one(source: str) -> ConversionOutcome:
+    start = time.perf_counter()
+    try:
+        document = _converter.convert(source).document
+        if _cache is not None:
+            _cache.put(source, document)
+        return ConversionOutcome(
+            source=source,
+            document=document,
+            seconds=time.perf_counter() - start,
+        )
+    except Exception as e:
+        return ConversionOutcome(
+            source=source,
+            error=f"{type(e).__name__}: {e}",
+            seconds=time.perf_counter() - start,
+        )
+
+
+def default_worker_count(num_documents: int) -> int:
+    """Picks a pool size from INGEST_WORKERS or half the available cores."""
+    configured = os.getenv("INGEST_WORKERS")
+    if configured:
+        workers = int(configured)
+    else:
+        workers = max(1, (os.cpu_count() or 2) // 2)
+    return max(1, min(workers, num_documents))
+
+
+def _iter_cached(
+    sources: List[str], cache: ConversionCache, misses: List[str]
+) -> Iterator[ConversionOutcome]:
+    """Yields cache hits one at a time, collecting uncached sources into `misses`."""
+    for source in sources:
+        start = time.perf_counter()
+        document = cache.get(source)
+        if document is None:
+            misses.append(source)
+            continue
+        yield ConversionOutcome(
+            source=source,
+            document=document,
+            seconds=time.perf_counter() - start,
+            cached=True,
+        )
+
+
+def convert_documents(
+    sources: Iterable[str],
+    max_workers: Optional[int] = None,
+    use_cache: bool = True,
+    format_options: Optional[Dict[Any, Any]] = None,
+) -> Iterator[ConversionOutcome]:
+    """Converts documents across a process pool, yielding results as they finish.
+
+    Args:
+        sources: Paths (or URLs) of the documents to convert
+        max_workers: Pool size; defaults to `default_worker_count`. With a single
+            worker the conversion runs in-process without a pool.
+        use_cache: Serve unchanged documents from the ConversionCache and store
+            fresh conversions in it
+        format_options: Pipeline configuration for the workers; defaults to
+            `default_format_options()`. The cache is keyed by a converter built
+            from these, exactly as `build_converter` builds the stage scripts' one.
+
+    Yields:
+        ConversionOutcome for each document, in completion order. Cache hits are
+        yielded first. Failures are reported through `ConversionOutcome.error`
+        instead of being raised.
+    """
+    sources = list(sources)
+    if not sources:
+        return
+    format_options = format_options or default_format_options()
+    if use_cache:
+        misses = []
+        yield from _iter_cached(sources, ConversionCache(format_options=format_options), misses)
+        sources = misses
+    if not sources:
+        return
+
+    workers = max_workers or default_worker_count(len(sources))
+    threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+
+    if workers == 1:
+        _load_converter(use_cache, format_options)
+        for source in sources:
+            yield _convert_one(source)
+        return
+
+    # spawn keeps torch/OpenMP state from leaking into forked workers
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(threads_per_worker, use_cache, format_options),
+    ) as pool:
+        # Keep at most two documents per worker in flight so finished documents
+        # never pile up in memory faster than the consumer processes them
+        queued = iter(sources)
+        futures = {}
+        for source in islice(queued, workers * 2):
+            futures[pool.submit(_convert_one, source)] = source
+
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                source = futures.pop(future)
+                try:
+                    outcome = future.result()
+                except Exception as e:
+                    # A crashed worker surfaces here (e.g. BrokenProcessPool)
+                    outcome = ConversionOutcome(
+                        source=source, error=f"{type(e).__name__}: {e}"
+                    )
+                for next_source in islice(queued, 1):
+                    futures[pool.submit(_convert_one, next_source)] = next_source
+                yield outcome
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Convert a directory or manifest of documents in parallel."
+    )
+    parser.add_argument(
+        "sources", nargs="+", help="Documents, directories or manifest files"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Number of converter processes"
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Always re-run the conversion"
+    )
+    args = parser.parse_args(argv)
+
+    documents = [doc for source in args.sources for doc in discover_documents(source)]
+    print(f"Converting {len(documents)} documents...")
+
+    start = time.perf_counter()
+    failures = 0
+    for outcome in convert_documents(
+        documents, max_workers=args.workers, use_cache=not args.no_cache
+    ):
+        if outcome.ok:
+            origin = "cached" if outcome.cached else f"{outcome.seconds:.1f}s"
+            print(f"  ✅ {outcome.source} ({origin})")
+        else:
+            failures += 1
+            print(f"  ❌ {outcome.source}: {outcome.error}")
+
+    print(
+        f"Converted {len(documents) - failures}/{len(documents)} documents "
+        f"in {time.perf_counter() - start:.1f}s"
+    )
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
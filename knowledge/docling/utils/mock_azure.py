@@ -0,0 +1,561 @@
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import numpy as np
+
+from utils.vector_config import FULL_DIMENSIONS
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_TOKEN_RATE = 50.0  # Streamed tokens per second
+ANSWER_SENTENCES = 3  # Context sentences quoted in a mock answer
+
+# Azure opens every stream with a content-filter event that carries no choices
+FILTER_EVENT = {
+    "id": "",
+    "object": "",
+    "created": 0,
+    "model": "",
+    "choices": [],
+    "prompt_filter_results": [],
+}
+
+_DEPLOYMENT_PATH = re.compile(r"^/openai/deployments/([^/]+)/(embeddings|chat/completions)$")
+_WORD = re.compile(r"\w+")
+_SENTENCE = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+@dataclass
+class MockSettings:
+    """Behaviour of the mock server.
+
+    Latency, throttling and timeouts are injected with a seeded random
+    generator, so a run with the same settings and requests is repeatable.
+    """
+
+    dimensions: int = FULL_DIMENSIONS  # Embedding size when the request sets none
+    latency: float = 0.0  # Seconds before the response (or first streamed token)
+    token_rate: float = DEFAULT_TOKEN_RATE
+    error_rate: float = 0.0  # Share of requests answered with a 429
+    timeout_rate: float = 0.0  # Share of requests that hang for `hang_seconds`
+    hang_seconds: float = 30.0
+    retry_after: float = 1.0  # Seconds advertised on injected 429s
+    rpm: int = 0  # Per-deployment requests per minute; 0 is unlimited
+    tpm: int = 0  # Per-deployment tokens per minute; 0 is unlimited
+    max_input_tokens: int = 8191  # Longer embedding inputs are rejected with a 400
+    seed: int = 0
+
+
+def approx_tokens(text: str) -> int:
+    """Rough token count (4 characters per token); the mock does not need tiktoken."""
+    return max(1, len(text) // 4)
+
+
+@lru_cache(maxsize=65536)
+def _word_vector(word: str, dimensions: int) -> np.ndarray:
+    seed = int.from_bytes(hashlib.sha256(word.encode("utf-8")).digest()[:8], "little")
+    return np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+
+
+def mock_embedding(text: str, dimensions: Optional[int] = None) -> np.ndarray:
+    """Deterministic unit vector for a text.
+
+    The sum of one pseudo-random vector per word (feature hashing), so texts
+    that share words are close and retrieval over mock embeddings still
+    ranks lexically similar chunks first. Shorter embeddings are the full
+    vector truncated and re-normalized, like text-embedding-3's `dimensions`.
+    """
+    words = _WORD.findall(text.casefold()) or [""]
+    vector = np.sum([_word_vector(word, FULL_DIMENSIONS) for word in words], axis=0)
+    vector = vector[: dimensions or FULL_DIMENSIONS]
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def mock_answer(messages: List[Dict[str, Any]], max_tokens: Optional[int] = None) -> List[str]:
+    """Deterministic answer pieces: the context sentences closest to the question."""
+    question = next(
+        (m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), ""
+    )
+    context = " ".join(m.get("content") or "" for m in messages if m.get("role") == "system")
+    terms = set(_WORD.findall(question.casefold()))
+
+    sentences = [s.strip() for s in _SENTENCE.split(context) if s.strip()]
+    ranked = sorted(
+        sentences, key=lambda s: -len(terms & set(_WORD.findall(s.casefold())))
+    )[:ANSWER_SENTENCES]
+    text = " ".join(ranked) or f"Mock answer to: {question.strip()}"
+
+    pieces = re.findall(r"\S+\s*", text)
+    return pieces[:max_tokens] if max_tokens else pieces
+
+
+class _Quota:
+    """Sliding one-minute request and token windows of one deployment."""
+
+    def __init__(self):
+        self.events: Deque[Tuple[float, int]] = deque()
+
+    def admit(self, tokens: int, rpm: int, tpm: int) -> Tuple[bool, float, Dict[str, str]]:
+        now = time.monotonic()
+        while self.events and self.events[0][0] <= now - 60:
+            self.events.popleft()
+        used_tokens = sum(cost for _, cost in self.events)
+
+        allowed = (not rpm or len(self.events) < rpm) and (
+            not tpm or used_tokens + tokens <= tpm
+        )
+        if allowed:
+            self.events.append((now, tokens))
+            used_tokens += tokens
+        retry_after = (self.events[0][0] + 60 - now) if self.events and not allowed else 0.0
+
+        headers = {}
+        if rpm:
+            headers["x-ratelimit-limit-requests"] = str(rpm)
+            headers["x-ratelimit-remaining-requests"] = str(max(0, rpm - len(self.events)))
+        if tpm:
+            headers["x-ratelimit-limit-tokens"] = str(tpm)
+            headers["x-ratelimit-remaining-tokens"] = str(max(0, tpm - used_tokens))
+        return allowed, retry_after, headers
+
+
+class MockAzureOpenAI(ThreadingHTTPServer):
+    """Stand-in for the Azure OpenAI embeddings and chat completions endpoints."""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], settings: Optional[MockSettings] = None):
+        super().__init__(address, _Handler)
+        self.settings = settings or MockSettings()
+        self.random = random.Random(self.settings.seed)
+        self.lock = threading.Lock()
+        self.quotas: Dict[str, _Quota] = {}
+        self.requests = 0
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def draw(self) -> Tuple[bool, bool]:
+        """Whether the next request is throttled, and whether it hangs."""
+        with self.lock:
+            self.requests += 1
+            return (
+                self.random.random() < self.settings.error_rate,
+                self.random.random() < self.settings.timeout_rate,
+            )
+
+    def handle_error(self, request: Any, client_address: Any) -> None:
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return  # The client gave up, e.g. on an injected hang
+        super().handle_error(request, client_address)
+
+    def admit(self, deployment: str, tokens: int) -> Tuple[bool, float, Dict[str, str]]:
+        with self.lock:
+            quota = self.quotas.setdefault(deployment, _Quota())
+            return quota.admit(tokens, self.settings.rpm, self.settings.tpm)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, so client connection pools behave as with Azure
+    server: MockAzureOpenAI
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _send_json(
+        self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None
+    ) -> None:
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _error(
+        self, status: int, code: str, message: str, headers: Optional[Dict[str, str]] = None
+    ) -> None:
+        self._send_json(status, {"error": {"code": code, "message": message}}, headers)
+
+    def do_POST(self) -> None:
+        match = _DEPLOYMENT_PATH.match(urlparse(self.path).path)
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._error(400, "invalid_json", "Request body is not valid JSON")
+            return
+        if match is None:
+            self._error(404, "DeploymentNotFound", f"No mock route for {self.path}")
+            return
+
+        deployment, operation = match.groups()
+        settings = self.server.settings
+        throttle, hang = self.server.draw()
+        if hang:
+            time.sleep(settings.hang_seconds)
+        if throttle:
+            self._throttled(settings.retry_after, {})
+            return
+
+        if operation == "embeddings":
+            self._embeddings(deployment, body)
+        else:
+            self._chat(deployment, body)
+
+    def _throttled(self, retry_after: float, headers: Dict[str, str]) -> None:
+        headers = {
+            **headers,
+            "retry-after": str(max(1, round(retry_after))),
+            "retry-after-ms": str(int(retry_after * 1000)),
+        }
+        message = f"Rate limit exceeded. Retry after {retry_after:.1f} seconds."
+        self._error(429, "429", message, headers)
+
+    def _embeddings(self, deployment: str, body: Dict[str, Any]) -> None:
+        inputs = body.get("input")
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        if not inputs:
+            self._error(400, "invalid_request", "'input' must not be empty")
+            return
+        texts = [text if isinstance(text, str) else " ".join(map(str, text)) for text in inputs]
+        limit = self.server.settings.max_input_tokens
+        too_long = [index for index, text in enumerate(texts) if approx_tokens(text) > limit]
+        if too_long:
+            # Like Azure, one oversized input fails the whole request
+            message = (
+                f"This model's maximum context length is {limit} tokens, "
+                f"however input {too_long[0]} is longer"
+            )
+            self._error(400, "context_length_exceeded", message)
+            return
+        tokens = sum(approx_tokens(text) for text in texts)
+
+        allowed, retry_after, headers = self.server.admit(deployment, tokens)
+        if not allowed:
+            self._throttled(retry_after, headers)
+            return
+        time.sleep(self.server.settings.latency)
+
+        dimensions = body.get("dimensions") or self.server.settings.dimensions
+        data = []
+        for index, text in enumerate(texts):
+            vector = mock_embedding(text, dimensions)
+            if body.get("encoding_format") == "base64":
+                # The openai package asks for base64 float32 by default
+                embedding: Any = base64.b64encode(vector.astype("<f4").tobytes()).decode("ascii")
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+
+        self._send_json(
+            200,
+            {
+                "object": "list",
+                "data": data,
+                "model": deployment,
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            },
+            headers,
+        )
+
+    def _chat(self, deployment: str, body: Dict[str, Any]) -> None:
+        messages = body.get("messages") or []
+        max_tokens = body.get("max_tokens") or body.get("max_completion_tokens")
+        prompt_tokens = sum(approx_tokens(m.get("content") or "") for m in messages)
+
+        # Like Azure, count the completion limit against the token quota up front
+        allowed, retry_after, headers = self.server.admit(
+            deployment, prompt_tokens + (max_tokens or 0)
+        )
+        if not allowed:
+            self._throttled(retry_after, headers)
+            return
+
+        pieces = mock_answer(messages, max_tokens)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(pieces),
+            "total_tokens": prompt_tokens + len(pieces),
+        }
+        completion_id = f"chatcmpl-mock-{uuid.uuid4().hex[:12]}"
+        time.sleep(self.server.settings.latency)
+
+        truncated = bool(max_tokens) and len(pieces) >= max_tokens
+        if not body.get("stream"):
+            time.sleep(len(pieces) / self.server.settings.token_rate)
+            self._send_json(
+                200,
+                {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": deployment,
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": "".join(pieces)},
+                            "finish_reason": "length" if truncated else "stop",
+                        }
+                    ],
+                    "usage": usage,
+                },
+                headers,
+            )
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> Dict[str, Any]:
+            return {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": deployment,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+
+        self._event(FILTER_EVENT)
+        self._event(chunk({"role": "assistant", "content": ""}))
+        for piece in pieces:
+            time.sleep(1 / self.server.settings.token_rate)
+            self._event(chunk({"content": piece}))
+        self._event(chunk({}, "length" if truncated else "stop"))
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _event(self, data: Dict[str, Any]) -> None:
+        self._write_chunk(f"data: {json.dumps(data)}\n\n".encode("utf-8"))
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+def start_mock_server(
+    settings: Optional[MockSettings] = None, host: str = DEFAULT_HOST, port: int = 0
+) -> MockAzureOpenAI:
+    """Starts the mock on a daemon thread (port 0 picks a free port).
+
+    Point the clients at it with AZURE_OPENAI_ENDPOINT=server.endpoint; call
+    `server.shutdown()` when done.
+    """
+    server = MockAzureOpenAI((host, port), settings)
+    threading.Thread(target=server.serve_forever, name="mock-azure-openai", daemon=True).start()
+    return server
+
+
+# --------------------------------------------------------------
+# Load generation
+# --------------------------------------------------------------
+
+LOAD_QUESTIONS = [
+    "What are the key market trends for 2025?",
+    "How did residential property prices change?",
+    "What are the investment opportunities in commercial real estate?",
+    "Summarize the industrial sector performance",
+    "What are the average land prices by governorate?",
+]
+
+
+@dataclass
+class LoadResult:
+    retrieval: float = 0.0  # Seconds until the context was ready
+    first_token: Optional[float] = None  # Seconds until the first answer token
+    total: float = 0.0
+    error: Optional[str] = None
+
+
+@dataclass
+class LoadReport:
+    results: List[LoadResult] = field(default_factory=list)
+    seconds: float = 0.0
+
+    def format(self) -> str:
+        ok = [r for r in self.results if r.error is None]
+        errors: Dict[str, int] = {}
+        for result in self.results:
+            if result.error is not None:
+                errors[result.error] = errors.get(result.error, 0) + 1
+
+        lines = [
+            f"{len(self.results)} requests in {self.seconds:.1f}s "
+            f"({len(self.results) / self.seconds:.1f} req/s), {len(ok)} succeeded"
+        ]
+        for label, values in (
+            ("retrieval", [r.retrieval for r in ok]),
+            ("first token", [r.first_token for r in ok if r.first_token is not None]),
+            ("total", [r.total for r in ok]),
+        ):
+            if values:
+                p50, p95 = np.percentile(values, [50, 95])
+                lines.append(f"{label:>12}: p50 {p50 * 1000:7.0f} ms · p95 {p95 * 1000:7.0f} ms")
+        for error, count in sorted(errors.items(), key=lambda item: -item[1]):
+            lines.append(f"{'error':>12}: {count} × {error}")
+        return "\n".join(lines)
+
+
+async def run_load(
+    table: Any,
+    requests: int,
+    concurrency: int,
+    max_tokens: int = 300,
+    distinct: bool = False,
+) -> LoadReport:
+    """Drives the chat pipeline with concurrent questions, as the apps would.
+
+    Args:
+        table: LanceDB table to search
+        requests: Questions to ask in total
+        concurrency: Questions in flight at once
+        max_tokens: Completion limit per answer
+        distinct: Make every question unique, defeating the caches and
+            request coalescing
+
+    Returns:
+        LoadReport with per-request timings
+    """
+    from utils.async_pipeline import ChatPipeline
+    from utils.chat_prompt import chat_messages
+    from utils.clients import client_for
+    from utils.context_packing import pack_context
+    from utils.embeddings import CachedEmbedder
+
+    pipeline = ChatPipeline(table, CachedEmbedder(client_for("query_embedding")))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def ask(index: int) -> LoadResult:
+        question = LOAD_QUESTIONS[index % len(LOAD_QUESTIONS)]
+        if distinct:
+            question = f"{question} (request {index})"
+        result = LoadResult()
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                turn = await pipeline.retrieve(question)
+                result.retrieval = time.perf_counter() - started
+                messages = chat_messages(
+                    [{"role": "user", "content": question}], pack_context(turn.hits).text
+                )
+                async for _ in pipeline.stream_chat(messages, max_tokens=max_tokens):
+                    if result.first_token is None:
+                        result.first_token = time.perf_counter() - started
+            except Exception as e:
+                result.error = type(e).__name__
+            result.total = time.perf_counter() - started
+        return result
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(ask(i) for i in range(requests)))
+    return LoadReport(list(results), time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Local Azure OpenAI stand-in for offline testing and load generation."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="Serve mock embeddings and chat completions")
+    serve.add_argument("--host", default=DEFAULT_HOST)
+    serve.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve.add_argument(
+        "--dimensions", type=int, default=FULL_DIMENSIONS, help="Default embedding size"
+    )
+    serve.add_argument("--latency", type=float, default=0.0, help="Seconds before each response")
+    serve.add_argument(
+        "--token-rate", type=float, default=DEFAULT_TOKEN_RATE, help="Streamed tokens per second"
+    )
+    serve.add_argument(
+        "--error-rate", type=float, default=0.0, help="Share of requests answered with 429"
+    )
+    serve.add_argument(
+        "--timeout-rate", type=float, default=0.0, help="Share of requests that hang"
+    )
+    serve.add_argument("--hang-seconds", type=float, default=30.0)
+    serve.add_argument(
+        "--rpm", type=int, default=0, help="Requests per minute per deployment (0: unlimited)"
+    )
+    serve.add_argument(
+        "--tpm", type=int, default=0, help="Tokens per minute per deployment (0: unlimited)"
+    )
+    serve.add_argument(
+        "--max-input-tokens", type=int, default=8191, help="Longest embedding input accepted"
+    )
+    serve.add_argument("--seed", type=int, default=0)
+
+    load = commands.add_parser("load", help="Drive the chat pipeline against AZURE_OPENAI_ENDPOINT")
+    load.add_argument("--db", default="data/lancedb", help="LanceDB URI")
+    load.add_argument("--table", default="docling")
+    load.add_argument("--requests", type=int, default=100)
+    load.add_argument("--concurrency", type=int, default=10)
+    load.add_argument("--max-tokens", type=int, default=300)
+    load.add_argument("--distinct", action="store_true", help="Make every question unique")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        settings = MockSettings(
+            dimensions=args.dimensions,
+            latency=args.latency,
+            token_rate=args.token_rate,
+            error_rate=args.error_rate,
+            timeout_rate=args.timeout_rate,
+            hang_seconds=args.hang_seconds,
+            rpm=args.rpm,
+            tpm=args.tpm,
+            max_input_tokens=args.max_input_tokens,
+            seed=args.seed,
+        )
+        server = MockAzureOpenAI((args.host, args.port), settings)
+        print(f"🧪 Mock Azure OpenAI on {server.endpoint}")
+        print(f"   AZURE_OPENAI_ENDPOINT={server.endpoint} AZURE_OPENAI_API_KEY=mock")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
+        return
+
+    import lancedb
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    table = lancedb.connect(args.db).open_table(args.table)
+    print(
+        f"🚀 {args.requests} questions, {args.concurrency} at a time, "
+        f"against {os.getenv('AZURE_OPENAI_ENDPOINT')}"
+    )
+    report = asyncio.run(
+        run_load(table, args.requests, args.concurrency, args.max_tokens, args.distinct)
+    )
+    print(report.format())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import queue
+import threading
+from dataclasses import dataclass
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, TypeVar
+
+import pyarrow as pa
+
+T = TypeVar("T")
+
+DEFAULT_BATCH_ROWS = 256
+DEFAULT_MAX_PENDING = 2
+
+_DONE = object()
+
+
+def batched(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    """Groups an iterable into lists of at most `size` items without materializing it."""
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def rows_to_arrow(rows: List[Dict[str, Any]], schema: pa.Schema) -> pa.Table:
+    """Converts one batch of row dicts into an Arrow table with the table's schema."""
+    return pa.Table.from_pylist(rows, schema=schema)
+
+
+@dataclass
+class PipelineStats:
+    batches: int = 0
+    rows_written: int = 0
+
+
+def run_streaming_pipeline(
+    rows: Iterable[Dict[str, Any]],
+    embed_batch: Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]],
+    write_batch: Callable[[List[Dict[str, Any]]], None],
+    batch_rows: int = DEFAULT_BATCH_ROWS,
+    max_pending: int = DEFAULT_MAX_PENDING,
+) -> PipelineStats:
+    """Streams rows through embedding and into storage in bounded batches.
+
+    A producer thread pulls rows lazily, embeds them `batch_rows` at a time and
+    hands the results to the calling thread through a queue holding at most
+    `max_pending` batches. When writing falls behind, the producer blocks, and
+    so does the chunker feeding it. Peak memory is therefore bounded by
+    (max_pending + 2) batches regardless of corpus size, and every batch is
+    queryable as soon as it is written.
+
+    Args:
+        rows: Lazily produced rows (e.g. straight from HybridChunker.chunk)
+        embed_batch: Adds vectors to a batch and returns the rows to write;
+            rows that could not be embedded are simply left out
+        write_batch: Persists one embedded batch
+        batch_rows: Rows per embedding/write batch
+        max_pending: Embedded batches allowed to wait for the writer
+
+    Returns:
+        PipelineStats with the number of batches and rows written
+
+    Raises:
+        Exception: Whatever the producer or writer raised, after both stopped
+    """
+    pending: "queue.Queue[Any]" = queue.Queue(maxsize=max_pending)
+    stop = threading.Event()
+    errors: List[BaseException] = []
+
+    def put(item: Any) -> None:
+        while not stop.is_set():
+            try:
+                pending.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def produce() -> None:
+        try:
+            for batch in batched(rows, batch_rows):
+                if stop.is_set():
+                    return
+                put(embed_batch(batch))
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            put(_DONE)
+
+    stats = PipelineStats()
+    producer = threading.Thread(target=produce, name="embedding-producer", daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = pending.get()
+            if item is _DONE:
+                break
+            if item:
+                write_batch(item)
+                stats.batches += 1
+                stats.rows_written += len(item)
+    finally:
+        stop.set()
+        producer.join()
+
+    if errors:
+        raise errors[0]
+    return stats
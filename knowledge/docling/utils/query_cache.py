@@ -0,0 +1,167 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL_SECONDS = 3600
+
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a user query."""
+    return " ".join(query.casefold().split())
+
+
+@dataclass
+class QueryCacheStats:
+    hits: int = 0
+    misses: int = 0
+    expired: int = 0
+    evicted: int = 0
+    entries: int = 0
+    miss_seconds: float = 0.0  # Time spent embedding on misses
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    @property
+    def average_miss_seconds(self) -> float:
+        return self.miss_seconds / self.misses if self.misses else 0.0
+
+    @property
+    def saved_seconds(self) -> float:
+        """Estimated embedding latency avoided by hits."""
+        return self.hits * self.average_miss_seconds
+
+
+class QueryEmbeddingCache:
+    """Thread-safe TTL + LRU cache of query embeddings.
+
+    It sits in front of the embedder on the chat hot path, so Streamlit reruns
+    and users repeating the sample questions are answered from memory instead
+    of with another round trip to Azure OpenAI.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        """Initialize the cache.
+
+        Args:
+            max_entries: LRU bound; defaults to QUERY_CACHE_MAX_ENTRIES or 1024
+            ttl_seconds: Entry lifetime; defaults to QUERY_CACHE_TTL_SECONDS or 3600
+        """
+        self.max_entries = max_entries or int(
+            os.getenv("QUERY_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)
+        )
+        self.ttl_seconds = ttl_seconds or float(
+            os.getenv("QUERY_CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS)
+        )
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, List[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = QueryCacheStats()
+
+    def get(self, query: str, namespace: str = "") -> Optional[List[float]]:
+        """Returns the cached vector for a query, or None if absent or expired."""
+        key = (namespace, normalize_query(query))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, vector = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self._stats.expired += 1
+                return None
+            self._entries.move_to_end(key)
+            return vector
+
+    def put(self, query: str, vector: List[float], namespace: str = "") -> None:
+        key = (namespace, normalize_query(query))
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats.evicted += 1
+
+    def get_or_embed(
+        self,
+        query: str,
+        embed: Callable[[str], Optional[List[float]]],
+        namespace: str = "",
+    ) -> Optional[List[float]]:
+        """Returns the query's embedding, calling `embed` only on a miss.
+
+        Args:
+            query: User query
+            embed: Embeds a single query string
+            namespace: Separates vectors from different deployments or sizes
+
+        Returns:
+            The query embedding; a None result from `embed` is returned but
+            not cached
+        """
+        vector = self.get(query, namespace)
+        if vector is not None:
+            with self._lock:
+                self._stats.hits += 1
+            return vector
+
+        started = time.perf_counter()
+        vector = embed(query)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._stats.misses += 1
+            self._stats.miss_seconds += elapsed
+        if vector is not None:
+            self.put(query, vector, namespace)
+        return vector
+
+    async def get_or_embed_async(
+        self,
+        query: str,
+        embed: Callable[[str], Awaitable[Optional[List[float]]]],
+        namespace: str = "",
+    ) -> Optional[List[float]]:
+        """Async counterpart of `get_or_embed`, for an awaitable `embed`."""
+        vector = self.get(query, namespace)
+        if vector is not None:
+            with self._lock:
+                self._stats.hits += 1
+            return vector
+
+        started = time.perf_counter()
+        vector = await embed(query)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._stats.misses += 1
+            self._stats.miss_seconds += elapsed
+        if vector is not None:
+            self.put(query, vector, namespace)
+        return vector
+
+    def stats(self) -> QueryCacheStats:
+        """Snapshot of the hit/miss counters."""
+        with self._lock:
+            return QueryCacheStats(
+                hits=self._stats.hits,
+                misses=self._stats.misses,
+                expired=self._stats.expired,
+                evicted=self._stats.evicted,
+                entries=len(self._entries),
+                miss_seconds=self._stats.miss_seconds,
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+@lru_cache(maxsize=None)
+def get_query_cache() -> QueryEmbeddingCache:
+    """Process-wide query cache, shared by every Streamlit session and rerun."""
+    return QueryEmbeddingCache()
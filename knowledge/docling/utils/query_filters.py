@@ -0,0 +1,144 @@
+import re
+from dataclasses import dataclass, field
+from typing import Any, Iterable, List, Optional
+
+from utils.report_metadata import find_report_periods, format_period
+
+# Market segments used throughout the KFH reports. Chunks are tagged with
+# them at ingestion and questions are scoped by them at query time.
+SECTOR_PATTERNS = {
+    "private_housing": r"\bprivate\s+(?:housing|residential|homes?|residences?)\b",
+    "investment_housing": r"\binvestment\s+(?:housing|residential|propert(?:y|ies)|buildings?)\b|\bapartments?\b",
+    "commercial": r"\bcommercial\b|\boffices?\b|\bretail\b",
+    "industrial": r"\bindustrial\b|\bwarehouses?\b|\bstorage\b",
+    "coastal": r"\bcoast(?:al|line)?\b|\bchalets?\b",
+}
+_SECTOR_REGEXES = {
+    sector: re.compile(pattern, re.IGNORECASE) for sector, pattern in SECTOR_PATTERNS.items()
+}
+# "Residential" or "housing" without a qualifier covers both housing sectors
+RESIDENTIAL_SECTORS = ["private_housing", "investment_housing"]
+_RESIDENTIAL = re.compile(r"\bresidential\b|\bhousing\b", re.IGNORECASE)
+
+# Questions that set sectors against each other need chunks from all of them
+_COMPARISON = re.compile(
+    r"\b(?:vs|versus|compar(?:e|ed|es|ing|ison)|contrast)\b|\bdifference\s+between\b",
+    re.IGNORECASE,
+)
+
+_YEAR = re.compile(r"(?<![\d\-])(20\d{2})(?![\d])")
+
+
+def detect_sectors(text: str) -> List[str]:
+    """Sectors mentioned in a text, in SECTOR_PATTERNS order."""
+    sectors = [sector for sector, regex in _SECTOR_REGEXES.items() if regex.search(text)]
+    if not set(sectors) & set(RESIDENTIAL_SECTORS) and _RESIDENTIAL.search(text):
+        wanted = {*sectors, *RESIDENTIAL_SECTORS}
+        sectors = [sector for sector in SECTOR_PATTERNS if sector in wanted]
+    return sectors
+
+
+def scope_sectors(query: str) -> List[str]:
+    """Sectors to scope a question to.
+
+    Empty when the question compares sectors ("residential vs commercial") or
+    names more than one, since a prefilter on one side would hide the other.
+    The two housing sectors count as one, so "residential" still scopes.
+    """
+    if _COMPARISON.search(query):
+        return []
+    sectors = detect_sectors(query)
+    others = [sector for sector in sectors if sector not in RESIDENTIAL_SECTORS]
+    if len(others) + (len(others) < len(sectors)) > 1:
+        return []
+    return sectors
+
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+@dataclass
+class QueryFilters:
+    periods: List[str] = field(default_factory=list)  # e.g. 2025-Q1
+    years: List[int] = field(default_factory=list)  # Years mentioned without a quarter
+    sectors: List[str] = field(default_factory=list)
+    doc_ids: List[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.periods or self.years or self.sectors or self.doc_ids)
+
+    def to_where(self) -> Optional[str]:
+        """SQL prefilter for the chunk table, or None when unscoped."""
+        clauses = []
+        if self.doc_ids:
+            clauses.append(f"doc_id IN ({', '.join(map(_quote, self.doc_ids))})")
+
+        period_clauses = [f"report_period = {_quote(period)}" for period in self.periods]
+        period_clauses += [f"report_period LIKE '{year}-%'" for year in self.years]
+        if period_clauses:
+            clauses.append("(" + " OR ".join(period_clauses) + ")")
+
+        if self.sectors:
+            clauses.append(f"array_has_any(sectors, [{', '.join(map(_quote, self.sectors))}])")
+        return " AND ".join(clauses) if clauses else None
+
+    def describe(self) -> str:
+        """Short label for the UI and cache keys, e.g. "2025-Q1 · commercial"."""
+        parts = [*self.doc_ids, *self.periods, *map(str, self.years)]
+        parts += [sector.replace("_", " ") for sector in self.sectors]
+        return " · ".join(parts)
+
+
+def parse_query_filters(query: str, known_doc_ids: Iterable[str] = ()) -> QueryFilters:
+    """Extracts period, sector and document constraints from a question.
+
+    Args:
+        query: User question, e.g. "commercial rents in Q1 2025"
+        known_doc_ids: Document ids in the table; a question naming one
+            (underscores may be written as spaces) is scoped to it
+
+    Returns:
+        QueryFilters; empty when the question names no constraint
+    """
+    quarters = find_report_periods(query)
+    periods = [format_period(year, quarter) for year, quarter in quarters]
+    quarter_years = {year for year, _ in quarters}
+
+    years = [
+        int(year)
+        for year in dict.fromkeys(_YEAR.findall(query))
+        if int(year) not in quarter_years
+    ]
+
+    normalized = query.casefold().replace("_", " ")
+    doc_ids = [
+        doc_id
+        for doc_id in known_doc_ids
+        if doc_id and doc_id.casefold().replace("_", " ") in normalized
+    ]
+
+    return QueryFilters(
+        periods=list(dict.fromkeys(periods)),
+        years=years,
+        sectors=scope_sectors(query),
+        doc_ids=doc_ids,
+    )
+
+
+def combine_where(*clauses: Optional[str]) -> Optional[str]:
+    """ANDs together the non-empty SQL filters."""
+    present = [clause for clause in clauses if clause]
+    if not present:
+        return None
+    if len(present) == 1:
+        return present[0]
+    return " AND ".join(f"({clause})" for clause in present)
+
+
+def document_ids(table: Any) -> List[str]:
+    """Distinct doc_id values in the chunk table (empty for older schemas)."""
+    if "doc_id" not in table.schema.names:
+        return []
+    column = table.search().select(["doc_id"]).limit(table.count_rows()).to_arrow().column("doc_id")
+    return sorted(set(column.to_pylist()) - {None})
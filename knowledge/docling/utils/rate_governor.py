@@ -0,0 +1,490 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_STATE_PATH = Path(__file__).resolve().parent.parent / "data" / "rate_governor.sqlite3"
+
+# Admission priorities; lower is served first
+INTERACTIVE = 0  # A user is waiting on the answer
+BACKGROUND = 1  # Conversation summaries and other work off the request path
+BATCH = 2  # Ingestion
+
+DEFAULT_TOKENS_PER_MINUTE = 120_000
+# Azure OpenAI grants 6 requests per minute for every 1,000 tokens per minute
+REQUESTS_PER_THOUSAND_TOKENS = 6
+# Azure enforces quotas over short windows, so at most this many seconds'
+# worth of quota is handed out in one burst
+DEFAULT_BURST_SECONDS = 10.0
+# Share of each burst that non-interactive work must leave for live users
+DEFAULT_INTERACTIVE_RESERVE = 0.2
+# max_request_tokens when the governor is disabled
+MAX_UNGOVERNED_TOKENS = 2**62
+# A waiter whose process stopped refreshing it is dropped from the queue
+STALE_WAITER_SECONDS = 30.0
+MAX_POLL_SECONDS = 0.5
+# Admission estimates avoid a tokenizer (tiktoken may need a download); the
+# settled usage corrects them
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def header_float(headers: Any, name: str) -> Optional[float]:
+    try:
+        value = headers.get(name)
+        return float(value) if value is not None else None
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def retry_after_seconds(headers: Any, default: float = 1.0) -> float:
+    """Reads retry-after-ms / retry-after from a response's headers."""
+    retry_ms = header_float(headers, "retry-after-ms")
+    if retry_ms is not None:
+        return retry_ms / 1000
+    retry_s = header_float(headers, "retry-after")
+    return retry_s if retry_s is not None else default
+
+
+class RateGovernorTimeout(Exception):
+    """Raised when a request is not admitted within its timeout."""
+
+
+@dataclass
+class Ticket:
+    """Admission of one request; settle it once the response arrives."""
+
+    deployment: str
+    tokens: int  # Estimated cost charged at admission
+    priority: int
+    waited: float = 0.0  # Seconds spent queued
+
+
+def configured_limits(deployment: str) -> Tuple[float, float]:
+    """Configured (requests, tokens) per minute for a deployment.
+
+    RATE_LIMITS lists quotas as `deployment=tpm[:rpm]`, comma separated, e.g.
+    `gpt-4o=150000,text-embedding-3-large=350000:2100`. Deployments not listed
+    get RATE_LIMIT_TPM (120,000). A missing RPM follows Azure's ratio of 6 per
+    1,000 TPM.
+    """
+    tokens: Optional[float] = None
+    requests: Optional[float] = None
+    for entry in os.getenv("RATE_LIMITS", "").split(","):
+        name, _, quota = entry.partition("=")
+        if name.strip() == deployment and quota.strip():
+            tpm, _, rpm = quota.partition(":")
+            tokens = float(tpm)
+            requests = float(rpm) if rpm.strip() else None
+            break
+    if tokens is None:
+        tokens = float(os.getenv("RATE_LIMIT_TPM", DEFAULT_TOKENS_PER_MINUTE))
+    if requests is None:
+        requests = tokens * REQUESTS_PER_THOUSAND_TOKENS / 1000
+    return requests, tokens
+
+
+def estimate_text_tokens(text: str) -> int:
+    """Cheap token estimate for admission; exact counts come back in the usage."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def estimate_chat_tokens(messages: Iterable[Dict[str, Any]], max_tokens: Optional[int]) -> int:
+    """Quota a chat completion can consume: its prompt plus the completion limit."""
+    prompt = sum(
+        estimate_text_tokens(str(message.get("content") or "")) + MESSAGE_OVERHEAD_TOKENS
+        for message in messages
+    )
+    return prompt + (max_tokens or 0)
+
+
+def estimate_embedding_tokens(texts: Iterable[str]) -> int:
+    return sum(estimate_text_tokens(text) for text in texts)
+
+
+class RateGovernor:
+    """Admission control for Azure OpenAI deployments, shared across processes.
+
+    Each deployment has two token buckets, requests and tokens per minute,
+    kept in a SQLite file so the chat apps, the API workers and ingestion
+    runs on one host draw from the same quota. A request is admitted once
+    both buckets cover its estimated cost and no request of higher priority
+    (then earlier arrival) is queued for the deployment. Non-interactive work
+    never takes the token bucket below a reserve, so an ingestion run cannot
+    starve live users; a non-interactive request too large to fit above the
+    reserve pays for itself in installments of what is above it, and is
+    admitted once paid in full.
+
+    Responses calibrate the buckets: the estimate is corrected with the
+    actual usage, the x-ratelimit-remaining-* headers lower the buckets when
+    other clients have spent the quota, x-ratelimit-limit-* headers replace
+    the configured limits, and a 429 drains the buckets and pauses the
+    deployment for the retry-after period.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        burst_seconds: Optional[float] = None,
+        interactive_reserve: Optional[float] = None,
+        enabled: Optional[bool] = None,
+    ):
+        """Initialize the governor.
+
+        Args:
+            path: SQLite file; defaults to RATE_GOVERNOR_PATH or data/rate_governor.sqlite3
+            burst_seconds: Seconds of quota a full bucket holds; defaults to
+                RATE_BURST_SECONDS or 10
+            interactive_reserve: Share of each bucket kept for interactive
+                requests; defaults to RATE_INTERACTIVE_RESERVE or 0.2
+            enabled: Defaults to RATE_GOVERNOR != "off"; when disabled every
+                request is admitted immediately
+        """
+        self.path = str(path or os.getenv("RATE_GOVERNOR_PATH") or DEFAULT_STATE_PATH)
+        self.burst_seconds = burst_seconds or float(
+            os.getenv("RATE_BURST_SECONDS", DEFAULT_BURST_SECONDS)
+        )
+        self.interactive_reserve = (
+            interactive_reserve
+            if interactive_reserve is not None
+            else float(os.getenv("RATE_INTERACTIVE_RESERVE", DEFAULT_INTERACTIVE_RESERVE))
+        )
+        self.enabled = (
+            enabled if enabled is not None else os.getenv("RATE_GOVERNOR", "on").lower() != "off"
+        )
+        self._local = threading.local()
+
+        if self.enabled:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            with self._connection() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS buckets ("
+                    "deployment TEXT PRIMARY KEY, "
+                    "request_limit REAL, token_limit REAL, "  # Per minute; NULL means configured
+                    "requests REAL NOT NULL, tokens REAL NOT NULL, "
+                    "updated REAL NOT NULL, paused_until REAL NOT NULL DEFAULT 0)"
+                )
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS waiters ("
+                    "id TEXT PRIMARY KEY, deployment TEXT NOT NULL, priority INTEGER NOT NULL, "
+                    "enqueued REAL NOT NULL, heartbeat REAL NOT NULL, "
+                    "paid REAL NOT NULL DEFAULT 0)"  # Tokens taken in installments so far
+                )
+                columns = {row[1] for row in conn.execute("PRAGMA table_info(waiters)")}
+                if "paid" not in columns:
+                    # State files from before installments
+                    conn.execute("ALTER TABLE waiters ADD COLUMN paid REAL NOT NULL DEFAULT 0")
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _bucket(self, conn: sqlite3.Connection, deployment: str, now: float) -> List[float]:
+        """Refilled [request_limit, token_limit, requests, tokens, paused_until] of a deployment."""
+        request_limit, token_limit = configured_limits(deployment)
+        row = conn.execute(
+            "SELECT request_limit, token_limit, requests, tokens, updated, paused_until "
+            "FROM buckets WHERE deployment = ?",
+            (deployment,),
+        ).fetchone()
+        if row is None:
+            window = self.burst_seconds / 60
+            conn.execute(
+                "INSERT INTO buckets (deployment, requests, tokens, updated) VALUES (?, ?, ?, ?)",
+                (deployment, request_limit * window, token_limit * window, now),
+            )
+            return [request_limit, token_limit, request_limit * window, token_limit * window, 0.0]
+
+        request_limit = row[0] or request_limit
+        token_limit = row[1] or token_limit
+        requests, tokens, updated, paused_until = row[2:]
+        elapsed = max(0.0, now - updated)
+        requests = min(self._capacity(request_limit), requests + elapsed * request_limit / 60)
+        tokens = min(self._capacity(token_limit), tokens + elapsed * token_limit / 60)
+        return [request_limit, token_limit, requests, tokens, paused_until]
+
+    def _capacity(self, limit: float) -> float:
+        return limit * self.burst_seconds / 60
+
+    def _reserve(self, priority: int) -> float:
+        return self.interactive_reserve if priority > INTERACTIVE else 0.0
+
+    def max_request_tokens(self, deployment: str, priority: int = INTERACTIVE) -> int:
+        """Largest request admitted in one step at a priority.
+
+        For non-interactive work that is the token bucket less the interactive
+        reserve; batch callers should pack requests under it, since larger
+        ones wait for several refills (see the class docstring).
+        """
+        if not self.enabled:
+            return MAX_UNGOVERNED_TOKENS
+        _, token_limit = configured_limits(deployment or "")
+        row = self._connection().execute(
+            "SELECT token_limit FROM buckets WHERE deployment = ?", (deployment or "",)
+        ).fetchone()
+        if row and row[0]:
+            token_limit = row[0]
+        return max(1, int(self._capacity(token_limit) * (1 - self._reserve(priority))))
+
+    def _save(
+        self, conn: sqlite3.Connection, deployment: str, requests: float, tokens: float, now: float
+    ) -> None:
+        conn.execute(
+            "UPDATE buckets SET requests = ?, tokens = ?, updated = ? WHERE deployment = ?",
+            (requests, tokens, now, deployment),
+        )
+
+    def _attempt(
+        self, waiter: str, enqueued: float, deployment: str, tokens: int, priority: int
+    ) -> float:
+        """Admits the waiter if it is first in line and the buckets allow.
+
+        Returns:
+            0 when admitted, otherwise the seconds to wait before trying again
+        """
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM waiters WHERE heartbeat < ?", (now - STALE_WAITER_SECONDS,))
+            conn.execute(
+                "INSERT INTO waiters (id, deployment, priority, enqueued, heartbeat) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET heartbeat = excluded.heartbeat",
+                (waiter, deployment, priority, enqueued, now),
+            )
+            head, paid = conn.execute(
+                "SELECT id, paid FROM waiters WHERE deployment = ? "
+                "ORDER BY priority, enqueued, id LIMIT 1",
+                (deployment,),
+            ).fetchone()
+            request_limit, token_limit, requests, available, paused_until = self._bucket(
+                conn, deployment, now
+            )
+
+            if head != waiter:
+                delay = MAX_POLL_SECONDS
+            elif now < paused_until:
+                delay = paused_until - now
+            else:
+                reserve = self._reserve(priority)
+                request_capacity = self._capacity(request_limit)
+                token_capacity = self._capacity(token_limit)
+                reserve_tokens = reserve * token_capacity
+                owed = tokens - paid
+                need_requests = min(1 + reserve * request_capacity, request_capacity)
+                if priority > INTERACTIVE:
+                    need_tokens = owed + reserve_tokens
+                else:
+                    # An interactive request larger than a whole bucket goes
+                    # once the bucket is full
+                    need_tokens = min(owed, token_capacity)
+                if requests >= need_requests and available >= need_tokens:
+                    requests -= 1
+                    available -= owed
+                    conn.execute("DELETE FROM waiters WHERE id = ?", (waiter,))
+                    delay = 0.0
+                else:
+                    if need_tokens > token_capacity and available > reserve_tokens:
+                        # Too large to ever fit above the reserve: take what is
+                        # above it now and the rest from later refills
+                        conn.execute(
+                            "UPDATE waiters SET paid = paid + ? WHERE id = ?",
+                            (available - reserve_tokens, waiter),
+                        )
+                        owed -= available - reserve_tokens
+                        available = reserve_tokens
+                    delay = max(
+                        (need_requests - requests) * 60 / request_limit,
+                        (min(owed + reserve_tokens, token_capacity) - available)
+                        * 60
+                        / token_limit,
+                    )
+            self._save(conn, deployment, requests, available, now)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return delay
+
+    def _leave(self, waiter: str) -> None:
+        """Removes a waiter that gave up, refunding any installments it paid."""
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT deployment, paid FROM waiters WHERE id = ?", (waiter,)
+            ).fetchone()
+            conn.execute("DELETE FROM waiters WHERE id = ?", (waiter,))
+            if row and row[1]:
+                deployment, paid = row
+                _, token_limit, requests, tokens, _ = self._bucket(conn, deployment, now)
+                tokens = min(self._capacity(token_limit), tokens + paid)
+                self._save(conn, deployment, requests, tokens, now)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def acquire(
+        self,
+        deployment: str,
+        tokens: int,
+        priority: int = INTERACTIVE,
+        timeout: Optional[float] = None,
+    ) -> Ticket:
+        """Blocks until a request may be sent.
+
+        Args:
+            deployment: Azure OpenAI deployment the request goes to
+            tokens: Estimated quota cost, e.g. from `estimate_chat_tokens`
+            priority: INTERACTIVE, BACKGROUND or BATCH
+            timeout: Seconds to wait at most; None waits as long as it takes
+
+        Returns:
+            Ticket to pass to `settle`
+
+        Raises:
+            RateGovernorTimeout: If not admitted within `timeout`
+        """
+        deployment = deployment or ""
+        if not self.enabled:
+            return Ticket(deployment, tokens, priority)
+        started, enqueued = time.monotonic(), time.time()
+        waiter = uuid.uuid4().hex
+        try:
+            while True:
+                delay = self._attempt(waiter, enqueued, deployment, tokens, priority)
+                if delay == 0:
+                    return Ticket(deployment, tokens, priority, time.monotonic() - started)
+                if timeout is not None and time.monotonic() - started + delay > timeout:
+                    raise RateGovernorTimeout(
+                        f"{deployment}: not admitted within {timeout:.1f}s"
+                    )
+                time.sleep(min(delay, MAX_POLL_SECONDS))
+        except BaseException:
+            self._leave(waiter)
+            raise
+
+    async def acquire_async(
+        self,
+        deployment: str,
+        tokens: int,
+        priority: int = INTERACTIVE,
+        timeout: Optional[float] = None,
+    ) -> Ticket:
+        """Async counterpart of `acquire`; waits without blocking the event loop."""
+        deployment = deployment or ""
+        if not self.enabled:
+            return Ticket(deployment, tokens, priority)
+        started, enqueued = time.monotonic(), time.time()
+        waiter = uuid.uuid4().hex
+        try:
+            while True:
+                delay = await asyncio.to_thread(
+                    self._attempt, waiter, enqueued, deployment, tokens, priority
+                )
+                if delay == 0:
+                    return Ticket(deployment, tokens, priority, time.monotonic() - started)
+                if timeout is not None and time.monotonic() - started + delay > timeout:
+                    raise RateGovernorTimeout(
+                        f"{deployment}: not admitted within {timeout:.1f}s"
+                    )
+                await asyncio.sleep(min(delay, MAX_POLL_SECONDS))
+        except BaseException:
+            await asyncio.to_thread(self._leave, waiter)
+            raise
+
+    def settle(
+        self, ticket: Ticket, used_tokens: Optional[int] = None, headers: Any = None
+    ) -> None:
+        """Corrects the buckets once a response arrives.
+
+        Args:
+            ticket: From `acquire`
+            used_tokens: Actual usage, e.g. `response.usage.total_tokens`;
+                the difference from the estimate is refunded or charged
+            headers: Response headers, read for x-ratelimit-* values
+        """
+        if not self.enabled:
+            return
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            request_limit, token_limit, requests, tokens, _ = self._bucket(
+                conn, ticket.deployment, now
+            )
+            if used_tokens is not None:
+                tokens = min(self._capacity(token_limit), tokens + ticket.tokens - used_tokens)
+
+            if headers is not None:
+                limit_requests = header_float(headers, "x-ratelimit-limit-requests")
+                limit_tokens = header_float(headers, "x-ratelimit-limit-tokens")
+                if limit_requests or limit_tokens:
+                    conn.execute(
+                        "UPDATE buckets SET request_limit = COALESCE(?, request_limit), "
+                        "token_limit = COALESCE(?, token_limit) WHERE deployment = ?",
+                        (limit_requests or None, limit_tokens or None, ticket.deployment),
+                    )
+                # The service counts every client of the deployment, not just this host
+                remaining_requests = header_float(headers, "x-ratelimit-remaining-requests")
+                remaining_tokens = header_float(headers, "x-ratelimit-remaining-tokens")
+                if remaining_requests is not None:
+                    requests = min(requests, remaining_requests)
+                if remaining_tokens is not None:
+                    tokens = min(tokens, remaining_tokens)
+
+            self._save(conn, ticket.deployment, requests, tokens, now)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def throttled(self, deployment: str, retry_after: float) -> None:
+        """Records a 429: drains the buckets and pauses the deployment for every process."""
+        if not self.enabled:
+            return
+        deployment = deployment or ""
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._bucket(conn, deployment, now)
+            conn.execute(
+                "UPDATE buckets SET requests = MIN(requests, 0), tokens = MIN(tokens, 0), "
+                "updated = ?, paused_until = MAX(paused_until, ?) WHERE deployment = ?",
+                (now, now + retry_after, deployment),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def queued(self, deployment: Optional[str] = None) -> int:
+        """Number of requests waiting for admission, on this host."""
+        if not self.enabled:
+            return 0
+        query, params = "SELECT COUNT(*) FROM waiters", ()
+        if deployment:
+            query, params = query + " WHERE deployment = ?", (deployment,)
+        return self._connection().execute(query, params).fetchone()[0]
+
+
+@lru_cache(maxsize=None)
+def get_rate_governor() -> RateGovernor:
+    """Process-wide governor; processes share state through its SQLite file."""
+    return RateGovernor()
@@ -0,0 +1,181 @@
+import argparse
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from utils.vector_config import FULL_DIMENSIONS
+
+DEFAULT_DIMENSIONS = [256, 512, 1024, 1536, FULL_DIMENSIONS]
+DEFAULT_K = [5, 10]
+QUERY_BLOCK = 256  # Queries scored per matrix product, to bound memory
+
+
+@dataclass
+class RecallRow:
+    dimensions: int
+    dtype: str
+    bytes_per_vector: int
+    size_ratio: float  # Baseline bytes divided by this configuration's bytes
+    recall: Dict[int, float]
+
+
+def shorten(vectors: np.ndarray, dimensions: int) -> np.ndarray:
+    """Truncates and re-normalizes embeddings like the `dimensions` API parameter.
+
+    text-embedding-3 embeddings are trained so their leading dimensions carry
+    the most information; the API's shortened embeddings are the truncated
+    vector scaled back to unit length.
+    """
+    shortened = vectors[:, :dimensions].astype(np.float32)
+    norms = np.linalg.norm(shortened, axis=1, keepdims=True)
+    return shortened / np.maximum(norms, 1e-12)
+
+
+def top_k(corpus: np.ndarray, queries: np.ndarray, query_ids: np.ndarray, k: int) -> np.ndarray:
+    """Exact cosine top-k neighbours of each query, excluding the query itself."""
+    neighbours = []
+    for start in range(0, len(queries), QUERY_BLOCK):
+        scores = queries[start:start + QUERY_BLOCK] @ corpus.T
+        scores[np.arange(len(scores)), query_ids[start:start + QUERY_BLOCK]] = -np.inf
+        best = np.argpartition(-scores, k, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(scores, best, axis=1), axis=1)
+        neighbours.append(np.take_along_axis(best, order, axis=1))
+    return np.vstack(neighbours)
+
+
+def recall_at_k(truth: np.ndarray, found: np.ndarray) -> float:
+    """Mean fraction of the true top-k that appear in the found top-k."""
+    hits = [len(set(t) & set(f)) for t, f in zip(truth, found)]
+    return float(np.mean(hits)) / truth.shape[1]
+
+
+def recall_report(
+    vectors: np.ndarray,
+    dimensions: List[int],
+    ks: List[int],
+    num_queries: int = 200,
+    include_float16: bool = True,
+    seed: int = 0,
+) -> List[RecallRow]:
+    """Compares shortened and half-precision embeddings against the full baseline.
+
+    A sample of stored chunk vectors is used as queries. Their exact top-k
+    neighbours among the full-size float32 vectors are the ground truth, and
+    every configuration is scored by how many of them it retrieves.
+
+    Args:
+        vectors: Full-size baseline embeddings, one row per chunk
+        dimensions: Embedding sizes to evaluate
+        ks: Cut-offs for recall@k
+        num_queries: Number of sampled query vectors
+        include_float16: Also evaluate each size stored as float16
+        seed: Sampling seed
+
+    Returns:
+        One RecallRow per (dimensions, dtype) combination
+    """
+    full_dimensions = vectors.shape[1]
+    max_k = max(ks)
+    if len(vectors) <= max_k:
+        raise ValueError(f"Need more than {max_k} vectors, got {len(vectors)}")
+
+    rng = np.random.default_rng(seed)
+    query_ids = rng.choice(len(vectors), size=min(num_queries, len(vectors)), replace=False)
+
+    baseline = shorten(vectors, full_dimensions)
+    truth = top_k(baseline, baseline[query_ids], query_ids, max_k)
+    baseline_bytes = full_dimensions * 4
+
+    dtypes = [("float32", np.float32)] + ([("float16", np.float16)] if include_float16 else [])
+    rows = []
+    for size in dimensions:
+        if size > full_dimensions:
+            continue
+        reduced = shorten(vectors, size)
+        for dtype_name, dtype in dtypes:
+            # Score with the precision the column would actually store
+            stored = reduced.astype(dtype).astype(np.float32)
+            found = top_k(stored, stored[query_ids], query_ids, max_k)
+            bytes_per_vector = size * np.dtype(dtype).itemsize
+            rows.append(
+                RecallRow(
+                    dimensions=size,
+                    dtype=dtype_name,
+                    bytes_per_vector=bytes_per_vector,
+                    size_ratio=baseline_bytes / bytes_per_vector,
+                    recall={k: recall_at_k(truth[:, :k], found[:, :k]) for k in ks},
+                )
+            )
+    return rows
+
+
+def load_vectors(uri: str, table_name: str, limit: Optional[int] = None) -> np.ndarray:
+    """Reads the vector column of a LanceDB table into a float32 matrix."""
+    import lancedb
+
+    table = lancedb.connect(uri).open_table(table_name)
+    column = (
+        table.search()
+        .select(["vector"])
+        .limit(limit or table.count_rows())
+        .to_arrow()
+        .column("vector")
+        .combine_chunks()
+    )
+    width = column.type.list_size
+    values = column.flatten().to_numpy(zero_copy_only=False)
+    return values.reshape(-1, width).astype(np.float32)
+
+
+def format_report(rows: List[RecallRow], num_vectors: int, ks: List[int]) -> str:
+    header = f"{'dims':>6} {'dtype':>8} {'bytes/vec':>10} {'smaller':>8} {'table MB':>9}"
+    header += "".join(f" {f'recall@{k}':>10}" for k in ks)
+    lines = [header, "-" * len(header)]
+    for row in rows:
+        line = (
+            f"{row.dimensions:>6} {row.dtype:>8} {row.bytes_per_vector:>10} "
+            f"{row.size_ratio:>7.1f}x {row.bytes_per_vector * num_vectors / 1e6:>9.1f}"
+        )
+        line += "".join(f" {row.recall[k]:>10.3f}" for k in ks)
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Recall vs size of shortened / float16 embeddings against the full-size baseline."
+    )
+    parser.add_argument("--db", default="data/lancedb", help="LanceDB URI")
+    parser.add_argument(
+        "--table",
+        default="docling",
+        help=f"Table holding full-size ({FULL_DIMENSIONS}-d float32) embeddings",
+    )
+    parser.add_argument("--dimensions", type=int, nargs="+", default=DEFAULT_DIMENSIONS)
+    parser.add_argument("--k", type=int, nargs="+", default=DEFAULT_K)
+    parser.add_argument("--queries", type=int, default=200, help="Sampled query vectors")
+    parser.add_argument("--limit", type=int, default=None, help="Read at most this many rows")
+    parser.add_argument("--no-float16", action="store_true", help="Only evaluate float32")
+    args = parser.parse_args()
+
+    vectors = load_vectors(args.db, args.table, args.limit)
+    if vectors.shape[1] != FULL_DIMENSIONS:
+        print(
+            f"⚠️ {args.table} stores {vectors.shape[1]}-d vectors; recall is measured "
+            f"against those instead of the full {FULL_DIMENSIONS}-d baseline"
+        )
+
+    rows = recall_report(
+        vectors,
+        args.dimensions,
+        args.k,
+        num_queries=args.queries,
+        include_float16=not args.no_float16,
+    )
+    print(f"📊 {len(vectors)} vectors, {min(args.queries, len(vectors))} sampled queries")
+    print(format_report(rows, len(vectors), args.k))
+
+
+if __name__ == "__main__":
+    main()
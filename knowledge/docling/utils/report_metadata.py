@@ -0,0 +1,44 @@
+import re
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+# "2025 Q1", "2025_Q1", "2025-q1"
+_YEAR_QUARTER = re.compile(r"(?<!\d)(20\d{2})[\s_\-]*Q([1-4])(?![0-9])", re.IGNORECASE)
+# "Q1 2025", "Q1_2025", "q1-2025"
+_QUARTER_YEAR = re.compile(r"(?<![A-Za-z])Q([1-4])[\s_\-]*(20\d{2})(?!\d)", re.IGNORECASE)
+
+
+def format_period(year: int, quarter: int) -> str:
+    """Canonical report period, e.g. 2025-Q1."""
+    return f"{year}-Q{quarter}"
+
+
+def find_report_periods(text: str) -> List[Tuple[int, int]]:
+    """Every (year, quarter) mention in a text, in order of appearance."""
+    matches = [
+        (match.start(), int(match.group(1)), int(match.group(2)))
+        for match in _YEAR_QUARTER.finditer(text)
+    ]
+    matches += [
+        (match.start(), int(match.group(2)), int(match.group(1)))
+        for match in _QUARTER_YEAR.finditer(text)
+    ]
+    return [(year, quarter) for _, year, quarter in sorted(matches)]
+
+
+def parse_report_period(text: str) -> Optional[str]:
+    """Finds the first year/quarter mention in a file name or sentence.
+
+    Args:
+        text: e.g. "KFH_Real_Estate_Report_2025_Q1.pdf" or "rents in Q1 2025"
+
+    Returns:
+        Canonical period such as "2025-Q1", or None
+    """
+    periods = find_report_periods(text)
+    return format_period(*periods[0]) if periods else None
+
+
+def document_id(source: str) -> str:
+    """Stable, human-readable document id: the file name without extension."""
+    return Path(source).stem
@@ -0,0 +1,227 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+DEFAULT_THRESHOLD = 0.92
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_TTL_SECONDS = 24 * 3600
+
+
+@dataclass
+class CachedResponse:
+    question: str
+    context: Any  # The search hits the answer was generated from
+    answer: str
+    namespace: str
+    table_version: Any
+    created_at: float
+    hits: int = 0
+
+
+@dataclass
+class ResponseCacheHit:
+    question: str  # The earlier question whose answer is reused
+    context: Any
+    answer: str
+    similarity: float
+
+
+@dataclass
+class ResponseCacheStats:
+    hits: int = 0
+    misses: int = 0
+    invalidations: int = 0
+    entries: int = 0
+
+
+def _unit(vector: List[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm else array
+
+
+def history_namespace(namespace: str, history: List[Dict[str, Any]]) -> str:
+    """Namespace for a question asked after `history`.
+
+    An answer depends on the conversation before the question ("and for
+    Q2?", "explain that"), so only questions asked after the same history
+    share answers. Without history the namespace is unchanged, so opening
+    questions are still shared by every session.
+
+    Args:
+        namespace: Embedding and scope namespace
+        history: Messages sent ahead of the question, e.g. everything but the
+            last message of `ConversationMemory.build(messages)`
+    """
+    if not history:
+        return namespace
+    payload = json.dumps(
+        [[message.get("role"), message.get("content")] for message in history],
+        ensure_ascii=False,
+    )
+    return f"{namespace}|history:{hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]}"
+
+
+def stream_text(text: str, chunk_words: int = 3) -> Iterator[str]:
+    """Yields a cached answer in small pieces for `st.write_stream`."""
+    words = text.split(" ")
+    for i in range(0, len(words), chunk_words):
+        piece = " ".join(words[i:i + chunk_words])
+        yield piece if i + chunk_words >= len(words) else piece + " "
+
+
+class SemanticResponseCache:
+    """Reuses answers to earlier questions that mean the same thing.
+
+    Questions are compared by cosine similarity of their query embeddings, so
+    paraphrases such as "rental trends 2025" and "how did rents move in 2025?"
+    can share one answer. Every entry records the LanceDB table version it was
+    answered from; once the table changes the whole cache is dropped, since
+    any answer may now be out of date. That needs a table handle that sees
+    other processes' writes (see `retrieval.connect_database`). Follow-up
+    questions are kept apart by conversation (see `history_namespace`).
+    """
+
+    def __init__(
+        self,
+        threshold: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+    ):
+        """Initialize the cache.
+
+        Args:
+            threshold: Minimum cosine similarity for a hit; defaults to
+                RESPONSE_CACHE_THRESHOLD or 0.92
+            max_entries: Bound on stored answers (least used are evicted);
+                defaults to RESPONSE_CACHE_MAX_ENTRIES or 512
+            ttl_seconds: Answer lifetime; defaults to RESPONSE_CACHE_TTL_SECONDS
+                or one day
+        """
+        self.threshold = threshold or float(
+            os.getenv("RESPONSE_CACHE_THRESHOLD", DEFAULT_THRESHOLD)
+        )
+        self.max_entries = max_entries or int(
+            os.getenv("RESPONSE_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)
+        )
+        self.ttl_seconds = ttl_seconds or float(
+            os.getenv("RESPONSE_CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS)
+        )
+
+        self._entries: List[CachedResponse] = []
+        self._vectors: List[np.ndarray] = []
+        self._matrix: Optional[np.ndarray] = None
+        self._table_version: Any = None
+        self._lock = threading.Lock()
+        self._stats = ResponseCacheStats()
+
+    def _check_version(self, table_version: Any) -> None:
+        # Caller holds the lock
+        if table_version != self._table_version:
+            if self._entries:
+                self._stats.invalidations += 1
+            self._entries, self._vectors, self._matrix = [], [], None
+            self._table_version = table_version
+
+    def _drop_expired(self) -> None:
+        # Caller holds the lock
+        cutoff = time.time() - self.ttl_seconds
+        keep = [i for i, entry in enumerate(self._entries) if entry.created_at > cutoff]
+        if len(keep) != len(self._entries):
+            self._entries = [self._entries[i] for i in keep]
+            self._vectors = [self._vectors[i] for i in keep]
+            self._matrix = None
+
+    def lookup(
+        self,
+        query_vector: List[float],
+        table_version: Any,
+        namespace: str = "",
+    ) -> Optional[ResponseCacheHit]:
+        """Finds the most similar earlier question above the threshold.
+
+        Args:
+            query_vector: Embedding of the new question (already computed for retrieval)
+            table_version: Current LanceDB table version
+            namespace: Embedding namespace; vectors from different spaces never match
+
+        Returns:
+            ResponseCacheHit, or None on a miss
+        """
+        query = _unit(query_vector)
+        with self._lock:
+            self._check_version(table_version)
+            self._drop_expired()
+            if not self._entries:
+                self._stats.misses += 1
+                return None
+
+            if self._matrix is None:
+                self._matrix = np.vstack(self._vectors)
+            if self._matrix.shape[1] != query.shape[0]:
+                self._stats.misses += 1
+                return None
+
+            similarities = self._matrix @ query
+            for index in np.argsort(-similarities):
+                similarity = float(similarities[index])
+                if similarity < self.threshold:
+                    break
+                entry = self._entries[index]
+                if entry.namespace != namespace:
+                    continue
+                entry.hits += 1
+                self._stats.hits += 1
+                return ResponseCacheHit(entry.question, entry.context, entry.answer, similarity)
+
+            self._stats.misses += 1
+            return None
+
+    def store(
+        self,
+        question: str,
+        query_vector: List[float],
+        context: Any,
+        answer: str,
+        table_version: Any,
+        namespace: str = "",
+    ) -> None:
+        """Remembers an answer generated from `context` for `question`."""
+        with self._lock:
+            self._check_version(table_version)
+            self._entries.append(
+                CachedResponse(question, context, answer, namespace, table_version, time.time())
+            )
+            self._vectors.append(_unit(query_vector))
+            if len(self._entries) > self.max_entries:
+                # Evict the least used answer, oldest first among equals
+                victim = min(range(len(self._entries)), key=lambda i: self._entries[i].hits)
+                del self._entries[victim]
+                del self._vectors[victim]
+            self._matrix = None
+
+    def stats(self) -> ResponseCacheStats:
+        with self._lock:
+            return ResponseCacheStats(
+                hits=self._stats.hits,
+                misses=self._stats.misses,
+                invalidations=self._stats.invalidations,
+                entries=len(self._entries),
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries, self._vectors, self._matrix = [], [], None
+
+
+@lru_cache(maxsize=None)
+def get_response_cache() -> SemanticResponseCache:
+    """Process-wide answer cache, shared by every Streamlit session and rerun."""
+    return SemanticResponseCache()
@@ -0,0 +1,528 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from datetime import timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from utils.indexing import find_fts_index
+
+SEARCH_MODES = ("vector", "hybrid", "lexical")
+DEFAULT_RRF_K = 60
+
+# How stale a long-lived table handle may be before it looks for new versions
+DEFAULT_REFRESH_SECONDS = 5.0
+
+# Columns a rendered hit needs; the vector column is never read back
+HIT_COLUMNS = ["id", "doc_id", "report_period", "section", "text", "metadata"]
+# Just enough to rank and later hydrate hits with `fetch_chunks`
+ID_COLUMNS = ["id"]
+
+FETCH_BATCH_SIZE = 500
+# Concurrent searches in `search_many` when queries cannot share one scan
+SEARCH_MANY_WORKERS = 8
+
+# Between hits in the prompt context
+CONTEXT_SEPARATOR = "\n\n"
+
+# Score columns LanceDB adds per search type; for distance, lower is better
+SCORE_COLUMNS = (
+    ("_relevance_score", "relevance"),
+    ("_score", "bm25"),
+    ("_distance", "distance"),
+)
+
+
+@dataclass
+class SearchHit:
+    text: Optional[str] = None  # None until hydrated when searched by id only
+    score: Optional[float] = None
+    score_type: Optional[str] = None  # relevance, bm25 or distance
+    filename: Optional[str] = None
+    pages: List[int] = field(default_factory=list)
+    title: Optional[str] = None
+    chunk_id: Optional[str] = None
+    doc_id: Optional[str] = None
+    report_period: Optional[str] = None
+    section: Optional[str] = None
+
+    def citation(self) -> str:
+        """Human-readable source, e.g. "report.pdf - p. 3, 4"."""
+        parts = []
+        if self.filename:
+            parts.append(self.filename)
+        if self.pages:
+            parts.append(f"p. {', '.join(map(str, self.pages))}")
+        return " - ".join(parts)
+
+
+def parse_pages(value: Any) -> List[int]:
+    """Normalizes stored page numbers ("3, 4" or [3, 4]) to a list of ints."""
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [int(page) for page in value.split(",") if page.strip().isdigit()]
+    return [int(page) for page in value]
+
+
+def _column(table: pa.Table, name: str) -> List[Any]:
+    if name in table.column_names:
+        return table.column(name).to_pylist()
+    return [None] * table.num_rows
+
+
+def _metadata_field(metadata: Optional[pa.Array], name: str, num_rows: int) -> List[Any]:
+    if metadata is None or metadata.type.get_field_index(name) < 0:
+        return [None] * num_rows
+    return metadata.field(name).to_pylist()
+
+
+def hits_from_arrow(results: pa.Table) -> List[SearchHit]:
+    """Builds typed hits column by column from a LanceDB Arrow result.
+
+    Args:
+        results: Output of a query builder's `.to_arrow()`
+
+    Returns:
+        One SearchHit per row, in result order
+    """
+    num_rows = results.num_rows
+    score_column, score_type = next(
+        ((name, kind) for name, kind in SCORE_COLUMNS if name in results.column_names),
+        (None, None),
+    )
+    scores = _column(results, score_column) if score_column else [None] * num_rows
+
+    metadata = None
+    if "metadata" in results.column_names:
+        metadata = results.column("metadata").combine_chunks()
+
+    return [
+        SearchHit(
+            text=text,
+            score=score,
+            score_type=score_type,
+            filename=filename,
+            pages=parse_pages(pages),
+            title=title,
+            chunk_id=chunk,
+            doc_id=doc_id,
+            report_period=period,
+            section=section,
+        )
+        for text, score, filename, pages, title, chunk, doc_id, period, section in zip(
+            _column(results, "text"),
+            scores,
+            _metadata_field(metadata, "filename", num_rows),
+            _metadata_field(metadata, "page_numbers", num_rows),
+            _metadata_field(metadata, "title", num_rows),
+            _column(results, "id"),
+            _column(results, "doc_id"),
+            _column(results, "report_period"),
+            _column(results, "section"),
+        )
+    ]
+
+
+def format_hit(hit: SearchHit) -> str:
+    """One hit as it appears in the prompt: text, then source and title lines."""
+    section = hit.text or ""
+    citation = hit.citation()
+    if citation:
+        section += f"\nSource: {citation}"
+    if hit.title:
+        section += f"\nTitle: {hit.title}"
+    return section
+
+
+def format_context(hits: List[SearchHit]) -> str:
+    """Assembles hits into the context block of the chat prompt."""
+    return CONTEXT_SEPARATOR.join(format_hit(hit) for hit in hits)
+
+
+def _env_int(name: str) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value else None
+
+
+def _select(table: Any, columns: Optional[List[str]]) -> List[str]:
+    """Requested columns that exist, so tables from older schemas still work."""
+    names = table.schema.names
+    return [column for column in (columns or HIT_COLUMNS) if column in names]
+
+
+def connect_database(uri: str) -> Any:
+    """LanceDB connection for long-lived readers such as the chat apps and API.
+
+    A plain connection pins every opened table to the version it was opened
+    at, so `table.version` never moves and version-keyed caches are never
+    invalidated by ingestion in another process. This one re-checks for new
+    versions at most every TABLE_REFRESH_SECONDS (default 5; 0 checks on every
+    read).
+    """
+    import lancedb
+
+    seconds = float(os.getenv("TABLE_REFRESH_SECONDS", DEFAULT_REFRESH_SECONDS))
+    return lancedb.connect(uri, read_consistency_interval=timedelta(seconds=seconds))
+
+
+def search_mode(mode: Optional[str] = None) -> str:
+    """Resolves the retrieval mode, defaulting to SEARCH_MODE or hybrid.
+
+    Raises:
+        ValueError: If the mode is not one of SEARCH_MODES
+    """
+    mode = (mode or os.getenv("SEARCH_MODE", "hybrid")).lower()
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Search mode must be one of {', '.join(SEARCH_MODES)}, got {mode}")
+    return mode
+
+
+def vector_search(
+    table: Any,
+    query_vector: List[float],
+    limit: int = 5,
+    nprobes: Optional[int] = None,
+    refine_factor: Optional[int] = None,
+    columns: Optional[List[str]] = None,
+    where: Optional[str] = None,
+):
+    """Builds a vector query against the chunk table.
+
+    Args:
+        table: LanceDB table object
+        query_vector: Embedded query
+        limit: Number of results to return
+        nprobes: IVF partitions to probe; defaults to SEARCH_NPROBES or LanceDB's
+            default. Higher is slower but closer to exact search.
+        refine_factor: Re-rank `limit * refine_factor` candidates with exact
+            distances; defaults to SEARCH_REFINE_FACTOR (off when unset)
+        columns: Columns to return; defaults to HIT_COLUMNS. Use ID_COLUMNS
+            to rank without reading any text.
+        where: SQL filter applied before the vector scan, e.g.
+            "report_period = '2025-Q1'"; resolved from scalar indexes
+
+    Returns:
+        LanceDB query builder, ready for `.to_pandas()` / `.to_arrow()`
+    """
+    nprobes = nprobes or _env_int("SEARCH_NPROBES")
+    refine_factor = refine_factor or _env_int("SEARCH_REFINE_FACTOR")
+
+    query = (
+        table.search(query=query_vector, query_type="vector")
+        .select([*_select(table, columns), "_distance"])
+        .limit(limit)
+    )
+    if where:
+        query = query.where(where, prefilter=True)
+    if nprobes:
+        query = query.nprobes(nprobes)
+    if refine_factor:
+        query = query.refine_factor(refine_factor)
+    return query
+
+
+def lexical_search(
+    table: Any,
+    query: str,
+    limit: int = 5,
+    columns: Optional[List[str]] = None,
+    where: Optional[str] = None,
+):
+    """Builds a BM25 full-text query; needs no embedding.
+
+    Args:
+        table: LanceDB table with a full-text index on `text`
+        query: Raw user query
+        limit: Number of results to return
+        columns: Columns to return; defaults to HIT_COLUMNS
+        where: SQL filter applied before ranking
+
+    Returns:
+        LanceDB query builder
+    """
+    builder = (
+        table.search(query, query_type="fts")
+        .select([*_select(table, columns), "_score"])
+        .limit(limit)
+    )
+    if where:
+        builder = builder.where(where, prefilter=True)
+    return builder
+
+
+def hybrid_search(
+    table: Any,
+    query: str,
+    query_vector: List[float],
+    limit: int = 5,
+    nprobes: Optional[int] = None,
+    refine_factor: Optional[int] = None,
+    rrf_k: Optional[int] = None,
+    columns: Optional[List[str]] = None,
+    where: Optional[str] = None,
+):
+    """Builds a query fusing BM25 and vector rankings with reciprocal rank fusion.
+
+    Exact tokens such as "Q1 2025", governorate names or "Investment Housing"
+    rank well lexically even when their embeddings are only vaguely similar
+    to the question. Falls back to plain vector search if the table has no
+    full-text index yet.
+
+    Args:
+        table: LanceDB table object
+        query: Raw user query, for the lexical side
+        query_vector: Embedded query, for the vector side
+        limit: Number of fused results to return
+        nprobes: See `vector_search`
+        refine_factor: See `vector_search`
+        rrf_k: RRF constant; defaults to SEARCH_RRF_K or 60. Higher values
+            flatten the difference between top and lower ranks.
+        columns: Columns to return; defaults to HIT_COLUMNS
+        where: SQL filter applied to both sides before ranking
+
+    Returns:
+        LanceDB query builder; fused results carry a `_relevance_score` column
+    """
+    if find_fts_index(table) is None:
+        return vector_search(
+            table, query_vector, limit, nprobes, refine_factor, columns, where
+        )
+
+    from lancedb.rerankers import RRFReranker
+
+    nprobes = nprobes or _env_int("SEARCH_NPROBES")
+    refine_factor = refine_factor or _env_int("SEARCH_REFINE_FACTOR")
+    reranker = RRFReranker(K=rrf_k or _env_int("SEARCH_RRF_K") or DEFAULT_RRF_K)
+
+    builder = (
+        table.search(query_type="hybrid")
+        .vector(query_vector)
+        .text(query)
+        .rerank(reranker)
+        .select(_select(table, columns))
+        .limit(limit)
+    )
+    if where:
+        builder = builder.where(where, prefilter=True)
+    if nprobes:
+        builder = builder.nprobes(nprobes)
+    if refine_factor:
+        builder = builder.refine_factor(refine_factor)
+    return builder
+
+
+def rrf_fuse(
+    results: List[pa.Table], limit: Optional[int] = None, rrf_k: Optional[int] = None
+) -> pa.Table:
+    """Fuses separately run rankings with reciprocal rank fusion.
+
+    The in-process counterpart of `hybrid_search`'s reranker, for callers
+    that run the lexical and vector sides themselves (e.g. concurrently).
+
+    Args:
+        results: Arrow results with the same selected columns, including `id`
+        limit: Number of fused rows to keep; defaults to all
+        rrf_k: RRF constant; defaults to SEARCH_RRF_K or 60
+
+    Returns:
+        The union of the rows, best first, with a `_relevance_score` column
+        in place of the per-search score columns
+    """
+    rrf_k = rrf_k or _env_int("SEARCH_RRF_K") or DEFAULT_RRF_K
+    plain = [
+        result.drop_columns([name for name, _ in SCORE_COLUMNS if name in result.column_names])
+        for result in results
+    ]
+    combined = pa.concat_tables(plain, promote_options="default")
+
+    scores: Dict[str, float] = {}
+    first_row: Dict[str, int] = {}
+    offset = 0
+    for table in plain:
+        for rank, chunk in enumerate(table.column("id").to_pylist()):
+            scores[chunk] = scores.get(chunk, 0.0) + 1.0 / (rrf_k + rank + 1)
+            first_row.setdefault(chunk, offset + rank)
+        offset += table.num_rows
+
+    ranked = sorted(scores, key=scores.get, reverse=True)[:limit]
+    rows = pa.array([first_row[chunk] for chunk in ranked], pa.int64())
+    return combined.take(rows).append_column(
+        "_relevance_score", pa.array([scores[chunk] for chunk in ranked], pa.float32())
+    )
+
+
+def search(
+    table: Any,
+    query: str,
+    query_vector: Optional[List[float]],
+    limit: int = 5,
+    mode: Optional[str] = None,
+    nprobes: Optional[int] = None,
+    refine_factor: Optional[int] = None,
+    columns: Optional[List[str]] = None,
+    where: Optional[str] = None,
+):
+    """Dispatches to vector, hybrid or lexical search.
+
+    Args:
+        table: LanceDB table object
+        query: Raw user query
+        query_vector: Embedded query; may be None in lexical mode
+        limit: Number of results to return
+        mode: vector, hybrid or lexical; defaults to SEARCH_MODE or hybrid
+        nprobes: See `vector_search`
+        refine_factor: See `vector_search`
+        columns: Columns to return; defaults to HIT_COLUMNS
+        where: SQL filter pushed down before the scan (see `vector_search`)
+
+    Returns:
+        LanceDB query builder
+    """
+    mode = search_mode(mode)
+    if mode == "lexical" or query_vector is None:
+        return lexical_search(table, query, limit, columns, where)
+    if mode == "hybrid":
+        return hybrid_search(
+            table,
+            query,
+            query_vector,
+            limit,
+            nprobes,
+            refine_factor,
+            columns=columns,
+            where=where,
+        )
+    return vector_search(table, query_vector, limit, nprobes, refine_factor, columns, where)
+
+
+def split_by_query(results: pa.Table, num_queries: int) -> List[pa.Table]:
+    """Splits a multi-vector search result into one table per query.
+
+    LanceDB tags each row of a batched vector search with `query_index`; a
+    result without it is treated as belonging to the first query.
+    """
+    if "query_index" not in results.column_names:
+        return [results] + [results.slice(0, 0)] * (num_queries - 1)
+    index = results.column("query_index")
+    return [
+        results.filter(pc.equal(index, i)).drop_columns(["query_index"])
+        for i in range(num_queries)
+    ]
+
+
+def search_many(
+    table: Any,
+    queries: List[str],
+    embed: Optional[Callable[[List[str]], List[List[float]]]],
+    k: int = 5,
+    mode: Optional[str] = None,
+    nprobes: Optional[int] = None,
+    refine_factor: Optional[int] = None,
+    columns: Optional[List[str]] = None,
+    where: Optional[str] = None,
+    max_workers: Optional[int] = None,
+) -> List[List[SearchHit]]:
+    """Searches several queries with one embeddings request.
+
+    All queries are embedded in a single `embed` call. Vector searches then
+    share one batched LanceDB scan; hybrid and lexical searches, which LanceDB
+    cannot batch, run concurrently on a thread pool.
+
+    Args:
+        table: LanceDB table object
+        queries: Raw user queries
+        embed: Embeds a list of texts in one request, e.g. `CachedEmbedder.embed`;
+            may be None in lexical mode
+        k: Results per query
+        mode: vector, hybrid or lexical; defaults to SEARCH_MODE or hybrid
+        nprobes: See `vector_search`
+        refine_factor: See `vector_search`
+        columns: Columns to return; defaults to HIT_COLUMNS
+        where: SQL filter applied to every query
+        max_workers: Concurrent searches; defaults to SEARCH_MANY_WORKERS
+
+    Returns:
+        One list of hits per query, in query order
+    """
+    if not queries:
+        return []
+    mode = search_mode(mode)
+    query_vectors = embed(list(queries)) if mode != "lexical" and embed else None
+
+    if mode == "vector" and query_vectors is not None:
+        results = vector_search(
+            table, query_vectors, k, nprobes, refine_factor, columns, where
+        ).to_arrow()
+        return [hits_from_arrow(part) for part in split_by_query(results, len(queries))]
+
+    def run(i: int) -> List[SearchHit]:
+        query_vector = query_vectors[i] if query_vectors is not None else None
+        return hits_from_arrow(
+            search(
+                table,
+                queries[i],
+                query_vector,
+                k,
+                mode=mode,
+                nprobes=nprobes,
+                refine_factor=refine_factor,
+                columns=columns,
+                where=where,
+            ).to_arrow()
+        )
+
+    workers = min(max_workers or SEARCH_MANY_WORKERS, len(queries))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(run, range(len(queries))))
+
+
+def fetch_chunks(
+    table: Any, ids: List[str], columns: Optional[List[str]] = None
+) -> Dict[str, SearchHit]:
+    """Reads the given chunks by id, e.g. for hits found with ID_COLUMNS.
+
+    Args:
+        table: LanceDB table object
+        ids: Chunk ids to read
+        columns: Columns to read; defaults to HIT_COLUMNS
+
+    Returns:
+        Mapping of each found id to its (unscored) hit
+    """
+    columns = _select(table, columns)
+    if "id" not in columns:
+        columns = ["id", *columns]
+
+    found = {}
+    unique_ids = list(dict.fromkeys(ids))
+    for i in range(0, len(unique_ids), FETCH_BATCH_SIZE):
+        batch = unique_ids[i:i + FETCH_BATCH_SIZE]
+        quoted = ", ".join(f"'{chunk}'" for chunk in batch)
+        results = (
+            table.search()
+            .where(f"id IN ({quoted})")
+            .select(columns)
+            .limit(len(batch))
+            .to_arrow()
+        )
+        found.update((hit.chunk_id, hit) for hit in hits_from_arrow(results))
+    return found
+
+
+def hydrate_hits(
+    table: Any, hits: List[SearchHit], columns: Optional[List[str]] = None
+) -> List[SearchHit]:
+    """Fills in text and metadata for id-only hits, keeping their scores and order.
+
+    Only the hits passed in are read, so a caller can rank a large candidate
+    set with ID_COLUMNS and hydrate just the ones it displays.
+    """
+    chunks = fetch_chunks(table, [hit.chunk_id for hit in hits], columns)
+    return [
+        replace(chunks[hit.chunk_id], score=hit.score, score_type=hit.score_type)
+        for hit in hits
+        if hit.chunk_id in chunks
+    ]
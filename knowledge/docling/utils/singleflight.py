@@ -0,0 +1,158 @@
+import asyncio
+import hashlib
+import json
+import threading
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass
+class SingleFlightStats:
+    started: int = 0  # Upstream calls actually made
+    shared: int = 0  # Callers that joined a call already in flight
+
+    @property
+    def share_rate(self) -> float:
+        calls = self.started + self.shared
+        return self.shared / calls if calls else 0.0
+
+
+def request_key(*parts: Any) -> str:
+    """Compact key for a request made of JSON-serializable parts, e.g. chat messages."""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _Broadcast:
+    """Items of one in-flight stream, replayed to every subscriber."""
+
+    def __init__(self):
+        self.items: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Event()
+        self.subscribers = 0
+        self.task: Optional["asyncio.Task"] = None
+
+    def notify(self) -> None:
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class SingleFlight:
+    """Coalesces identical concurrent calls into one upstream call.
+
+    The first caller for a key starts the work; callers that arrive while it
+    is in flight wait for the same result instead of repeating it. Once the
+    call finishes the key is forgotten, so this never serves stale results;
+    caching is left to the caches in front of it.
+
+    The work runs in its own task, so a caller that is cancelled or times out
+    does not cancel it for the others. All callers of one instance must use
+    the same event loop (the chat apps share `get_background_loop()`).
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, "asyncio.Future"] = {}
+        self._streams: Dict[Hashable, _Broadcast] = {}
+        self._stats = SingleFlightStats()
+        self._lock = threading.Lock()  # Only guards the counters, read from other threads
+
+    def _count(self, shared: bool) -> None:
+        with self._lock:
+            if shared:
+                self._stats.shared += 1
+            else:
+                self._stats.started += 1
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[T]]) -> T:
+        """Result of `call()`, shared with concurrent callers of the same key.
+
+        Args:
+            key: Identifies equivalent requests
+            call: Starts the work; only invoked if no call for `key` is in flight
+
+        Returns:
+            The call's result; its exception is raised in every caller
+        """
+        future = self._calls.get(key)
+        if future is None:
+            self._count(shared=False)
+            future = asyncio.ensure_future(call())
+            self._calls[key] = future
+            future.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self._count(shared=True)
+        return await asyncio.shield(future)
+
+    async def stream(self, key: Hashable, items: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """Async iterator over `items()`, fanned out to concurrent callers of the same key.
+
+        A caller that joins late first receives everything already produced,
+        then follows along live. The upstream stream is cancelled only once
+        every subscriber has stopped listening.
+
+        Args:
+            key: Identifies equivalent requests
+            items: Opens the upstream stream; only invoked if none is in flight
+
+        Yields:
+            The upstream items, in order
+        """
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            self._count(shared=False)
+            broadcast = _Broadcast()
+            self._streams[key] = broadcast
+            broadcast.task = asyncio.ensure_future(self._produce(key, broadcast, items))
+        else:
+            self._count(shared=True)
+
+        broadcast.subscribers += 1
+        index = 0
+        try:
+            while True:
+                while index < len(broadcast.items):
+                    yield broadcast.items[index]
+                    index += 1
+                if broadcast.done:
+                    if broadcast.error is not None:
+                        raise broadcast.error
+                    return
+                await broadcast.changed.wait()
+        finally:
+            broadcast.subscribers -= 1
+            if broadcast.subscribers == 0 and not broadcast.done:
+                # Nobody is listening any more; a new caller starts afresh
+                self._forget(key, broadcast)
+                broadcast.task.cancel()
+
+    async def _produce(
+        self, key: Hashable, broadcast: _Broadcast, items: Callable[[], AsyncIterator[T]]
+    ) -> None:
+        try:
+            async for item in items():
+                broadcast.items.append(item)
+                broadcast.notify()
+        except asyncio.CancelledError:
+            broadcast.error = RuntimeError("Shared stream was cancelled")
+        except Exception as e:
+            broadcast.error = e
+        finally:
+            self._forget(key, broadcast)
+            broadcast.notify()
+
+    def _forget(self, key: Hashable, broadcast: _Broadcast) -> None:
+        broadcast.done = True
+        if self._streams.get(key) is broadcast:
+            del self._streams[key]
+
+    def in_flight(self) -> int:
+        return len(self._calls) + len(self._streams)
+
+    def stats(self) -> SingleFlightStats:
+        """Snapshot of the counters."""
+        with self._lock:
+            return SingleFlightStats(started=self._stats.started, shared=self._stats.shared)
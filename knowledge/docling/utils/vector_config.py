@@ -0,0 +1,67 @@
+import os
+from typing import Any, Optional
+
+import pyarrow as pa
+
+# text-embedding-3-large's native embedding size
+FULL_DIMENSIONS = 3072
+
+VALUE_TYPES = {
+    "float32": pa.float32(),
+    "float16": pa.float16(),
+}
+
+
+def embedding_dimensions() -> int:
+    """Embedding size used for storage and queries, from EMBEDDING_DIMENSIONS.
+
+    text-embedding-3 models return shortened, re-normalized embeddings when
+    asked for fewer dimensions (e.g. 256, 512 or 1024).
+
+    Raises:
+        ValueError: If the value is not between 1 and FULL_DIMENSIONS
+    """
+    dimensions = int(os.getenv("EMBEDDING_DIMENSIONS", FULL_DIMENSIONS))
+    if not 0 < dimensions <= FULL_DIMENSIONS:
+        raise ValueError(
+            f"EMBEDDING_DIMENSIONS must be between 1 and {FULL_DIMENSIONS}, got {dimensions}"
+        )
+    return dimensions
+
+
+def requested_dimensions() -> Optional[int]:
+    """The `dimensions` argument for the embeddings API.
+
+    None at full size, so requests and cache keys stay the same as before
+    shortened embeddings were configurable.
+    """
+    dimensions = embedding_dimensions()
+    return None if dimensions == FULL_DIMENSIONS else dimensions
+
+
+def vector_value_type() -> pa.DataType:
+    """Storage type of the vector column, from EMBEDDING_STORAGE_DTYPE.
+
+    Raises:
+        ValueError: If the value is not float32 or float16
+    """
+    name = os.getenv("EMBEDDING_STORAGE_DTYPE", "float32").lower()
+    if name not in VALUE_TYPES:
+        raise ValueError(
+            f"EMBEDDING_STORAGE_DTYPE must be one of {', '.join(VALUE_TYPES)}, got {name}"
+        )
+    return VALUE_TYPES[name]
+
+
+def vector_column_type(table: Any, column: str = "vector") -> pa.DataType:
+    """Arrow type of a table's vector column."""
+    return table.schema.field(column).type
+
+
+def matches_vector_config(table: Any, column: str = "vector") -> bool:
+    """Whether a table's vector column has the configured size and storage type."""
+    column_type = vector_column_type(table, column)
+    return (
+        column_type.list_size == embedding_dimensions()
+        and column_type.value_type == vector_value_type()
+    )